@@ -0,0 +1,124 @@
+"""
+Compare the client-side overhead of a call through the generated TClient
+methods with the previous `__getattr__` + `functools.partial` dispatch.
+
+The client talks to a transport that discards requests and replays a
+canned reply, so only the client and protocol work is timed. Run from the
+repository root:
+
+    python benchmark/client_calls.py [-n CALLS] [case ...]
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import argparse
+import functools
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http2thrift.thriftpy.parser import parse_fp    # noqa
+from http2thrift.thriftpy.protocol import TBinaryProtocol    # noqa
+from http2thrift.thriftpy.thrift import TClient, TMessageType    # noqa
+from http2thrift.thriftpy.transport import TMemoryBuffer    # noqa
+
+
+IDL = '''
+service Calc {
+  void ping(),
+  i32 add(1: i32 a, 2: i32 b),
+  string lookup(1: string key, 2: i32 shard, 3: bool fresh, 4: list<i32> ids),
+}
+'''
+
+
+class LegacyClient(TClient):
+    """TClient dispatch before the generated methods."""
+    def __getattr__(self, _api):
+        if _api in self._service.thrift_services:
+            return functools.partial(self._req, _api)
+        raise AttributeError(_api)
+
+    def _req(self, _api, *args, **kwargs):
+        args_fields = getattr(self._service, _api + "_args").thrift_fields
+        _kw = dict(zip((f.name for f in args_fields), args))
+        kwargs.update(_kw)
+        result_cls = getattr(self._service, _api + "_result")
+
+        self._send(_api, **kwargs)
+        if not getattr(result_cls, "oneway"):
+            return self._recv(_api)
+
+    def _send(self, _api, **kwargs):
+        self._oprot.write_message_begin(_api, TMessageType.CALL, self._seqid)
+        args = getattr(self._service, _api + "_args")()
+        for k, v in kwargs.items():
+            setattr(args, k, v)
+        args.write(self._oprot)
+        self._oprot.write_message_end()
+        self._oprot.trans.flush()
+
+
+class ReplayTransport(TMemoryBuffer):
+    """Drops what is written, every flush rewinds to the same reply."""
+    def __init__(self, reply):
+        TMemoryBuffer.__init__(self, reply)
+        self._reply = reply
+
+    def write(self, buf):
+        pass
+
+    def flush(self):
+        self.setvalue(self._reply)
+
+
+def encode_reply(m, api, value):
+    buf = TMemoryBuffer()
+    proto = TBinaryProtocol(buf)
+    proto.write_message_begin(api, TMessageType.REPLY, 0)
+    result = getattr(m.Calc, api + '_result')()
+    if value is not None:
+        result.success = value
+    result.write(proto)
+    proto.write_message_end()
+    return buf.getvalue()
+
+
+def run(client_cls, m, api, args, value, calls):
+    client = client_cls(m.Calc, TBinaryProtocol(ReplayTransport(encode_reply(m, api, value))))
+    call = getattr(client, api)
+    assert call(*args) == value
+    t = time.time()
+    for _ in range(calls):
+        getattr(client, api)(*args)
+    return (time.time() - t) / calls * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--calls', type=int, default=100000)
+    ap.add_argument('cases', nargs='*')
+    args = ap.parse_args()
+
+    m = parse_fp(io.StringIO(IDL), 'bench_thrift')
+    cases = [
+        ('ping', [], None),
+        ('add', [1, 2], 3),
+        ('lookup', ['user:42', 7, True, [1, 2, 3]], 'x' * 32),
+    ]
+
+    print('%-8s %12s %12s %8s' % ('case', 'legacy us', 'stub us', 'speedup'))
+    for api, call_args, value in cases:
+        if args.cases and api not in args.cases:
+            continue
+        legacy = run(LegacyClient, m, api, call_args, value, args.calls)
+        stub = run(TClient, m, api, call_args, value, args.calls)
+        print('%-8s %12.2f %12.2f %7.2fx' % (api, legacy, stub, legacy / stub))
+
+
+if __name__ == '__main__':
+    main()
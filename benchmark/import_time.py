@@ -0,0 +1,57 @@
+"""
+Measure how long importing the gateway and thriftpy modules takes.
+
+Every import is timed in a fresh interpreter, run from the repository root:
+
+    python benchmark/import_time.py [-n RUNS] [module ...]
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+DEFAULT_MODULES = [
+    'http2thrift.thriftpy',
+    'http2thrift.thriftpy.rpc',
+    'http2thrift.thriftpy.contrib.tracking',
+    'http2thrift.thrift_handler',
+    'http2thrift.flask_handler',
+    'http2thrift.cli',
+]
+
+_TIMER = (
+    'import time; t = time.time(); import {0}; '
+    'print((time.time() - t) * 1000)'
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(module, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.check_output(
+            [sys.executable, '-c', _TIMER.format(module)], cwd=ROOT)
+        samples.append(float(out.decode().strip().splitlines()[-1]))
+    samples.sort()
+    return samples[len(samples) // 2], samples[0]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--runs', type=int, default=10, help='runs per module')
+    ap.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    args = ap.parse_args()
+
+    print('%-40s %10s %10s' % ('module', 'median ms', 'min ms'))
+    for module in args.modules:
+        median, best = time_import(module, args.runs)
+        print('%-40s %10.1f %10.1f' % (module, median, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare encode/decode time and payload size of the binary and compact protocols.
+
+Each case is encoded into and decoded from a TMemoryBuffer, which exposes its
+buffer like TFramedTransport does. Run from the repository root:
+
+    python benchmark/protocols.py [-n RUNS] [case ...]
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http2thrift.thriftpy.parser import parse_fp    # noqa
+from http2thrift.thriftpy.protocol import TBinaryProtocol, TCompactProtocol    # noqa
+from http2thrift.thriftpy.transport import TMemoryBuffer    # noqa
+
+
+IDL = '''
+struct Item {
+  1: i64 id,
+  2: string name,
+  3: double price,
+  4: bool active,
+  5: list<string> tags,
+}
+
+struct Page {
+  1: i32 total,
+  2: list<Item> items,
+  3: map<string, i64> counters,
+}
+
+struct Numbers {
+  1: list<i32> small,
+  2: list<i64> big,
+  3: list<double> doubles,
+}
+'''
+
+PROTOCOLS = [
+    ('binary', TBinaryProtocol),
+    ('compact', TCompactProtocol),
+]
+
+
+def make_cases(m):
+    items = [
+        m.Item(id=i, name='item %d' % i, price=i * 0.5, active=i % 2 == 0, tags=['a', 'bc'])
+        for i in range(100)
+    ]
+    return [
+        ('page', m.Page, m.Page(total=100, items=items, counters={'k%d' % i: i for i in range(50)})),
+        ('ints', m.Numbers, m.Numbers(small=list(range(-500, 500)) * 10)),
+        ('longs', m.Numbers, m.Numbers(big=[i << 40 for i in range(10000)])),
+        ('doubles', m.Numbers, m.Numbers(doubles=[i / 3 for i in range(10000)])),
+    ]
+
+
+def encode(proto_cls, obj):
+    trans = TMemoryBuffer()
+    proto_cls(trans).write_struct(obj)
+    return trans.getvalue()
+
+
+def decode(proto_cls, cls, data):
+    obj = cls()
+    proto_cls(TMemoryBuffer(data)).read_struct(obj)
+    return obj
+
+
+def best_of(runs, fn, *args):
+    best = None
+    for _ in range(runs):
+        t = time.time()
+        fn(*args)
+        elapsed = time.time() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--runs', type=int, default=20, help='runs per case, the best is reported')
+    ap.add_argument('cases', nargs='*')
+    args = ap.parse_args()
+
+    m = parse_fp(io.StringIO(IDL), 'bench_thrift')
+
+    print('%-10s %-8s %10s %10s %10s' % ('case', 'protocol', 'bytes', 'encode ms', 'decode ms'))
+    for name, cls, obj in make_cases(m):
+        if args.cases and name not in args.cases:
+            continue
+        for proto_name, proto_cls in PROTOCOLS:
+            data = encode(proto_cls, obj)
+            assert decode(proto_cls, cls, data) == obj
+            print('%-10s %-8s %10d %10.2f %10.2f' % (
+                name, proto_name, len(data),
+                best_of(args.runs, encode, proto_cls, obj),
+                best_of(args.runs, decode, proto_cls, cls, data)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Compare calls per second through TBufferedTransport with the previous
+implementation, which allocated a new BytesIO on every read refill and
+flush.
+
+Client and server run in this process and talk over the loopback
+interface. Run from the repository root:
+
+    python benchmark/transports.py [-n CALLS] [case ...]
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import argparse
+import io
+import os
+import socket
+import sys
+import threading
+import time
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http2thrift.thriftpy.parser import parse_fp    # noqa
+from http2thrift.thriftpy.rpc import make_client, make_server    # noqa
+from http2thrift.thriftpy.transport import TBufferedTransportFactory, TTransportBase    # noqa
+
+
+IDL = '''
+struct Item {
+  1: i64 id,
+  2: string name,
+  3: list<i32> values,
+}
+
+service Echo {
+  void ping(),
+  list<Item> echo(1: list<Item> items),
+}
+'''
+
+
+class BytesIOBufferedTransport(TTransportBase):
+    """TBufferedTransport before the reusable buffers."""
+    def __init__(self, trans, buf_size=4096):
+        self._trans = trans
+        self._wbuf = BytesIO()
+        self._rbuf = BytesIO(b"")
+        self._buf_size = buf_size
+
+    def is_open(self):
+        return self._trans.is_open()
+
+    def open(self):
+        return self._trans.open()
+
+    def close(self):
+        return self._trans.close()
+
+    def _read(self, sz):
+        ret = self._rbuf.read(sz)
+        if len(ret) != 0:
+            return ret
+        self._rbuf = BytesIO(self._trans.read(max(sz, self._buf_size)))
+        return self._rbuf.read(sz)
+
+    def write(self, buf):
+        self._wbuf.write(buf)
+
+    def flush(self):
+        out = self._wbuf.getvalue()
+        self._wbuf = BytesIO()
+        self._trans.write(out)
+        self._trans.flush()
+
+
+class BytesIOBufferedTransportFactory(object):
+    def get_transport(self, trans):
+        return BytesIOBufferedTransport(trans)
+
+
+TRANSPORTS = [
+    ('bytesio', BytesIOBufferedTransportFactory),
+    ('reused', TBufferedTransportFactory),
+]
+
+
+class Handler(object):
+    def ping(self):
+        pass
+
+    def echo(self, items):
+        return items
+
+
+def make_items(m, n, values):
+    return [m.Item(id=i, name='item %d' % i, values=list(range(values))) for i in range(n)]
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def run(client, case, items, calls):
+    call = client.ping if case == 'ping' else lambda: client.echo(items)
+    call()
+    t = time.time()
+    for _ in range(calls):
+        call()
+    return calls / (time.time() - t)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('-n', '--calls', type=int, default=2000)
+    ap.add_argument('cases', nargs='*')
+    args = ap.parse_args()
+
+    m = parse_fp(io.StringIO(IDL), 'bench_thrift')
+    cases = [
+        ('ping', None),
+        ('small', make_items(m, 5, 10)),
+        ('page', make_items(m, 200, 20)),
+        ('large', make_items(m, 2000, 100)),
+    ]
+
+    print('%-8s %-8s %12s' % ('case', 'buffer', 'calls/s'))
+    for name, factory in TRANSPORTS:
+        port = free_port()
+        server = make_server(m.Echo, Handler(), '127.0.0.1', port, trans_factory=factory())
+        th = threading.Thread(target=server.serve)
+        th.daemon = True
+        th.start()
+        time.sleep(0.2)
+        client = make_client(m.Echo, '127.0.0.1', port, trans_factory=factory())
+        for case, items in cases:
+            if args.cases and case not in args.cases:
+                continue
+            calls = args.calls if case != 'large' else max(args.calls // 50, 1)
+            rate = run(client, case, items, calls)
+            print('%-8s %-8s %12.0f' % (case, name, rate))
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
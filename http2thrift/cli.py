@@ -13,8 +13,6 @@ try:
 except ImportError:
     from urllib.parse import urlparse
 
-import requests
-
 
 DEFAULT_HTTP_HOST = '127.0.0.1'
 DEFAULT_HTTP_PORT = 5001
@@ -41,6 +39,7 @@ def resp2dict(res):
 
 
 def call_method(http_host, http_port, thrift_host, thrift_port, path, args_dict):
+    import requests     # slow to import, only needed once a call is made
     url = make_url(http_host, http_port, path)
     data = dict(host=thrift_host, port=thrift_port, args=args_dict)
     res = requests.post(url, data=json.dumps(data))
@@ -48,12 +47,14 @@ def call_method(http_host, http_port, thrift_host, thrift_port, path, args_dict)
 
 
 def list_services(http_host, http_port):
+    import requests
     url = make_url(http_host, http_port)
     res = requests.get(url)
     return resp2dict(res)
 
 
 def get_sample(http_host, http_port, path):
+    import requests
     url = make_url(http_host, http_port, path, 'sample')
     res = requests.get(url)
     return resp2dict(res)
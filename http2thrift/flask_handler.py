@@ -6,11 +6,22 @@ from functools import wraps
 from flask import request, make_response
 
 from http2thrift.flask_app import get_app
-from http2thrift.thrift_handler import get_handler, ThriftRequest, ResourceNotFound
+from http2thrift.thriftpy._compat import monotonic, string_types
+from http2thrift.thrift_balancer import parse_group
+from http2thrift.thrift_handler import get_handler, ThriftRequest, ResourceNotFound, BadRequest, GatewayTimeout
 
 
 app = get_app()
-get_handler()   # init thrift handler
+
+BACKEND_OPTIONS = ('transport', 'protocol', 'multiplexed')
+
+# time budget of a call in ms, the "timeout" body field takes precedence
+TIMEOUT_HEADER = 'X-Request-Timeout'
+
+
+def init_handler():
+    """Start indexing thrift files now instead of on the first request."""
+    get_handler()
 
 
 def json_response(dct, code=200):
@@ -31,25 +42,75 @@ def json_api(f):
             result = f(*args, **kwargs)
         except ResourceNotFound as exc:
             return error_response(str(exc), 404)
+        except BadRequest as exc:
+            return error_response(str(exc), 400)
+        except GatewayTimeout as exc:
+            return error_response(str(exc), 504)
         else:
             return json_response(result)
 
     return g
 
 
+def get_ms(req_dict, key, default=None):
+    value = req_dict.get(key, default)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = 0
+    if not value > 0:
+        raise BadRequest('"%s" must be a positive number of milliseconds' % key)
+    return value
+
+
 @app.route('/api/thrift/<path:thrift_file>:<service>:<method>', methods=['POST'])
 @json_api
 def thrift_call(thrift_file, service, method):
+    received = monotonic()
     req_dict = json.loads(request.get_data(as_text=True))
     host = req_dict.get('host', '127.0.0.1')
     port = req_dict.get('port', 0)
-    if port == 0:
-        return error_response('"port" is required', 400)
+    # a unix socket path, "@name" in the abstract namespace, instead of host/port
+    unix_socket = req_dict.get('unix_socket')
+    # or endpoints to balance over, as a list or a group name
+    group = req_dict.get('group')
+    endpoints = None
+    if req_dict.get('backends') is not None:
+        if group is not None:
+            raise BadRequest('"backends" and "group" exclude each other')
+        try:
+            endpoints = parse_group(req_dict['backends'])
+        except ValueError as exc:
+            raise BadRequest('bad "backends": %s' % exc)
+    elif group is not None:
+        if not isinstance(group, string_types):
+            raise BadRequest('"group" must be a string')
+    elif unix_socket is not None:
+        if not isinstance(unix_socket, string_types) or not unix_socket.strip('@'):
+            raise BadRequest('"unix_socket" must be a path or "@name"')
+    elif port == 0:
+        raise BadRequest('"port", "unix_socket", "backends" or "group" is required')
     args_dict = req_dict.get('args', dict())
+    fields = req_dict.get('fields')     # dotted paths into the result, e.g. ["items.*.name"]
+    if fields is not None and not (isinstance(fields, list) and all(isinstance(p, string_types) for p in fields)):
+        raise BadRequest('"fields" must be a list of strings')
+
+    # transport/protocol/multiplexed override the backend settings
+    backend = dict((key, req_dict[key]) for key in BACKEND_OPTIONS if key in req_dict)
+
+    deadline = None
+    timeout = get_ms(req_dict, 'timeout', request.headers.get(TIMEOUT_HEADER))
+    if timeout is not None:
+        deadline = received + timeout / 1000
+    connect_timeout = get_ms(req_dict, 'connect_timeout')
 
     req = ThriftRequest(
-        host=host, port=port,
-        thrift_file=thrift_file, service=service, method=method, args=args_dict)
+        host=host, port=port, unix_socket=unix_socket,
+        thrift_file=thrift_file, service=service, method=method, args=args_dict, fields=fields,
+        backend=backend, deadline=deadline, connect_timeout=connect_timeout,
+        endpoints=endpoints, group=group)
     return get_handler().call(req)
 
 
@@ -0,0 +1,460 @@
+"""
+Transport and protocol settings of thrift backends.
+
+Settings are resolved per request from, in increasing priority, the
+defaults, the ``"*"`` entry and the endpoint's entry of the backends file
+named by ``HTTP2THRIFT_BACKENDS``, and the request itself::
+
+    {
+        "*": {"transport": "framed", "protocol": "binary"},
+        "10.0.0.5:9090": {"protocol": "compact", "multiplexed": true},
+        "10.0.0.6:9090": {"transport": "auto", "protocol": "auto"},
+        "unix:/run/search.sock": {"transport": "buffered"}
+    }
+
+Endpoints are named ``"host:port"``, ``"[addr]:port"`` for IPv6 addresses,
+or ``"unix:<path>"`` for unix domain sockets, with ``"unix:@<name>"`` for
+the Linux abstract namespace.
+
+``"auto"`` detects the transport and/or protocol by probing the endpoint
+once, the result is cached per endpoint. ``multiplexed`` is the name the
+service is registered with in a multiplexed server, ``true`` for the
+service name.
+
+The ``"compressed"`` transport is framed with zlib compression of large
+frames, the backend must use TCompressedFramedServerTransportFactory.
+
+``"warm": N`` in an endpoint's entry keeps N connections to it open ahead
+of use, from startup on and refilled as they are taken, e.g. when a
+connection is replaced after a failure. Host names are resolved through a
+cache kept for ``HTTP2THRIFT_DNS_TTL`` seconds, calls go round robin over
+the addresses of a name.
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+from collections import namedtuple
+import errno
+import json
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from http2thrift.thriftpy import protocol as thrift_protocol
+from http2thrift.thriftpy._compat import monotonic, string_types
+from http2thrift.thriftpy.thrift import TMessageType, TMultiplexedProcessor, TPayload, gen_init
+from http2thrift.thriftpy.transport import (
+    TSocket, TFramedTransportFactory, TBufferedTransportFactory,
+    TCompressedFramedTransportFactory, TTransportException)
+
+from http2thrift import get_logger
+
+
+L = get_logger(__name__)
+
+
+AUTO = 'auto'
+
+TRANSPORTS = {
+    'framed': TFramedTransportFactory,
+    'buffered': TBufferedTransportFactory,
+    'compressed': TCompressedFramedTransportFactory,
+}
+
+# factory names, all but binary are imported on first use
+PROTOCOLS = {
+    'binary': 'TBinaryProtocolFactory',
+    'compact': 'TCompactProtocolFactory',
+    'json': 'TJSONProtocolFactory',
+}
+
+# probed in this order, most common first; a compressing server answers
+# plain frames too, so it is tried before framed
+PROBE_ORDER = [
+    ('compressed', 'binary'),
+    ('framed', 'binary'), ('buffered', 'binary'),
+    ('framed', 'compact'), ('buffered', 'compact'),
+    ('framed', 'json'), ('buffered', 'json'),
+]
+PROBE_TIMEOUT = 1000    # ms, per attempt
+PROBE_METHOD = '__http2thrift_probe__'
+
+BackendConfig = namedtuple('BackendConfig', ['transport', 'protocol', 'multiplexed'])
+
+DEFAULT_CONFIG = BackendConfig(transport='framed', protocol='binary', multiplexed=None)
+
+# backends file only: connections to keep open ahead of use
+WARM = 'warm'
+
+DNS_TTL = 30    # s
+
+BaseEndpoint = namedtuple('Endpoint', ['host', 'port', 'unix_socket'])
+
+
+class Endpoint(BaseEndpoint):
+    """Address of a backend: TCP `host` and `port`, or `unix_socket`, a
+    path or "@name" in the Linux abstract namespace.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, host=None, port=None, unix_socket=None):
+        # type: (Optional[str], Optional[int], Optional[str]) -> Endpoint
+        if unix_socket:
+            return cls(None, None, unix_socket)
+        return cls(host, port, None)
+
+    @classmethod
+    def parse(cls, name):
+        # type: (str) -> Endpoint
+        """Inverse of `str`, raises ValueError."""
+        if name.startswith('unix:'):
+            return cls.make(unix_socket=name[len('unix:'):])
+        host, _, port = name.rpartition(':')
+        if not host:
+            raise ValueError('expected "host:port" or "unix:path": %r' % (name,))
+        return cls.make(host.strip('[]'), int(port))
+
+    def __str__(self):
+        if self.unix_socket:
+            return 'unix:%s' % self.unix_socket
+        if ':' in (self.host or ''):
+            return '[%s]:%s' % (self.host, self.port)
+        return '%s:%s' % (self.host, self.port)
+
+    @property
+    def unix_address(self):
+        # type: () -> Optional[str]
+        """`unix_socket` as passed to connect, abstract names start with NUL."""
+        if self.unix_socket and self.unix_socket.startswith('@'):
+            return '\0' + self.unix_socket[1:]
+        return self.unix_socket
+
+    def make_socket(self, timeout=None, connect_timeout=None, resolver=None):
+        # type: (Optional[int], Optional[int], Optional[Resolver]) -> TSocket
+        """An unopened socket, connecting to an address from `resolver`."""
+        if self.unix_socket:
+            return TSocket(unix_socket=self.unix_address,
+                           socket_timeout=timeout, connect_timeout=connect_timeout)
+        if resolver is None:
+            return TSocket(self.host, self.port,
+                           socket_timeout=timeout, connect_timeout=connect_timeout)
+        family, addr = resolver.resolve(self.host, self.port)
+        return TSocket(addr[0], addr[1], socket_family=family,
+                       socket_timeout=timeout, connect_timeout=connect_timeout)
+
+
+class Resolver(object):
+    """Caches the addresses of host names for `ttl` seconds and hands them
+    out round robin. The last addresses are kept while the name fails to
+    resolve.
+    """
+    def __init__(self, ttl=DNS_TTL):
+        # type: (float) -> None
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cache = dict()     # type: Dict[Tuple[str, int], list]
+
+    def resolve(self, host, port):
+        # type: (str, int) -> Tuple[int, tuple]
+        """The address family and socket address of the next address."""
+        key = host, port
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry is None or entry[0] <= monotonic():
+            entry = self._lookup(host, port, entry)
+            with self.lock:
+                self.cache[key] = entry
+        # [expires, addresses, next], racing updates of next are harmless
+        addrs = entry[1]
+        i = entry[2]
+        entry[2] = (i + 1) % len(addrs)
+        return addrs[i]
+
+    def _lookup(self, host, port, stale):
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.error as exc:
+            if stale is None:
+                raise TTransportException(
+                    TTransportException.NOT_OPEN, 'Could not resolve %s: %s' % (host, exc))
+            L.warning('resolving %s failed, keeping %d addresses: %r', host, len(stale[1]), exc)
+            return [monotonic() + self.ttl, stale[1], stale[2]]
+
+        addrs = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr[:2]) not in addrs:
+                addrs.append((family, sockaddr[:2]))
+        return [monotonic() + self.ttl, addrs, 0]
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+def check_options(options, backends_file=False):
+    # type: (Dict[str, Any], bool) -> Dict[str, Any]
+    """Validate backend options, raises ValueError."""
+    for key, value in options.items():
+        if key == WARM and backends_file:
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError('"warm" must be a number of connections')
+            continue
+        if key == 'transport':
+            if value != AUTO and value not in TRANSPORTS:
+                raise ValueError('unknown transport: %r' % (value,))
+        elif key == 'protocol':
+            if value != AUTO and value not in PROTOCOLS:
+                raise ValueError('unknown protocol: %r' % (value,))
+        elif key == 'multiplexed':
+            if value is not None and not isinstance(value, (bool,) + string_types):
+                raise ValueError('"multiplexed" must be a service name or a boolean')
+        else:
+            raise ValueError('unknown backend option: %r' % (key,))
+    return options
+
+
+def load_backends(path):
+    # type: (str) -> Dict[str, Dict[str, Any]]
+    with open(path) as f:
+        backends = json.load(f)
+    for endpoint, options in backends.items():
+        try:
+            if endpoint != '*':
+                Endpoint.parse(endpoint)
+            check_options(options, backends_file=True)
+        except ValueError as exc:
+            raise ValueError('%s: backend %r: %s' % (path, endpoint, exc))
+    return backends
+
+
+class _ProbeArgs(TPayload):
+    pass
+
+
+gen_init(_ProbeArgs, {}, [])
+
+
+def protocol_factory(config, service_name=None):
+    # type: (BackendConfig, Optional[str]) -> Any
+    factory = getattr(thrift_protocol, PROTOCOLS[config.protocol])()
+    multiplexed = config.multiplexed
+    if multiplexed is True:
+        multiplexed = service_name
+    if multiplexed:
+        factory = thrift_protocol.TMultiplexedProtocolFactory(factory, multiplexed)
+    return factory
+
+
+def probe(endpoint, config, service_name=None, timeout=PROBE_TIMEOUT, deadline=None, resolver=None):
+    # type: (Endpoint, BackendConfig, Optional[str], int, Optional[float], Optional[Resolver]) -> Optional[Tuple[str, str]]
+    """Find a transport and protocol the endpoint answers with.
+
+    A call to a method no service has is sent with each candidate, a
+    server understanding it replies with an UNKNOWN_METHOD exception.
+    Candidates are limited to the transport/protocol of `config` which are
+    not `AUTO`. Returns None if no candidate got an answer, raises
+    TTransportException(TIMED_OUT) if the `monotonic` time `deadline`
+    passes first.
+    """
+    for transport, protocol in PROBE_ORDER:
+        if config.transport not in (AUTO, transport) or config.protocol not in (AUTO, protocol):
+            continue
+        candidate = config._replace(transport=transport, protocol=protocol)
+        if _probe_one(endpoint, candidate, service_name, timeout, deadline, resolver):
+            return transport, protocol
+    return None
+
+
+def _probe_one(endpoint, config, service_name, timeout, deadline, resolver):
+    sock = endpoint.make_socket(timeout, timeout, resolver)
+    sock.set_deadline(deadline)
+    trans = TRANSPORTS[config.transport]().get_transport(sock)
+    proto = protocol_factory(config, service_name).get_protocol(trans)
+    try:
+        trans.open()
+        proto.write_message_begin(PROBE_METHOD, TMessageType.CALL, 1)
+        proto.write_struct(_ProbeArgs())
+        proto.write_message_end()
+        trans.flush()
+        name, mtype, seqid = proto.read_message_begin()
+    except Exception as exc:    # garbage in any protocol may raise anything
+        if deadline is not None and monotonic() >= deadline:
+            raise TTransportException(TTransportException.TIMED_OUT, 'Deadline exceeded while probing')
+        L.debug('probe %s %r failed: %r', endpoint, config, exc)
+        return False
+    finally:
+        trans.close()
+
+    name = name.rpartition(TMultiplexedProcessor.SEPARATOR)[2]
+    return name == PROBE_METHOD and seqid == 1 and mtype in (TMessageType.REPLY, TMessageType.EXCEPTION)
+
+
+class BackendRegistry(object):
+    def __init__(self, backends=None, probe_timeout=PROBE_TIMEOUT, resolver=None):
+        # type: (Optional[Dict[str, Dict[str, Any]]], int, Optional[Resolver]) -> None
+        self.backends = backends or dict()
+        self.probe_timeout = probe_timeout
+        self.resolver = resolver or Resolver()
+        self.lock = threading.Lock()
+        self.probed = dict()    # type: Dict[Tuple[Endpoint, BackendConfig], Tuple[str, str]]
+
+    def resolve(self, endpoint, options=None, service_name=None, deadline=None):
+        # type: (Endpoint, Optional[Dict[str, Any]], Optional[str], Optional[float]) -> BackendConfig
+        """Settings for a call to `endpoint`, probing if needed by the
+        `monotonic` time `deadline`.
+
+        Raises ValueError on bad `options` and TTransportException if
+        probing finds nothing.
+        """
+        merged = dict(DEFAULT_CONFIG._asdict())
+        merged.update(self.backends.get('*', {}))
+        merged.update(self.backends.get(str(endpoint), {}))
+        merged.update(check_options(dict(options or {})))
+        merged.pop(WARM, None)
+        config = BackendConfig(**merged)
+
+        if config.transport != AUTO and config.protocol != AUTO:
+            return config
+
+        key = endpoint, config
+        with self.lock:
+            found = self.probed.get(key)
+        if found is None:
+            found = probe(endpoint, config, service_name, self.probe_timeout, deadline, self.resolver)
+            if found is None:
+                raise TTransportException(
+                    TTransportException.UNKNOWN,
+                    'cannot detect transport/protocol of %s' % (endpoint,))
+            L.info('probed %s: %s transport, %s protocol', endpoint, found[0], found[1])
+            with self.lock:
+                self.probed[key] = found
+        return config._replace(transport=found[0], protocol=found[1])
+
+    def forget(self, endpoint):
+        # type: (Endpoint) -> None
+        """Probe the endpoint again on the next call, e.g. after a failure."""
+        with self.lock:
+            for key in [key for key in self.probed if key[0] == endpoint]:
+                del self.probed[key]
+
+    def warm_endpoints(self):
+        # type: () -> List[Tuple[Endpoint, int]]
+        """The endpoints of the backends file to keep connections open to."""
+        return [(Endpoint.parse(name), options[WARM]) for name, options in self.backends.items()
+                if name != '*' and options.get(WARM)]
+
+
+def _is_alive(sock):
+    # type: (TSocket) -> bool
+    """An idle connection is usable if the peer neither closed it nor sent
+    anything.
+    """
+    raw = sock.sock
+    raw.setblocking(False)
+    try:
+        raw.recv(1, socket.MSG_PEEK)    # returns on data or EOF
+        return False
+    except socket.error as exc:
+        return exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK)
+    finally:
+        raw.settimeout(sock.socket_timeout)
+
+
+class WarmPool(object):
+    """Opened transports to endpoints, taken by clients instead of
+    connecting. Background threads keep `size` of them per endpoint and
+    transport, a failed connect stops filling until the next `take`.
+    """
+    def __init__(self, resolver, timeout, connect_timeout):
+        # type: (Resolver, int, int) -> None
+        self.resolver = resolver
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        self.sizes = dict()     # type: Dict[Tuple[Endpoint, str], int]
+        self.idle = dict()      # type: Dict[Tuple[Endpoint, str], List[Tuple[TSocket, Any]]]
+        self.filling = set()
+
+    def start(self, registry):
+        # type: (BackendRegistry) -> None
+        """Warm the endpoints configured in `registry`, in the background
+        as "auto" settings are probed first.
+        """
+        endpoints = registry.warm_endpoints()
+        if endpoints:
+            th = threading.Thread(target=self._start, args=(registry, endpoints))
+            th.daemon = True
+            th.start()
+
+    def _start(self, registry, endpoints):
+        for endpoint, size in endpoints:
+            try:
+                config = registry.resolve(endpoint)
+            except TTransportException as texc:
+                L.warning('not warming %s: %s', endpoint, texc.message)
+                continue
+            self.want(endpoint, config.transport, size)
+
+    def want(self, endpoint, transport, size):
+        # type: (Endpoint, str, int) -> None
+        key = endpoint, transport
+        with self.lock:
+            self.sizes[key] = size
+            self.idle.setdefault(key, [])
+        self._refill(key)
+
+    def take(self, endpoint, transport):
+        # type: (Endpoint, str) -> Optional[Tuple[TSocket, Any]]
+        """An opened socket and transport, None if none is ready."""
+        key = endpoint, transport
+        if key not in self.sizes:
+            return None
+        taken = None
+        while taken is None:
+            with self.lock:
+                idle = self.idle.get(key)
+                if not idle:
+                    break
+                taken = idle.pop()
+            if not _is_alive(taken[0]):
+                taken[1].close()
+                taken = None
+        self._refill(key)
+        return taken
+
+    def _refill(self, key):
+        with self.lock:
+            if key in self.filling or len(self.idle.get(key, ())) >= self.sizes.get(key, 0):
+                return
+            self.filling.add(key)
+        th = threading.Thread(target=self._fill, args=key)
+        th.daemon = True
+        th.start()
+
+    def _fill(self, endpoint, transport):
+        key = endpoint, transport
+        try:
+            while len(self.idle.get(key, ())) < self.sizes.get(key, 0):
+                sock = endpoint.make_socket(self.timeout, self.connect_timeout, self.resolver)
+                trans = TRANSPORTS[transport]().get_transport(sock)
+                trans.open()
+                with self.lock:
+                    idle = self.idle.get(key)
+                    if idle is not None:
+                        idle.append((sock, trans))
+                if idle is None:    # closed meanwhile
+                    trans.close()
+        except TTransportException as texc:
+            L.warning('warming %s: %s', endpoint, texc.message)
+        finally:
+            with self.lock:
+                self.filling.discard(key)
+
+    def close(self):
+        with self.lock:
+            self.sizes.clear()
+            idle, self.idle = self.idle, dict()
+        for conns in idle.values():
+            for _, trans in conns:
+                trans.close()
@@ -0,0 +1,175 @@
+"""
+Balancing calls over groups of backend endpoints.
+
+A request names its backends with ``"backends": ["10.0.0.5:9090", ...]``,
+or ``"group": "search"`` for a group of the file named by
+``HTTP2THRIFT_GROUPS``, which is reloaded when it changes::
+
+    {
+        "search": ["10.0.0.5:9090", "10.0.0.6:9090"],
+        "users": ["unix:/run/users.sock"]
+    }
+
+Each call goes to the better of two random endpoints of the group, by
+calls in flight and recent latency (power of two choices). Endpoints that
+fail ``FAIL_LIMIT`` times in a row at the transport level are left out for
+``COOLDOWN`` seconds, unless no other endpoint is left, then get one call
+to prove themselves.
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import json
+import os
+import random
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from http2thrift.thriftpy._compat import monotonic, string_types
+from http2thrift.thrift_backend import Endpoint
+
+from http2thrift import get_logger
+
+
+L = get_logger(__name__)
+
+FAIL_LIMIT = 3
+COOLDOWN = 5            # s
+MAX_ATTEMPTS = 3        # endpoints tried per call while connecting fails
+LATENCY_DECAY = 0.2     # weight of the latest call in the average
+MIN_LATENCY = 0.001     # s, floor of the average, unmeasured endpoints have it
+RELOAD_INTERVAL = 1     # s, between checks of the groups file
+
+
+class EndpointStats(object):
+    __slots__ = ('outstanding', 'latency', 'failures', 'down_until')
+
+    def __init__(self):
+        self.outstanding = 0
+        self.latency = 0.0      # s, moving average
+        self.failures = 0       # in a row
+        self.down_until = 0.0
+
+    def score(self):
+        return (self.outstanding + 1) * (self.latency + MIN_LATENCY)
+
+
+class Balancer(object):
+    def __init__(self, fail_limit=FAIL_LIMIT, cooldown=COOLDOWN):
+        # type: (int, float) -> None
+        self.fail_limit = fail_limit
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.stats = dict()     # type: Dict[Endpoint, EndpointStats]
+
+    def pick(self, endpoints, exclude=()):
+        # type: (Sequence[Endpoint], Sequence[Endpoint]) -> Endpoint
+        """The endpoint for the next call, not one of `exclude` unless all
+        of them are. Raises ValueError if `endpoints` is empty.
+        """
+        if not endpoints:
+            raise ValueError('no endpoints to pick from')
+        now = monotonic()
+        with self.lock:
+            candidates = [e for e in endpoints if e not in exclude] or list(endpoints)
+            healthy = [e for e in candidates if self._stats(e).down_until <= now]
+            choices = healthy or candidates
+            if len(choices) == 1:
+                return choices[0]
+            a, b = random.sample(choices, 2)
+            return a if self.stats[a].score() <= self.stats[b].score() else b
+
+    def begin(self, endpoint):
+        # type: (Endpoint) -> float
+        """Count a call to `endpoint` as in flight, returns its start time."""
+        with self.lock:
+            self._stats(endpoint).outstanding += 1
+        return monotonic()
+
+    def end(self, endpoint, started, failed):
+        # type: (Endpoint, float, bool) -> None
+        """Account the call started at `started`, `failed` at the transport
+        level, e.g. connection refused or timed out.
+        """
+        elapsed = monotonic() - started
+        with self.lock:
+            stats = self._stats(endpoint)
+            stats.outstanding -= 1
+            # failing fast says nothing about speed, timing out does
+            if not failed or elapsed > stats.latency:
+                stats.latency += (elapsed - stats.latency) * LATENCY_DECAY
+            if not failed:
+                stats.failures = 0
+                stats.down_until = 0.0
+                return
+            stats.failures += 1
+            if stats.failures >= self.fail_limit:
+                if stats.down_until <= monotonic():
+                    L.warning('%s failed %d times, leaving it out for %ss',
+                              endpoint, stats.failures, self.cooldown)
+                stats.down_until = monotonic() + self.cooldown
+
+    def _stats(self, endpoint):
+        stats = self.stats.get(endpoint)
+        if stats is None:
+            stats = self.stats[endpoint] = EndpointStats()
+        return stats
+
+
+def parse_group(names):
+    # type: (List[str]) -> List[Endpoint]
+    """Endpoints named by the list `names`, raises ValueError."""
+    if not isinstance(names, list) or not names or \
+            not all(isinstance(name, string_types) for name in names):
+        raise ValueError('expected a non-empty list of endpoints')
+    return [Endpoint.parse(name) for name in names]
+
+
+def load_groups(path):
+    # type: (str) -> Dict[str, List[Endpoint]]
+    with open(path) as f:
+        groups = json.load(f)
+    if not isinstance(groups, dict):
+        raise ValueError('%s: expected an object of groups' % path)
+    for name, names in groups.items():
+        try:
+            groups[name] = parse_group(names)
+        except ValueError as exc:
+            raise ValueError('%s: group %r: %s' % (path, name, exc))
+    return groups
+
+
+class GroupFile(object):
+    """Groups of `path`, reloaded when its mtime changes. A broken file is
+    logged and the groups loaded last are kept.
+    """
+    def __init__(self, path, reload_interval=RELOAD_INTERVAL):
+        # type: (str, float) -> None
+        self.path = path
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.mtime = os.stat(path).st_mtime
+        self.groups = load_groups(path)
+        self.next_check = monotonic() + reload_interval
+
+    def get(self, name):
+        # type: (str) -> Optional[List[Endpoint]]
+        if monotonic() >= self.next_check:
+            self.reload()
+        return self.groups.get(name)
+
+    def reload(self):
+        with self.lock:
+            if monotonic() < self.next_check:
+                return
+            self.next_check = monotonic() + self.reload_interval
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self.mtime:
+                    return
+                self.mtime = mtime
+                self.groups = load_groups(self.path)
+            except (OSError, ValueError) as exc:
+                L.error('keeping backend groups, reloading failed: %s', exc)
+                return
+        L.info('reloaded backend groups: %s', ', '.join(sorted(self.groups)))
@@ -2,26 +2,43 @@ from __future__ import (unicode_literals, print_function, division, absolute_imp
 
 import os
 import fnmatch
+import functools
 import traceback
 from collections import namedtuple, OrderedDict, defaultdict
 import threading
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from http2thrift.thriftpy.parser import parse as thrift_parse
+from http2thrift.thriftpy.parser import parse as thrift_parse, IncludeResolver, SourceBundle
 from http2thrift.thriftpy.thrift import TApplicationException, TException
-from http2thrift.thriftpy.rpc import make_client, TClient
-from http2thrift.thriftpy.transport import TFramedTransportFactory
+from http2thrift.thriftpy.rpc import TClient
+from http2thrift.thriftpy.protocol import TBinaryProtocol
+from http2thrift.thriftpy.transport import TSocket, TTransportException
 
 from http2thrift import get_logger
-from http2thrift.thrift_util import generate_sample_struct, get_args_obj, get_result_obj, struct_to_json
+from http2thrift.thrift_backend import (
+    DNS_TTL, BackendRegistry, Endpoint, Resolver, TRANSPORTS, WarmPool, load_backends, protocol_factory)
+from http2thrift.thrift_balancer import MAX_ATTEMPTS, Balancer, GroupFile
+from http2thrift.thrift_intern import SpecInterner
+from http2thrift.thrift_util import (
+    generate_sample_struct, get_args_obj, get_result_obj, struct_to_json, compile_result_fields)
 
 
 L = get_logger(__name__)
 
+DEFAULT_TIMEOUT = 10000             # ms, per read or write
+DEFAULT_CONNECT_TIMEOUT = 10000     # ms
+
 
 BaseRequest = namedtuple('Request', [
-    'host', 'port', 'thrift_file', 'service', 'method', 'args',
+    'host', 'port', 'thrift_file', 'service', 'method', 'args', 'fields', 'backend', 'unix_socket',
+    'deadline', 'connect_timeout', 'endpoints', 'group',
 ])
+# fields: return everything, backend: options overriding the backend settings,
+# unix_socket: connect to it instead of host/port, deadline: `monotonic` time
+# the call must be done by, connect_timeout: ms, overriding the handler's,
+# endpoints/group: balance over a list of Endpoint or a named group instead
+BaseRequest.__new__.__defaults__ = (None,) * 7
 
 
 class ResourceNotFound(Exception):
@@ -32,10 +49,20 @@ class MultipleMatchingService(Exception):
     pass
 
 
-class ThriftRequest(BaseRequest):
+class BadRequest(Exception):
+    pass
+
+
+class GatewayTimeout(Exception):
     pass
 
 
+class ThriftRequest(BaseRequest):
+    @property
+    def endpoint(self):
+        return Endpoint.make(self.host, self.port, self.unix_socket)
+
+
 def glob_recursive(dirpath, pattern):
     for root, dirnames, filenames in os.walk(dirpath, followlinks=True):
         for filename in fnmatch.filter(filenames, pattern):
@@ -43,26 +70,43 @@ def glob_recursive(dirpath, pattern):
 
 
 def handle_exception(exc, result):
-    for k in sorted(result.thrift_spec):
-        if result.thrift_spec[k][1] == "success":
+    for f in result.thrift_fields:
+        if f.name == "success":
             continue
 
-        _, exc_name, exc_cls, _ = result.thrift_spec[k]
-        if isinstance(exc, exc_cls):
-            setattr(result, exc_name, exc)
+        if isinstance(exc, f.spec):
+            setattr(result, f.name, exc)
             return True
     else:
         return False
 
 
-def call_method(service, handler, method, args, result):
+def projected_request(client, method, fields, *args):
+    """Like `client.<method>(*args)` but only decode the fields of the
+    result selected by the projection `fields`.
+    """
+    args_fields = getattr(client._service, method + '_args').thrift_fields
+    client._send(method, **dict(zip((f.name for f in args_fields), args)))
+    if not getattr(client._service, method + '_result').oneway:
+        return client._recv(method, fields)
+
+
+def _decodes_projection(proto):
+    # only the binary protocol skips unselected fields while decoding
+    proto = getattr(proto, '_proto', proto)     # multiplexed
+    return isinstance(proto, TBinaryProtocol)
+
+
+def call_method(service, handler, method, args, result, fields=None):
     try:
         f = getattr(handler, method)
     except AttributeError:
         raise TApplicationException(
             TApplicationException.INTERNAL_ERROR, 'method not implemented: %s' % (method,))
+    if fields is not None and isinstance(handler, TClient) and _decodes_projection(handler._iprot):
+        f = functools.partial(projected_request, handler, method, fields)
 
-    args_list = [getattr(args, args.thrift_spec[k][1]) for k in sorted(args.thrift_spec)]
+    args_list = [getattr(args, field.name) for field in args.thrift_fields]
 
     try:
         result.success = f(*args_list)
@@ -71,7 +115,7 @@ def call_method(service, handler, method, args, result):
             raise
 
 
-def call_method_with_dict(service, handler, method, args_dict):
+def call_method_with_dict(service, handler, method, args_dict, fields=None):
     if method not in service.thrift_services:
         raise TApplicationException(
             TApplicationException.UNKNOWN_METHOD,
@@ -80,7 +124,7 @@ def call_method_with_dict(service, handler, method, args_dict):
     args = get_args_obj(service, method, args_dict)
     result = get_result_obj(service, method)
 
-    call_method(service, handler, method, args, result)
+    call_method(service, handler, method, args, result, fields)
     return result
 
 
@@ -91,12 +135,17 @@ def wrap_exception(exc):
     ])
 
 
-def call_method_wrapped(service, handler, method, args_dict):
-    # type: (Any, Any, str, dict) -> dict
+def call_method_wrapped(service, handler, method, args_dict, fields=None):
+    # type: (Any, Any, str, dict, Optional[dict]) -> dict
 
     exception = None
     try:
-        res = call_method_with_dict(service, handler, method, args_dict)
+        res = call_method_with_dict(service, handler, method, args_dict, fields)
+    except TTransportException as texc:
+        if texc.type == TTransportException.TIMED_OUT:
+            raise
+        traceback.print_exc()
+        exception = texc
     except TException as texc:
         traceback.print_exc()
         exception = texc
@@ -105,7 +154,7 @@ def call_method_wrapped(service, handler, method, args_dict):
         exception = TApplicationException(
             TApplicationException.INTERNAL_ERROR, 'uncaught exception: %r' % exc)
     else:
-        return struct_to_json(res)
+        return struct_to_json(res, fields)
 
     # exception
     assert exception is not None
@@ -130,40 +179,90 @@ def _thrift_service_list_method(thrift_svc):
     return thrift_svc.thrift_services
 
 
-def _thrift_parse_module(thrift_file):
-    return thrift_parse(str(thrift_file), enable_cache=False)   # path must be str in py2
+def _thrift_parse_module(thrift_file, include_resolver):
+    # path must be str in py2
+    return thrift_parse(str(thrift_file), include_resolver=include_resolver)
 
 
 class ThriftIndexer(object):
-    def __init__(self, dirpath='.'):
+    def __init__(self, dirpath='.', include_resolver=None):
         self.dir = dirpath
         self.lock = threading.Lock()
         # indexes
         self.path_to_module_info = dict()   # type: Dict[str, ThriftModuleInfo]
         self.service_to_module_info_set = defaultdict(set)
         self.method_to_module_info_set = defaultdict(set)
+        # include graph and parsed modules, keyed by resolver key
+        self.resolver = include_resolver or IncludeResolver()
+        self.key_to_path = dict()   # type: Dict[str, str]
+        # files which failed to parse, e.g. for a missing include, they are
+        # not in the include graph and are retried when files change
+        self.failed = set()     # type: Set[str]
+        self.interner = SpecInterner()
 
     def add(self, path, thrift_module=None):
         normpath = os.path.normpath(path)
         fullpath = os.path.join(self.dir, path)
         L.debug('loading thrift file: "%s"', fullpath)
+        self.key_to_path[self.resolver.key(fullpath)] = path
 
         if thrift_module is None:
             try:
-                thrift_module = _thrift_parse_module(fullpath)
+                thrift_module = _thrift_parse_module(fullpath, self.resolver)
             except Exception as exc:
                 L.error('bad thrift file: "%s", exc: %r', path, exc)
+                self.remove(path)
+                self.failed.add(normpath)
                 return
+        self.failed.discard(normpath)
+        self.interner.intern_module(thrift_module)
         mi = ThriftModuleInfo(normpath, thrift_module)
 
         # indexes
         with self.lock:
+            self._remove(normpath)
             self.path_to_module_info[normpath] = mi
             for thrift_svc in _thrift_module_list_services(thrift_module):
                 self.service_to_module_info_set[_thrift_service_name(thrift_svc)].add(mi)
                 for method in _thrift_service_list_method(thrift_svc):
                     self.method_to_module_info_set[method].add(mi)
 
+    def remove(self, path):
+        normpath = os.path.normpath(path)
+        self.failed.discard(normpath)
+        with self.lock:
+            self._remove(normpath)
+
+    def _remove(self, normpath):
+        mi = self.path_to_module_info.pop(normpath, None)
+        if mi is None:
+            return
+
+        for thrift_svc in _thrift_module_list_services(mi.module):
+            self.service_to_module_info_set[_thrift_service_name(thrift_svc)].discard(mi)
+            for method in _thrift_service_list_method(thrift_svc):
+                self.method_to_module_info_set[method].discard(mi)
+
+    def update(self, changed=(), removed=()):
+        """Reparse changed files and the files that transitively include them."""
+        fullpaths = [os.path.join(self.dir, path) for path in list(changed) + list(removed)]
+        stale = self.resolver.invalidate(fullpaths)
+
+        removed = set(os.path.normpath(path) for path in removed)
+        for path in removed:
+            self.remove(path)
+
+        for key in stale:
+            path = self.key_to_path.get(key)
+            if path is not None and os.path.normpath(path) not in removed:
+                self.add(path)
+
+    def retry(self, paths):
+        """Reparse those of `paths` which still failed to parse."""
+        for path in paths:
+            if path in self.failed:
+                self.add(path)
+
     def query(self, path=None, service=None, method=None):
         svc_list = []
 
@@ -207,35 +306,171 @@ class ThriftIndexer(object):
 
 class ThriftHandler(object):
     # public
-    def __init__(self, dirpath):
+    def __init__(self, dirpath, rescan_interval=0, backends=None,
+                 timeout=DEFAULT_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT, dns_ttl=DNS_TTL,
+                 groups=None):
         self.dir = dirpath
-        self.index = ThriftIndexer(dirpath)
+        if os.path.isfile(dirpath):
+            # IDL bundle, paths are relative to the archive root
+            self.index = ThriftIndexer('', include_resolver=SourceBundle.from_archive(dirpath))
+        else:
+            self.index = ThriftIndexer(dirpath)
         self.key2client = threading.local()
+        self.backends = BackendRegistry(backends, resolver=Resolver(dns_ttl))
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool = WarmPool(self.backends.resolver, timeout, connect_timeout)
+        self.groups = groups    # type: Optional[GroupFile]
+        self.balancer = Balancer()
+        self.rescan_interval = rescan_interval
+        self.path_to_mtime = dict()     # type: Dict[str, float]
+        self.collector = None
+        self.ready = threading.Event()  # set once the first scan is done
 
     def start(self):
-        threading.Thread(target=self._collector_thread).start()
+        if self.collector is None:
+            self.collector = threading.Thread(target=self._collector_thread)
+            self.collector.start()
+            self.pool.start(self.backends)
+
+    def wait_ready(self):
+        if self.collector is not None:
+            self.ready.wait()
+
+    def scan(self):
+        """Index new thrift files, reindex changed ones and drop deleted ones."""
+        resolver = self.index.resolver
+        resolver.clear()
+        self.index.interner.begin_scan()
+
+        if isinstance(resolver, SourceBundle):
+            paths = resolver.glob('*.thrift')
+        else:
+            paths = glob_recursive(self.dir, '*.thrift')
+
+        path_to_mtime = dict()
+        for path in paths:
+            st = resolver.stat(os.path.join(self.index.dir, path))
+            path_to_mtime[path] = st.st_mtime if st is not None else None
+
+        old = self.path_to_mtime
+        self.path_to_mtime = path_to_mtime
+
+        added = [path for path in path_to_mtime if path not in old]
+        changed = [path for path in path_to_mtime if path in old and old[path] != path_to_mtime[path]]
+        removed = [path for path in old if path not in path_to_mtime]
+        # the rest is parsed anyway
+        failed = self.index.failed.difference(os.path.normpath(path) for path in added + changed)
+
+        for path in added:
+            self.index.add(path)
+        if changed or removed:
+            L.debug('changed: %r, removed: %r', changed, removed)
+            self.index.update(changed, removed)
+        if failed and (added or changed or removed):
+            # a missing include may have been added or fixed
+            self.index.retry(failed)
+
+        if added or changed:
+            L.info('spec interning of the scan: %r', self.index.interner.stats())
 
     # private
     def _collector_thread(self):
         L.debug('starting collector')
-        for path in glob_recursive(self.dir, '*.thrift'):
-            self.index.add(path)
+        try:
+            self.scan()
+        finally:
+            self.ready.set()
+        while self.rescan_interval > 0:
+            time.sleep(self.rescan_interval)
+            self.scan()
 
     def call(self, req):
         # type: (ThriftRequest) -> dict
         service = self.get_service(req.thrift_file, req.service, req.method)
+        fields = None
+        if req.fields is not None:
+            fields = self.compile_fields(service, req.method, req.fields)
+        endpoints = self.get_endpoints(req)
+        if len(endpoints) > 1:
+            return self.call_group(service, endpoints, req, fields)
+
+        endpoint = endpoints[0]
         try:
-            client = self.get_client(service, req.host, req.port)
-        except TException as texc:  # TTransportException and etc
+            client, sock, config = self.connect(service, endpoint, req)
+        except TException as texc:
             return wrap_exception(texc)
+        return self.call_client(service, endpoint, config, client, sock, req, fields)
+
+    def call_group(self, service, endpoints, req, fields):
+        # type: (Any, List[Endpoint], ThriftRequest, Optional[dict]) -> dict
+        """Call the endpoint picked by the balancer, another one if
+        connecting fails as nothing was sent yet.
+        """
+        attempts = min(len(set(endpoints)), MAX_ATTEMPTS)
+        tried = []
+        while True:
+            endpoint = self.balancer.pick(endpoints, tried)
+            tried.append(endpoint)
+            started = self.balancer.begin(endpoint)
+            failed = True
+            try:
+                try:
+                    client, sock, config = self.connect(service, endpoint, req)
+                except TException as texc:
+                    if len(tried) < attempts:
+                        L.warning('%s: %s, trying another endpoint', endpoint, texc)
+                        continue
+                    return wrap_exception(texc)
+                rv = self.call_client(service, endpoint, config, client, sock, req, fields)
+                failed = rv.get('exception_name') == TTransportException.__name__
+                return rv
+            except BadRequest:
+                failed = False
+                raise
+            finally:
+                self.balancer.end(endpoint, started, failed)
+
+    def connect(self, service, endpoint, req):
+        # type: (Any, Endpoint, ThriftRequest) -> Tuple[TClient, TSocket, Any]
+        """The client for `endpoint`, its socket and settings. Raises
+        TException if probing or connecting fails.
+        """
+        deadline = req.deadline
+        try:
+            config = self.backends.resolve(endpoint, req.backend, _thrift_service_name(service), deadline)
+        except ValueError as exc:
+            raise BadRequest(str(exc))
+        except TTransportException as texc:  # probing failed
+            self.check_timeout(texc, endpoint)
+            raise
 
+        try:
+            client, sock = self.get_client(service, endpoint, config, req.connect_timeout, deadline)
+        except TException as texc:  # TTransportException and etc
+            self.backends.forget(endpoint)
+            self.check_timeout(texc, endpoint)
+            raise
+        return client, sock, config
+
+    def call_client(self, service, endpoint, config, client, sock, req, fields):
+        # type: (Any, Endpoint, Any, TClient, TSocket, ThriftRequest, Optional[dict]) -> dict
         # FIXME: retry send error
-        rv = call_method_wrapped(service, client, req.method, req.args)
+        deadline = req.deadline
+        try:
+            sock.set_deadline(deadline)
+            rv = call_method_wrapped(service, client, req.method, req.args, fields)
+        except TTransportException as texc:     # timed out, the connection is unusable
+            self.drop_client(service, endpoint, config, client)
+            self.check_timeout(texc, endpoint)
+            raise
+        sock.set_deadline(None)
         if 'exception' in rv:
-            self.drop_client(service, req.host, req.port, client)
+            self.drop_client(service, endpoint, config, client)
         return rv
 
     def list_services(self, path=None):
+        self.wait_ready()
         return list(self.list_modules_info(path))
 
     # TODO: search service by kw
@@ -253,6 +488,29 @@ class ThriftHandler(object):
         ])
 
     # private
+    def get_endpoints(self, req):
+        # type: (ThriftRequest) -> List[Endpoint]
+        if req.group is not None:
+            if self.groups is None:
+                raise BadRequest('no backend groups, set HTTP2THRIFT_GROUPS')
+            endpoints = self.groups.get(req.group)
+            if endpoints is None:
+                raise BadRequest('unknown backend group: %r' % (req.group,))
+            return endpoints
+        return req.endpoints or [req.endpoint]
+
+    @staticmethod
+    def check_timeout(texc, endpoint):
+        if texc.type == TTransportException.TIMED_OUT:
+            raise GatewayTimeout('%s: %s' % (endpoint, texc.message))
+
+    def compile_fields(self, service, method, paths):
+        result_cls = getattr(service, method + '_result')
+        try:
+            return compile_result_fields(result_cls, paths)
+        except ValueError as exc:
+            raise BadRequest('bad "fields": %s' % exc)
+
     def list_modules_info(self, path=None):
         # type: () -> dict
         if path is None:
@@ -276,27 +534,40 @@ class ThriftHandler(object):
         for method_name in _thrift_service_list_method(service):
             yield dict(method=method_name)
 
-    def get_client(self, service, host, port):
-        # type: (Any, str, int) -> TClient
-
+    def get_client(self, service, endpoint, config, connect_timeout=None, deadline=None):
+        # type: (Any, Endpoint, Any, Optional[int], Optional[float]) -> Tuple[TClient, TSocket]
+        """The client of this thread for `endpoint` and its socket,
+        connecting within `connect_timeout` ms and by `deadline`.
+        """
         if not hasattr(self.key2client, 'd'):
             self.key2client.d = dict()
         d = self.key2client.d
 
-        key = service, host, port
+        key = service, endpoint, config
         if key not in d:
-            # TODO: adjustable timeout
-            d[key] = make_client(service, host=host, port=port, trans_factory=TFramedTransportFactory(), timeout=10000)
+            warm = self.pool.take(endpoint, config.transport)
+            if warm is not None:
+                sock, trans = warm
+            else:
+                sock = endpoint.make_socket(
+                    self.timeout, connect_timeout or self.connect_timeout, self.backends.resolver)
+                sock.set_deadline(deadline)
+                trans = TRANSPORTS[config.transport]().get_transport(sock)
+                trans.open()
+            proto = protocol_factory(config, _thrift_service_name(service)).get_protocol(trans)
+            d[key] = TClient(service, proto), sock
         return d[key]
 
-    def drop_client(self, service, host, port, client):
+    def drop_client(self, service, endpoint, config, client):
         L.debug('drop client')
         try:
             client.close()
         finally:
-            self.key2client.d.pop((service, host, port))
+            self.key2client.d.pop((service, endpoint, config))
 
     def get_service(self, thrift_file_pattern, service_pattern, method):
+        self.wait_ready()
+
         path = None
         if thrift_file_pattern != '*':
             path = thrift_file_pattern
@@ -322,7 +593,17 @@ def get_handler():
     if _handler is None:
         # TODO: supports multiple path
         dirpath = os.environ.get('HTTP2THRIFT_PATH', '.')
-        _handler = ThriftHandler(dirpath)
+        rescan_interval = float(os.environ.get('HTTP2THRIFT_RESCAN_INTERVAL', 0))
+        backends_path = os.environ.get('HTTP2THRIFT_BACKENDS')
+        backends = load_backends(backends_path) if backends_path else None
+        timeout = int(os.environ.get('HTTP2THRIFT_TIMEOUT', DEFAULT_TIMEOUT))
+        connect_timeout = int(os.environ.get('HTTP2THRIFT_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT))
+        dns_ttl = float(os.environ.get('HTTP2THRIFT_DNS_TTL', DNS_TTL))
+        groups_path = os.environ.get('HTTP2THRIFT_GROUPS')
+        groups = GroupFile(groups_path) if groups_path else None
+        _handler = ThriftHandler(
+            dirpath, rescan_interval=rescan_interval, backends=backends,
+            timeout=timeout, connect_timeout=connect_timeout, dns_ttl=dns_ttl, groups=groups)
         _handler.start()
 
     return _handler
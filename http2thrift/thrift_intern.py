@@ -0,0 +1,187 @@
+"""
+Share identical specs and struct definitions between parsed thrift modules.
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import sys
+import weakref
+
+from http2thrift.thriftpy._compat import intern
+from http2thrift.thriftpy.thrift import TType, gen_init
+
+
+_STRUCT_KINDS = ('enums', 'structs', 'unions', 'exceptions')
+
+_CLASS = object()   # marks a class referenced by a structural key
+
+
+def _class_size(cls):
+    # type: (type) -> int
+    """Rough size of a parsed struct/enum class and the specs it owns."""
+    size = sys.getsizeof(cls) + sys.getsizeof(vars(cls))
+    for attr in ('thrift_spec', 'default_spec', '_tspec', 'thrift_fields', 'thrift_field_map',
+                 '_VALUES_TO_NAMES', '_NAMES_TO_VALUES'):
+        value = vars(cls).get(attr)
+        if value is not None:
+            size += sys.getsizeof(value)
+            if attr == 'thrift_fields':
+                size += sum(sys.getsizeof(f) for f in value)
+
+    init = vars(cls).get('__init__')
+    if init is not None and hasattr(init, '__code__'):
+        size += sys.getsizeof(init) + sys.getsizeof(init.__code__)
+    return size
+
+
+def _key_spec(spec):
+    """`spec` with the classes it refers to replaced by their ids, so keys of
+    the class table do not keep those classes alive. The ids stay valid as
+    long as the keyed class is, its specs refer to the same classes.
+    """
+    if isinstance(spec, type):
+        return _CLASS, id(spec)
+    if isinstance(spec, tuple):
+        return tuple(_key_spec(item) for item in spec)
+    return spec
+
+
+class SpecInterner(object):
+    """Deduplicate specs of parsed thrift modules.
+
+    Spec tuples are replaced by a canonical instance, and struct, union,
+    exception and enum classes which are structurally identical to an
+    already seen class (same name, same fields and defaults) are replaced by
+    that class in the module and in every spec referring to them.
+
+    Spec tuples refer to classes, the table of canonical specs only lives
+    for a scan (see `begin_scan`) so replaced modules can be released.
+    """
+
+    def __init__(self):
+        self.classes = weakref.WeakValueDictionary()    # structural key -> class
+        self.replaced = weakref.WeakKeyDictionary()     # duplicate class -> canonical class
+        self._canonical = weakref.WeakSet()
+        self._modules = weakref.WeakSet()
+        self._pending = set()
+        self.begin_scan()
+
+    def begin_scan(self):
+        """Drop the canonical specs and start counting duplicates anew.
+
+        Specs of modules parsed by an earlier scan would otherwise be held
+        forever with the classes they refer to, and classes replaced again
+        when their module is reparsed would be counted twice.
+        """
+        self.specs = dict()
+        self.dup_specs = 0
+        self.dup_classes = 0
+        self.saved_bytes = 0
+
+    def stats(self):
+        return dict(
+            specs=len(self.specs), dup_specs=self.dup_specs,
+            classes=len(self.classes), dup_classes=self.dup_classes,
+            saved_bytes=self.saved_bytes,
+        )
+
+    def intern_module(self, thrift_module):
+        if thrift_module in self._modules:
+            return thrift_module
+        self._modules.add(thrift_module)
+
+        meta = getattr(thrift_module, '__thrift_meta__', {})
+        for child in meta.get('includes', []):
+            self.intern_module(child)
+
+        for kind in _STRUCT_KINDS:
+            classes = meta.get(kind, [])
+            for i, cls in enumerate(classes):
+                canonical = self.intern_class(cls)
+                if canonical is not cls:
+                    classes[i] = canonical
+                    setattr(thrift_module, cls.__name__, canonical)
+
+        for svc in meta.get('services', []):
+            for method in svc.thrift_services:
+                for name in (method + '_args', method + '_result'):
+                    if name in vars(svc):
+                        setattr(svc, name, self.intern_class(vars(svc)[name]))
+
+        return thrift_module
+
+    def intern_class(self, cls):
+        if cls in self._canonical:
+            return cls
+        try:
+            return self.replaced[cls]
+        except KeyError:
+            pass
+        if cls in self._pending:
+            return cls  # recursive definition, keep as is
+
+        self._pending.add(cls)
+        try:
+            key = self._class_key(cls)
+        finally:
+            self._pending.discard(cls)
+
+        canonical = self.classes.get(key) if key is not None else None
+        if canonical is None or canonical is cls:
+            if key is not None:
+                self.classes[key] = cls
+            self._canonical.add(cls)
+            return cls
+
+        self.replaced[cls] = canonical
+        self.dup_classes += 1
+        self.saved_bytes += _class_size(cls)
+        return canonical
+
+    def intern_spec(self, spec):
+        if isinstance(spec, type):
+            return self.intern_class(spec)
+        if isinstance(spec, str):
+            return intern(spec)
+        if not isinstance(spec, tuple):
+            return spec
+
+        rv = tuple(self.intern_spec(item) for item in spec)
+        try:
+            canonical = self.specs.setdefault(rv, rv)
+        except TypeError:   # unhashable default value
+            return spec
+        if canonical is not rv:
+            self.dup_specs += 1
+            self.saved_bytes += sys.getsizeof(spec)
+        return canonical
+
+    # private
+    def _class_key(self, cls):
+        if getattr(cls, '_ttype', None) == TType.I32:
+            # enum
+            return ('enum', cls.__name__, tuple(sorted(cls._NAMES_TO_VALUES.items())))
+
+        if not hasattr(cls, 'thrift_spec'):
+            return None
+
+        cls.thrift_spec = dict(
+            (fid, self.intern_spec(spec)) for fid, spec in cls.thrift_spec.items())
+        if hasattr(cls, '_tspec'):
+            cls._tspec = dict(
+                (intern(name), self.intern_spec(spec)) for name, spec in cls._tspec.items())
+        # only share defaults of None, equal values may differ in type (1 == True)
+        default_spec = getattr(cls, 'default_spec', [])
+        default_spec[:] = [self.intern_spec(item) if item[1] is None else item
+                           for item in default_spec]
+        gen_init(cls)   # rebuild field descriptors from the interned spec
+
+        try:
+            key = (
+                cls.__bases__, cls.__name__, getattr(cls, 'oneway', None),
+                _key_spec(tuple(sorted(cls.thrift_spec.items()))), _key_spec(tuple(default_spec)),
+            )
+            hash(key)
+        except TypeError:   # unhashable default value
+            return None
+        return key
@@ -4,11 +4,12 @@ Copied from thriftpy.protocol.json
 
 from __future__ import (unicode_literals, print_function, division, absolute_import)
 
+import base64
 import nativetypes
 from collections import OrderedDict
 from typing import Optional, List
 
-from http2thrift.thriftpy.thrift import TType
+from http2thrift.thriftpy.thrift import TType, BINARY, split_spec
 
 # TODO: remove nativetypes dependency
 INTEGER_CAST = {
@@ -30,24 +31,79 @@ def get_result_obj(service, method):
     return getattr(service, method + '_result')()
 
 
-def json_value(ttype, val, spec=None):
+def compile_fields(ttype, spec, paths):
+    """Compile dotted field paths into a projection of a value.
+
+    A path names struct fields by name, ``*`` selects all elements of a
+    list/set or all values of a map. The projection is None for a whole
+    value, ``{fid: projection}`` for a struct and the projection of the
+    elements for containers. Raises ValueError on unknown fields.
+    """
+    return _compile_fields(ttype, spec, [path.split('.') for path in paths], '')
+
+
+def _compile_fields(ttype, spec, paths, prefix):
+    if any(not p for p in paths):
+        return None     # the whole value is selected
+
+    if ttype == TType.STRUCT:
+        groups = OrderedDict()
+        for p in paths:
+            groups.setdefault(p[0], []).append(p[1:])
+        by_name = dict((f.name, f) for f in spec.thrift_fields)
+        projection = {}
+        for name, sub_paths in groups.items():
+            f = by_name.get(name)
+            if f is None:
+                raise ValueError('unknown field: %r' % (prefix + name))
+            projection[f.fid] = _compile_fields(f.ttype, f.spec, sub_paths, prefix + name + '.')
+        return projection
+
+    if ttype in (TType.SET, TType.LIST, TType.MAP):
+        for p in paths:
+            if p[0] != '*':
+                raise ValueError('expected "*" at %r' % (prefix + p[0]))
+        elem_type, elem_spec = split_spec(spec[1] if ttype == TType.MAP else spec)
+        return _compile_fields(elem_type, elem_spec, [p[1:] for p in paths], prefix + '*.')
+
+    if paths:
+        raise ValueError('not a struct: %r' % (prefix + '.'.join(paths[0])))
+    return None
+
+
+def compile_result_fields(result_cls, paths):
+    """Projection of a `<method>_result` struct selecting `paths` of the
+    success value and all declared exceptions.
+    """
+    projection = {}
+    for f in result_cls.thrift_fields:
+        if f.name == 'success':
+            projection[f.fid] = compile_fields(f.ttype, f.spec, paths)
+        else:
+            projection[f.fid] = None
+    return projection
+
+
+def json_value(ttype, val, spec=None, fields=None):
     if ttype in INTEGER_CAST or ttype in FLOAT:
         return val if val is not None else 0
 
     if ttype == TType.STRING:
+        if spec == BINARY:  # bytes are not json serializable
+            return base64.b64encode(val or b'').decode('ascii')
         return val if val is not None else ''
 
     if ttype == TType.BOOL:
         return True if val else False
 
     if ttype == TType.STRUCT:
-        return struct_to_json(val)
+        return struct_to_json(val, fields)
 
     if ttype in (TType.SET, TType.LIST):
-        return list_to_json(val, spec)
+        return list_to_json(val, spec, fields)
 
     if ttype == TType.MAP:
-        return map_to_json(val, spec)
+        return map_to_json(val, spec, fields)
 
 
 def obj_value(ttype, val, spec=None):
@@ -57,6 +113,9 @@ def obj_value(ttype, val, spec=None):
     if ttype in FLOAT:
         return float(val)
 
+    if ttype == TType.STRING and spec == BINARY:
+        return base64.b64decode(val)
+
     if ttype in (TType.STRING, TType.BOOL):
         return val
 
@@ -70,24 +129,15 @@ def obj_value(ttype, val, spec=None):
         return map_to_obj(val, spec)
 
 
-def map_to_json(val, spec):
+def map_to_json(val, spec, fields=None):
     res = []
-    if isinstance(spec[0], int):
-        key_type = spec[0]
-        key_spec = None
-    else:
-        key_type, key_spec = spec[0]
-
-    if isinstance(spec[1], int):
-        value_type = spec[1]
-        value_spec = None
-    else:
-        value_type, value_spec = spec[1]
+    key_type, key_spec = split_spec(spec[0])
+    value_type, value_spec = split_spec(spec[1])
 
     if val is not None:     # may be optional field?
         for k, v in val.items():
             key = json_value(key_type, k, key_spec)
-            value = json_value(value_type, v, value_spec)
+            value = json_value(value_type, v, value_spec, fields)
             res.append(OrderedDict([('key', key), ('value', value)]))
 
     return res
@@ -95,15 +145,8 @@ def map_to_json(val, spec):
 
 def map_to_obj(val, spec):
     res = {}
-    if isinstance(spec[0], int):
-        key_type, key_spec = spec[0], None
-    else:
-        key_type, key_spec = spec[0]
-
-    if isinstance(spec[1], int):
-        value_type, value_spec = spec[1], None
-    else:
-        value_type, value_spec = spec[1]
+    key_type, key_spec = split_spec(spec[0])
+    value_type, value_spec = split_spec(spec[1])
 
     if isinstance(val, dict):   # new map format
         for k, v in val.items():
@@ -116,60 +159,42 @@ def map_to_obj(val, spec):
     return res
 
 
-def list_to_json(val, spec):
-    if isinstance(spec, tuple):
-        elem_type, type_spec = spec
-    else:
-        elem_type, type_spec = spec, None
+def list_to_json(val, spec, fields=None):
+    elem_type, type_spec = split_spec(spec)
 
     if val is None:
         return []
     else:
-        return [json_value(elem_type, i, type_spec) for i in val]
+        return [json_value(elem_type, i, type_spec, fields) for i in val]
 
 
 def list_to_obj(val, spec):
-    if isinstance(spec, tuple):
-        elem_type, type_spec = spec
-    else:
-        elem_type, type_spec = spec, None
+    elem_type, type_spec = split_spec(spec)
 
     return [obj_value(elem_type, i, type_spec) for i in val]
 
 
-def struct_to_json(val):
+def struct_to_json(val, fields=None):
+    """Convert a struct to json, `fields` optionally is a projection from
+    `compile_fields` restricting the output to the selected fields.
+    """
     outobj = OrderedDict()
     if val is None:
         return outobj
 
-    for fid in sorted(val.thrift_spec.keys()):
-        field_spec = val.thrift_spec[fid]
-        field_type, field_name = field_spec[:2]
-
-        if len(field_spec) <= 3:
-            field_type_spec = None
-        else:
-            field_type_spec = field_spec[2]
-
-        v = getattr(val, field_name)
-
-        outobj[field_name] = json_value(field_type, v, field_type_spec)
+    for f in val.thrift_fields:
+        if fields is None:
+            outobj[f.name] = json_value(f.ttype, getattr(val, f.name), f.spec)
+        elif f.fid in fields:
+            outobj[f.name] = json_value(f.ttype, getattr(val, f.name), f.spec, fields[f.fid])
 
     return outobj
 
 
 def struct_to_obj(val, obj):
-    for fid, field_spec in obj.thrift_spec.items():
-        field_type, field_name = field_spec[:2]
-
-        if len(field_spec) <= 3:
-            field_type_spec = None
-        else:
-            field_type_spec = field_spec[2]
-
-        if field_name in val:
-            setattr(obj, field_name,
-                    obj_value(field_type, val[field_name], field_type_spec))
+    for f in obj.thrift_fields:
+        if f.name in val:
+            setattr(obj, f.name, obj_value(f.ttype, val[f.name], f.spec))
 
     return obj
 
@@ -193,6 +218,8 @@ def generate_sample_obj(ttype, obj, spec, seq=None):
         if ttype == TType.BOOL:
             return False
         if ttype == TType.STRING:
+            if spec == BINARY:
+                return ('bin' + str(get_seq(seq))).encode('ascii')
             return 'str' + str(get_seq(seq))
 
     if ttype == TType.STRUCT:
@@ -212,19 +239,9 @@ def generate_sample_struct(obj, cls, seq=_NONE):
     if seq is _NONE:
         seq = [0]
 
-    for fid, field_spec in cls.thrift_spec.items():
-        field_type, field_name = field_spec[:2]
-
-        if len(field_spec) <= 3:
-            field_type_spec = None
-        else:
-            field_type_spec = field_spec[2]
-
-        field = getattr(obj, field_name, None)
-        setattr(
-            obj, field_name,
-            generate_sample_obj(field_type, field, field_type_spec, seq=seq)
-        )
+    for f in cls.thrift_fields:
+        field = getattr(obj, f.name, None)
+        setattr(obj, f.name, generate_sample_obj(f.ttype, field, f.spec, seq=seq))
 
     return obj
 
@@ -233,10 +250,7 @@ def generate_sample_list(obj, spec, seq=None):
     obj = obj or []
     assert isinstance(obj, list)
 
-    if isinstance(spec, tuple):
-        elem_type, type_spec = spec
-    else:
-        elem_type, type_spec = spec, None
+    elem_type, type_spec = split_spec(spec)
 
     obj.append(generate_sample_obj(elem_type, None, type_spec, seq=seq))
     return obj
@@ -246,17 +260,8 @@ def generate_sample_map(obj, spec, seq=None):
     obj = obj or dict()
     assert isinstance(obj, dict)
 
-    if isinstance(spec[0], int):
-        key_type = spec[0]
-        key_spec = None
-    else:
-        key_type, key_spec = spec[0]
-
-    if isinstance(spec[1], int):
-        value_type = spec[1]
-        value_spec = None
-    else:
-        value_type, value_spec = spec[1]
+    key_type, key_spec = split_spec(spec[0])
+    value_type, value_spec = split_spec(spec[1])
 
     key = generate_sample_obj(key_type, None, key_spec, seq=seq)
     value = generate_sample_obj(value_type, None, value_spec, seq=seq)
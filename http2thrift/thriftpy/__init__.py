@@ -2,8 +2,16 @@
 
 import sys
 
-from .hook import install_import_hook, remove_import_hook
-from .parser import load, load_module, load_fp
+from ._compat import lazy_import
+
+# the parser pulls in ply, load it on first use
+__getattr__ = lazy_import(globals(), {
+    "install_import_hook": ".hook",
+    "remove_import_hook": ".hook",
+    "load": ".parser",
+    "load_module": ".parser",
+    "load_fp": ".parser",
+})
 
 __version__ = '0.3.9'
 __python__ = sys.version_info
@@ -9,8 +9,10 @@
 
 from __future__ import absolute_import
 
+import importlib
 import platform
 import sys
+import time
 
 PY3 = sys.version_info[0] == 3
 PYPY = "__pypy__" in sys.modules
@@ -21,19 +23,22 @@ UNIX = platform.system() in ("Linux", "Darwin")
 # only Python 2.7.9 and Python 3.4 or above have true ssl context
 MODERN_SSL = sys.version_info >= (2, 7, 9)
 
+# clock of deadlines, py2 has no monotonic clock
+monotonic = getattr(time, 'monotonic', time.time)
+
 if PY3:
     text_type = str
     string_types = (str,)
-    from urllib.request import urlopen
     from urllib.parse import urlparse
+    intern = sys.intern
 
     def u(s):
         return s
 else:
     text_type = unicode  # noqa
     string_types = (str, unicode)  # noqa
-    from urllib2 import urlopen  # noqa
     from urlparse import urlparse  # noqa
+    intern = intern  # noqa
 
     def u(s):
         if not isinstance(s, text_type):
@@ -41,6 +46,42 @@ else:
         return s
 
 
+def urlopen(*args, **kwargs):
+    # urllib pulls in ssl, http and email, import it only when really used
+    if PY3:
+        from urllib.request import urlopen
+    else:
+        from urllib2 import urlopen  # noqa
+    return urlopen(*args, **kwargs)
+
+
+def lazy_import(module_globals, attrs):
+    """Create a module level `__getattr__` (PEP 562) which imports names on
+    first access, `attrs` maps each name to the (relative) module defining
+    it. Names are imported eagerly before Python 3.7.
+
+    Usage::
+
+        __getattr__ = lazy_import(globals(), {"TSSLSocket": ".sslsocket"})
+    """
+    package = module_globals["__name__"]
+
+    def __getattr__(name):
+        try:
+            module_name = attrs[name]
+        except KeyError:
+            raise AttributeError("module {!r} has no attribute {!r}".format(
+                package, name))
+        value = getattr(importlib.import_module(module_name, package), name)
+        module_globals[name] = value
+        return value
+
+    if sys.version_info < (3, 7):
+        for name in attrs:
+            __getattr__(name)
+    return __getattr__
+
+
 def with_metaclass(meta, *bases):
     """Create a base class with a metaclass for py2 & py3
 
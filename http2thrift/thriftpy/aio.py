@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+
+"""
+    thriftpy.aio
+    ~~~~~~~~~~~~
+
+    Thrift clients and servers over asyncio streams, Python 3.7+.
+
+    >>> pingpong = thriftpy.load("pingpong.thrift")
+    >>>
+    >>> class Dispatcher(object):
+    >>>     async def ping(self):
+    >>>         return "pong"
+
+    >>> server = make_server(pingpong.PingPong, Dispatcher(), port=6000)
+    >>> await server.start()
+    >>> client = await make_client(pingpong.PingPong, port=6000)
+    >>> await client.ping()
+    'pong'
+
+    A connection carries any number of concurrent calls: clients match
+    replies to calls by sequence id, and servers process the calls read from
+    a connection concurrently, replying as each one finishes. Handler
+    methods may be coroutines or plain functions, the latter run on the
+    event loop.
+
+    Messages are encoded and decoded in memory with the regular protocols.
+    The framed transport reads a message with two reads. The buffered
+    (unframed) transport decodes what was received so far and retries once
+    more has arrived, prefer framing for large messages.
+"""
+
+from __future__ import absolute_import
+
+import asyncio
+import functools
+import inspect
+import logging
+import struct
+
+from .protocol import TBinaryProtocolFactory
+from .thrift import TApplicationException, TMessageType, TProcessor, TType
+from .transport import TTransportBase, TTransportException
+from .transport.memory import TMemoryBuffer
+
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+
+class _Incomplete(Exception):
+    """The message continues past the received bytes, `need` is a lower
+    bound of its size.
+    """
+    def __init__(self, need):
+        self.need = need
+
+
+class _ReceivedBuffer(TTransportBase):
+    """Reads the bytes received so far, raises `_Incomplete` beyond them."""
+
+    def __init__(self, buf):
+        self._buf = buf
+        self._pos = 0
+
+    def read(self, sz):
+        pos = self._pos
+        end = pos + sz
+        if end > len(self._buf):
+            raise _Incomplete(end)
+        self._pos = end
+        return bytes(self._buf[pos:end])
+
+
+class TAsyncStreamTransport(object):
+    """Base class of message transports over an asyncio stream pair.
+
+    `read_message` receives the next message and returns what `decode`
+    returns for a transport over it. `write_message` queues an encoded
+    message, `drain` waits until the stream has room again.
+    """
+
+    def __init__(self, reader, writer, max_message_size=MAX_MESSAGE_SIZE):
+        self._reader = reader
+        self._writer = writer
+        self._max_message_size = max_message_size
+        # concurrent drains are not supported before Python 3.10
+        self._drain_lock = asyncio.Lock()
+
+    def is_open(self):
+        return not self._writer.is_closing()
+
+    async def read_message(self, decode):
+        raise NotImplementedError
+
+    def write_message(self, payload):
+        raise NotImplementedError
+
+    async def drain(self):
+        async with self._drain_lock:
+            try:
+                await self._writer.drain()
+            except (ConnectionError, OSError) as e:
+                raise TTransportException(
+                    type=TTransportException.END_OF_FILE, message=str(e))
+
+    def close(self):
+        self._writer.close()
+
+    def _check_size(self, size):
+        if size < 0 or size > self._max_message_size:
+            raise TTransportException(
+                type=TTransportException.UNKNOWN,
+                message='Message of %d bytes exceeds %d' % (
+                    size, self._max_message_size))
+
+
+class TAsyncFramedTransport(TAsyncStreamTransport):
+    """Messages prefixed with their length, like `TFramedTransport`."""
+
+    async def read_message(self, decode):
+        try:
+            header = await self._reader.readexactly(4)
+            sz, = struct.unpack('!i', header)
+            self._check_size(sz)
+            frame = await self._reader.readexactly(sz)
+        except asyncio.IncompleteReadError:
+            raise TTransportException(type=TTransportException.END_OF_FILE,
+                                      message='End of file reading frame')
+        except (ConnectionError, OSError) as e:
+            raise TTransportException(
+                type=TTransportException.END_OF_FILE, message=str(e))
+        return decode(TMemoryBuffer(frame))
+
+    def write_message(self, payload):
+        self._writer.writelines([struct.pack('!i', len(payload)), payload])
+
+
+class TAsyncBufferedTransport(TAsyncStreamTransport):
+    """Unframed messages, like `TBufferedTransport`."""
+
+    def __init__(self, reader, writer, max_message_size=MAX_MESSAGE_SIZE):
+        super(TAsyncBufferedTransport, self).__init__(
+            reader, writer, max_message_size)
+        self._rbuf = bytearray()
+
+    async def read_message(self, decode):
+        need = 1
+        while True:
+            while len(self._rbuf) < need:
+                self._check_size(need)
+                try:
+                    chunk = await self._reader.read(
+                        max(need - len(self._rbuf), 65536))
+                except (ConnectionError, OSError) as e:
+                    raise TTransportException(
+                        type=TTransportException.END_OF_FILE, message=str(e))
+                if not chunk:
+                    raise TTransportException(
+                        type=TTransportException.END_OF_FILE,
+                        message='End of file reading message')
+                self._rbuf += chunk
+
+            buf = _ReceivedBuffer(self._rbuf)
+            try:
+                res = decode(buf)
+            except _Incomplete as e:
+                need = max(e.need, len(self._rbuf) + 1)
+                continue
+            del self._rbuf[:buf._pos]
+            return res
+
+    def write_message(self, payload):
+        self._writer.write(payload)
+
+
+class TAsyncFramedTransportFactory(object):
+    def get_transport(self, reader, writer):
+        return TAsyncFramedTransport(reader, writer)
+
+
+class TAsyncBufferedTransportFactory(object):
+    def get_transport(self, reader, writer):
+        return TAsyncBufferedTransport(reader, writer)
+
+
+def _reply_value(result):
+    """The return value of a call from its result struct, or raise the
+    exception it carries.
+    """
+    if getattr(result, "success", None) is not None:
+        return result.success
+
+    # void api without throws
+    if not result.thrift_fields:
+        return
+
+    # check throws
+    for k, v in result.__dict__.items():
+        if k != "success" and v:
+            raise v
+
+    # no throws & not void api
+    if hasattr(result, "success"):
+        raise TApplicationException(TApplicationException.MISSING_RESULT)
+
+
+class TAsyncClient(object):
+    """A client making concurrent calls over one connection.
+
+    `timeout` in ms bounds each call, a reply arriving later is dropped
+    and the connection stays usable.
+    """
+
+    def __init__(self, service, trans, proto_factory=TBinaryProtocolFactory(),
+                 timeout=None):
+        self._service = service
+        self._trans = trans
+        self._proto_factory = proto_factory
+        self._timeout = timeout / 1000 if timeout else None
+        self._seqid = 0
+        self._pending = {}      # seqid -> (result class, future)
+        self._error = None
+        self._reading = asyncio.ensure_future(self._read_replies())
+
+    def __getattr__(self, _api):
+        if _api in self._service.thrift_services:
+            method = functools.partial(self._req, _api)
+            self.__dict__[_api] = method
+            return method
+
+        raise AttributeError("{} instance has no attribute '{}'".format(
+            self.__class__.__name__, _api))
+
+    def __dir__(self):
+        return self._service.thrift_services
+
+    @property
+    def pending(self):
+        """The number of calls waiting for their reply."""
+        return len(self._pending)
+
+    def is_open(self):
+        return self._error is None
+
+    async def _req(self, _api, *args, **kwargs):
+        if self._error is not None:
+            raise self._error
+
+        args_cls = getattr(self._service, _api + "_args")
+        kwargs.update(zip((f.name for f in args_cls.thrift_fields), args))
+        result_cls = getattr(self._service, _api + "_result")
+
+        self._seqid = seqid = (self._seqid + 1) & 0x7fffffff
+        buf = TMemoryBuffer()
+        oprot = self._proto_factory.get_protocol(buf)
+        oprot.write_message_begin(_api, TMessageType.CALL, seqid)
+        args_cls(**kwargs).write(oprot)
+        oprot.write_message_end()
+
+        if result_cls.oneway:
+            self._trans.write_message(buf.getvalue())
+            return await self._trans.drain()
+
+        fut = asyncio.get_event_loop().create_future()
+        self._pending[seqid] = result_cls, fut
+        try:
+            self._trans.write_message(buf.getvalue())
+            await self._trans.drain()
+            if self._timeout is None:
+                return await fut
+            return await asyncio.wait_for(fut, self._timeout)
+        except asyncio.TimeoutError:
+            raise TTransportException(type=TTransportException.TIMED_OUT,
+                                      message='%s timed out' % _api)
+        finally:
+            self._pending.pop(seqid, None)
+
+    def _decode_reply(self, trans):
+        iprot = self._proto_factory.get_protocol(trans)
+        _, mtype, seqid = iprot.read_message_begin()
+        if mtype == TMessageType.EXCEPTION:
+            result = TApplicationException()
+            result.read(iprot)
+        elif seqid in self._pending:
+            result = self._pending[seqid][0]()
+            result.read(iprot)
+        else:
+            # the call timed out or was cancelled
+            iprot.skip(TType.STRUCT)
+            result = None
+        iprot.read_message_end()
+        return seqid, result
+
+    async def _read_replies(self):
+        try:
+            while True:
+                seqid, result = await self._trans.read_message(
+                    self._decode_reply)
+                entry = self._pending.get(seqid)
+                if entry is None or entry[1].done():
+                    continue
+                fut = entry[1]
+                if isinstance(result, TApplicationException):
+                    fut.set_exception(result)
+                    continue
+                try:
+                    fut.set_result(_reply_value(result))
+                except Exception as e:
+                    fut.set_exception(e)
+        except asyncio.CancelledError:
+            self._fail(TTransportException(
+                type=TTransportException.NOT_OPEN, message='Client closed'))
+            raise
+        except TTransportException as e:
+            self._fail(e)
+        except Exception as e:
+            logger.exception('thrift exception reading replies')
+            self._fail(TTransportException(message=repr(e)))
+
+    def _fail(self, exc):
+        self._error = exc
+        self._trans.close()
+        for _, fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def close(self):
+        self._reading.cancel()
+        self._trans.close()
+
+
+class TAsyncClientPool(object):
+    """Calls spread over up to `size` connections to one server.
+
+    A call goes to the connection with the fewest calls in flight; while
+    all are busy and fewer than `size` are open, another one is opened.
+    Broken connections are replaced on the next call. Other arguments are
+    those of `make_client`.
+    """
+
+    def __init__(self, service, host="localhost", port=9090, unix_socket=None,
+                 size=4, **kwargs):
+        self._service = service
+        self._connect = functools.partial(
+            make_client, service, host, port, unix_socket, **kwargs)
+        self.size = size
+        self._clients = []
+        self._lock = asyncio.Lock()
+
+    def __getattr__(self, _api):
+        if _api in self._service.thrift_services:
+            method = functools.partial(self._req, _api)
+            self.__dict__[_api] = method
+            return method
+
+        raise AttributeError("{} instance has no attribute '{}'".format(
+            self.__class__.__name__, _api))
+
+    def __dir__(self):
+        return self._service.thrift_services
+
+    async def _req(self, _api, *args, **kwargs):
+        client = self._pick()
+        if client is None:
+            async with self._lock:
+                client = self._pick()
+                if client is None:
+                    client = await self._connect()
+                    self._clients.append(client)
+        return await getattr(client, _api)(*args, **kwargs)
+
+    def _pick(self):
+        self._clients = [c for c in self._clients if c.is_open()]
+        if not self._clients:
+            return None
+        client = min(self._clients, key=lambda c: c.pending)
+        if client.pending and len(self._clients) < self.size:
+            return None
+        return client
+
+    def close(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+
+class TAsyncServer(object):
+    """Serves `processor` over asyncio streams, on host/port or
+    unix_socket.
+
+    At most `max_pending` calls of a connection are processed at once,
+    reading from it pauses beyond. Connections idle for `client_timeout`
+    ms are closed.
+    """
+
+    def __init__(self, processor, host="localhost", port=9090,
+                 unix_socket=None,
+                 trans_factory=TAsyncBufferedTransportFactory(),
+                 iprot_factory=TBinaryProtocolFactory(),
+                 oprot_factory=None, client_timeout=None, max_pending=64):
+        if not unix_socket and not (host and port):
+            raise ValueError(
+                "Either host/port or unix_socket must be provided.")
+
+        self._processor = processor
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self._trans_factory = trans_factory
+        self._iprot_factory = iprot_factory
+        self._oprot_factory = (oprot_factory if oprot_factory is not None
+                               else iprot_factory)
+        self.client_timeout = client_timeout / 1000 if client_timeout \
+            else None
+        self.max_pending = max_pending
+        self.server = None
+
+    async def start(self):
+        """Start listening, returns the `asyncio.Server`."""
+        if self.unix_socket:
+            self.server = await asyncio.start_unix_server(
+                self._handle, self.unix_socket)
+        else:
+            self.server = await asyncio.start_server(
+                self._handle, self.host, self.port)
+        return self.server
+
+    async def serve(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+    async def wait_closed(self):
+        if self.server is not None:
+            await self.server.wait_closed()
+
+    def _decode_call(self, trans):
+        return self._processor.process_in(
+            self._iprot_factory.get_protocol(trans))
+
+    async def _handle(self, reader, writer):
+        trans = self._trans_factory.get_transport(reader, writer)
+        pending = set()
+        slots = asyncio.Semaphore(self.max_pending)
+        try:
+            while True:
+                await slots.acquire()
+                read = trans.read_message(self._decode_call)
+                if self.client_timeout and not pending:
+                    read = asyncio.wait_for(read, self.client_timeout)
+                try:
+                    api, seqid, result, call = await read
+                except asyncio.TimeoutError:
+                    break
+                except TTransportException as e:
+                    if e.type == TTransportException.END_OF_FILE:
+                        break
+                    raise
+
+                task = asyncio.ensure_future(
+                    self._process(trans, api, seqid, result, call))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+
+            # reply to what was read before the client stopped sending
+            if pending:
+                await asyncio.wait(pending)
+        except Exception:
+            logger.exception('thrift exception in handle_stream')
+        finally:
+            for task in pending:
+                task.cancel()
+            trans.close()
+
+    async def _process(self, trans, api, seqid, result, call):
+        if isinstance(result, TApplicationException):
+            return await self._send(trans, self._processor.send_exception,
+                                    api, result, seqid)
+
+        try:
+            value = call()
+            if inspect.isawaitable(value):
+                value = await value
+            result.success = value
+        except Exception as e:
+            try:
+                # raise if api don't have throws
+                self._processor.handle_exception(e, result)
+            except Exception:
+                logger.exception('uncaught exception in %s', api)
+                exc = TApplicationException(
+                    TApplicationException.INTERNAL_ERROR,
+                    'uncaught exception: %r' % e)
+                return await self._send(
+                    trans, self._processor.send_exception, api, exc, seqid)
+
+        if not result.oneway:
+            await self._send(trans, self._processor.send_result,
+                             api, result, seqid)
+
+    async def _send(self, trans, send, api, payload, seqid):
+        buf = TMemoryBuffer()
+        send(self._oprot_factory.get_protocol(buf), api, payload, seqid)
+        trans.write_message(buf.getvalue())
+        await trans.drain()
+
+
+async def make_client(service, host="localhost", port=9090, unix_socket=None,
+                      proto_factory=TBinaryProtocolFactory(),
+                      trans_factory=TAsyncBufferedTransportFactory(),
+                      timeout=None, connect_timeout=None, ssl_context=None):
+    """Connect to `service`, `timeout` per call and `connect_timeout` in
+    ms.
+    """
+    if unix_socket:
+        connect = asyncio.open_unix_connection(unix_socket)
+        addr = unix_socket
+    elif host and port:
+        connect = asyncio.open_connection(host, port, ssl=ssl_context)
+        addr = '%s:%s' % (host, port)
+    else:
+        raise ValueError("Either host/port or unix_socket must be provided.")
+
+    try:
+        if connect_timeout:
+            connect = asyncio.wait_for(connect, connect_timeout / 1000)
+        reader, writer = await connect
+    except asyncio.TimeoutError:
+        raise TTransportException(
+            type=TTransportException.TIMED_OUT,
+            message="Timed out connecting to %s" % addr)
+    except (ConnectionError, OSError):
+        raise TTransportException(
+            type=TTransportException.NOT_OPEN,
+            message="Could not connect to %s" % addr)
+
+    trans = trans_factory.get_transport(reader, writer)
+    return TAsyncClient(service, trans, proto_factory, timeout)
+
+
+def make_server(service, handler,
+                host="localhost", port=9090, unix_socket=None,
+                proto_factory=TBinaryProtocolFactory(),
+                trans_factory=TAsyncBufferedTransportFactory(),
+                client_timeout=None):
+    """A server for `handler`, listening once `start` or `serve` is
+    awaited.
+    """
+    processor = TProcessor(service, handler)
+    return TAsyncServer(processor, host, port, unix_socket,
+                        trans_factory=trans_factory,
+                        iprot_factory=proto_factory,
+                        client_timeout=client_timeout)
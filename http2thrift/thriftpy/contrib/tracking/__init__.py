@@ -14,11 +14,28 @@ import time
 
 from ...thrift import TClient, TApplicationException, TMessageType, \
     TProcessor, TType
-from ...parser import load
 from .tracker import VersionMixin
 
 track_method = "__thriftpy_tracing_method_name__v2"
-track_thrift = load(os.path.join(os.path.dirname(__file__), "tracking.thrift"))
+_track_thrift = None
+
+
+def get_track_thrift():
+    """Load tracking.thrift on first use."""
+    global _track_thrift
+    if _track_thrift is None:
+        from ...parser import load
+        _track_thrift = load(
+            os.path.join(os.path.dirname(__file__), "tracking.thrift"))
+    return _track_thrift
+
+
+def __getattr__(name):
+    # keep `track_thrift` importable, see PEP 562
+    if name == "track_thrift":
+        return get_track_thrift()
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+        __name__, name))
 
 __all__ = ["TTrackedClient", "TTrackedProcessor", "TrackerBase",
            "ConsoleTracker"]
@@ -67,7 +84,7 @@ class TTrackedClient(TClient, VersionMixin):
     def _negotiation(self):
         self._oprot.write_message_begin(track_method, TMessageType.CALL,
                                         self._seqid)
-        args = track_thrift.UpgradeArgs()
+        args = get_track_thrift().UpgradeArgs()
         args.version = VersionMixin.CURRENT
         self.tracker.init_handshake_info(args)
         args.write(self._oprot)
@@ -82,7 +99,7 @@ class TTrackedClient(TClient, VersionMixin):
             self._iprot.read_message_end()
             raise x
         else:
-            result = track_thrift.UpgradeReply()
+            result = get_track_thrift().UpgradeReply()
             result.read(self._iprot)
             self._iprot.read_message_end()
             self.upgrade_version(VersionMixin.VERSION_SUPPORT_REQUEST_HEADER)
@@ -91,7 +108,7 @@ class TTrackedClient(TClient, VersionMixin):
 
     def _send(self, _api, **kwargs):
         if self.check_version(VersionMixin.VERSION_SUPPORT_REQUEST_HEADER):
-            self._header = track_thrift.RequestHeader()
+            self._header = get_track_thrift().RequestHeader()
             self.tracker.gen_header(self._header)
             self._header.write(self._oprot)
 
@@ -100,7 +117,7 @@ class TTrackedClient(TClient, VersionMixin):
 
     def _recv(self, _api):
         if self.check_version(VersionMixin.VERSION_SUPPORT_RESPONSE_HEADER):
-            response_header = track_thrift.ResponseHeader()
+            response_header = get_track_thrift().ResponseHeader()
             response_header.read(self._iprot)
             self.tracker.handle_response_header(response_header)
 
@@ -146,7 +163,7 @@ class TTrackedProcessor(TProcessor, VersionMixin):
         if self.is_upgraded is False:
             res = self._try_upgrade(iprot)
         else:
-            request_header = track_thrift.RequestHeader()
+            request_header = get_track_thrift().RequestHeader()
             request_header.read(iprot)
             self.tracker.handle(request_header)
             res = super(TTrackedProcessor, self).process_in(iprot)
@@ -158,11 +175,11 @@ class TTrackedProcessor(TProcessor, VersionMixin):
         if msg_type == TMessageType.CALL and api == track_method:
             self.during_handshake = True
 
-            args = track_thrift.UpgradeArgs()
+            args = get_track_thrift().UpgradeArgs()
             args.read(iprot)
             self.tracker.handle_handshake_info(args)
             self.upgrade_version(VersionMixin.VERSION_SUPPORT_REQUEST_HEADER)
-            result = track_thrift.UpgradeReply()
+            result = get_track_thrift().UpgradeReply()
 
             # If client hasn't told us its version, we also don't tell it ours.
             if args.version:
@@ -193,8 +210,7 @@ class TTrackedProcessor(TProcessor, VersionMixin):
         result = getattr(self._service, api + "_result")()
 
         # convert kwargs to args
-        api_args = [args.thrift_spec[k][1]
-                    for k in sorted(args.thrift_spec)]
+        api_args = [f.name for f in args.thrift_fields]
 
         def call():
             return getattr(self._handler, api)(
@@ -219,7 +235,7 @@ class TTrackedProcessor(TProcessor, VersionMixin):
                 if self.during_handshake:
                     self.during_handshake = False
                 else:
-                    response_header = track_thrift.ResponseHeader()
+                    response_header = get_track_thrift().ResponseHeader()
                     self.tracker.gen_response_header(response_header)
                     response_header.write(oprot)
 
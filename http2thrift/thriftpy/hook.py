@@ -4,8 +4,6 @@ from __future__ import absolute_import
 
 import sys
 
-from .parser import load_module
-
 
 class ThriftImporter(object):
     def __init__(self, extension="_thrift"):
@@ -21,6 +19,7 @@ class ThriftImporter(object):
             return self
 
     def load_module(self, fullname):
+        from .parser import load_module
         return load_module(fullname)
 _imp = ThriftImporter()
 
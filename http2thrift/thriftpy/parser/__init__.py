@@ -12,7 +12,8 @@ from __future__ import absolute_import
 import os
 import sys
 
-from .parser import parse, parse_fp
+from .parser import parse, parse_fp, IncludeResolver
+from .bundle import SourceBundle
 
 
 def load(path, module_name=None, include_dirs=None, include_dir=None):
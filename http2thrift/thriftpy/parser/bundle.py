@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+    thriftpy.parser.bundle
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Load thrift files from archives or memory instead of the filesystem.
+"""
+
+from __future__ import absolute_import
+
+import fnmatch
+import io
+import posixpath
+import tarfile
+import zipfile
+
+from .exc import ThriftParserError
+from .parser import IncludeResolver, parse
+
+
+class SourceBundle(IncludeResolver):
+    """A set of thrift sources kept in memory.
+
+    Paths inside the bundle are relative and '/' separated. Include
+    directives are resolved against the other sources of the bundle, so an
+    archive of IDL files can be parsed without unpacking it::
+
+        >>> bundle = SourceBundle.from_archive("idl-1.2.3.zip")
+        >>> note_thrift = bundle.parse("note/note.thrift")
+    """
+
+    def __init__(self, sources=None):
+        super(SourceBundle, self).__init__()
+        self.sources = {}
+        for path, source in (sources or {}).items():
+            self.add_source(path, source)
+
+    @classmethod
+    def from_zip(cls, file, pattern='*.thrift'):
+        """Read matching files of a zip archive, `file` is a path or a
+        file-like object."""
+        bundle = cls()
+        with zipfile.ZipFile(file) as zf:
+            for info in zf.infolist():
+                if not info.filename.endswith('/') and \
+                        fnmatch.fnmatch(info.filename, pattern):
+                    bundle.add_source(info.filename, zf.read(info))
+        return bundle
+
+    @classmethod
+    def from_tar(cls, file, pattern='*.thrift'):
+        """Read matching files of a (compressed) tar archive, `file` is a path
+        or a file-like object."""
+        bundle = cls()
+        if hasattr(file, 'read'):
+            tf = tarfile.open(fileobj=file)
+        else:
+            tf = tarfile.open(file)
+        with tf:
+            for member in tf:
+                if member.isfile() and fnmatch.fnmatch(member.name, pattern):
+                    bundle.add_source(member.name,
+                                      tf.extractfile(member).read())
+        return bundle
+
+    @classmethod
+    def from_archive(cls, path, pattern='*.thrift'):
+        """Read matching files of a zip or tar archive. The archive is read
+        into memory once and then closed."""
+        with open(path, 'rb') as fh:
+            data = io.BytesIO(fh.read())
+
+        if zipfile.is_zipfile(data):
+            data.seek(0)
+            return cls.from_zip(data, pattern)
+
+        data.seek(0)
+        try:
+            return cls.from_tar(data, pattern)
+        except tarfile.TarError:
+            raise ThriftParserError('Unknown archive format: %s' % path)
+
+    def add_source(self, path, source):
+        """Register a source at `path`, `source` is text, utf-8 encoded bytes
+        or a file-like object with a method named `read`."""
+        if hasattr(source, 'read'):
+            source = source.read()
+        if isinstance(source, bytes):
+            source = source.decode('utf-8')
+        self.sources[self.key(path)] = source
+
+    def glob(self, pattern):
+        return [path for path in sorted(self.sources)
+                if fnmatch.fnmatch(path, pattern)]
+
+    def parse(self, path, module_name=None, **kwargs):
+        """Parse the source at `path`, see `parser.parse`."""
+        return parse(path, module_name, include_resolver=self, **kwargs)
+
+    # IncludeResolver
+    def key(self, path):
+        return posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+
+    def stat(self, path):
+        return None
+
+    def exists(self, path):
+        return self.key(path) in self.sources
+
+    def samefile(self, path1, path2):
+        return self.key(path1) == self.key(path2)
+
+    def read(self, path):
+        try:
+            return self.sources[self.key(path)]
+        except KeyError:
+            raise ThriftParserError('No such file in bundle: %s' % path)
@@ -8,14 +8,15 @@ IDL Ref:
 from __future__ import absolute_import
 
 import collections
+import contextlib
 import os
 import sys
 import types
 from ply import lex, yacc
 from .lexer import *  # noqa
 from .exc import ThriftParserError, ThriftGrammerError
-from http2thrift.thriftpy._compat import urlopen, urlparse
-from ..thrift import gen_init, TType, TPayload, TException
+from http2thrift.thriftpy._compat import urlopen, urlparse, intern
+from ..thrift import gen_init, TType, TPayload, TException, BINARY
 
 
 def p_error(p):
@@ -53,17 +54,29 @@ def p_include(p):
                                 'from file like object.')
     replace_include_dirs = [os.path.dirname(thrift.__thrift_file__)] \
         + include_dirs_
-    for include_dir in replace_include_dirs:
-        path = os.path.join(include_dir, p[2])
-        if os.path.exists(path):
-            child = parse(path)
-            setattr(thrift, child.__name__, child)
-            _add_thrift_meta('includes', child)
-            return
+    if include_resolver_ is not None:
+        path = include_resolver_.resolve(replace_include_dirs, p[2])
+    else:
+        path = _find_include(replace_include_dirs, p[2])
+
+    if path is not None:
+        if include_resolver_ is not None:
+            include_resolver_.add_include(thrift.__thrift_file__, path)
+        child = parse(path)
+        setattr(thrift, child.__name__, child)
+        _add_thrift_meta('includes', child)
+        return
     raise ThriftParserError(('Couldn\'t include thrift %s in any '
                              'directories provided') % p[2])
 
 
+def _find_include(include_dirs, name):
+    for include_dir in include_dirs:
+        path = os.path.join(include_dir, name)
+        if os.path.exists(path):
+            return path
+
+
 def p_cpp_include(p):
     '''cpp_include : CPP_INCLUDE LITERAL'''
 
@@ -415,7 +428,7 @@ def p_simple_base_type(p):  # noqa
     if p[1] == 'string':
         p[0] = TType.STRING
     if p[1] == 'binary':
-        p[0] = TType.BINARY
+        p[0] = (TType.STRING, BINARY)
 
 
 def p_base_type(p):
@@ -483,11 +496,130 @@ def p_type_annotation(p):
 
 thrift_stack = []
 include_dirs_ = ['.']
+include_resolver_ = None
 thrift_cache = {}
+_lexer = None
+_parser = None
+
+
+def _new_lexer():
+    global _lexer
+    if _lexer is None:
+        _lexer = lex.lex()
+    # includes are parsed while the including file is being lexed
+    return _lexer.clone()
+
+
+def _get_parser():
+    # building the parse tables is expensive, do it once on first use
+    global _parser
+    if _parser is None:
+        _parser = yacc.yacc(debug=False, write_tables=0)
+    return _parser
+
+
+class IncludeResolver(object):
+    """Resolve include directives with cached filesystem lookups.
+
+    Stat results are cached until `clear` is called, so an include shared by
+    many files hits the filesystem once per scan. Every resolved include is
+    recorded in the `includes` (file -> included files) and `includers`
+    (file -> including files) graph, keyed by `key(path)`, and parsed
+    modules are cached in `modules` so they can be invalidated along the
+    graph when a file changes.
+
+    Subclasses may override `key`, `exists`, `samefile` and `read` to load
+    thrift files from somewhere other than the filesystem.
+    """
+
+    def __init__(self):
+        self._stat_cache = {}
+        self.includes = collections.defaultdict(set)
+        self.includers = collections.defaultdict(set)
+        self.modules = {}
+
+    def clear(self):
+        """Drop cached stat results, should be called before each scan."""
+        self._stat_cache.clear()
+
+    def key(self, path):
+        return os.path.abspath(path)
+
+    def stat(self, path):
+        try:
+            return self._stat_cache[path]
+        except KeyError:
+            pass
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        self._stat_cache[path] = st
+        return st
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def samefile(self, path1, path2):
+        st1, st2 = self.stat(path1), self.stat(path2)
+        if st1 is None or st2 is None:
+            return False
+        return (st1.st_dev, st1.st_ino) == (st2.st_dev, st2.st_ino)
+
+    def read(self, path):
+        with open(path) as fh:
+            return fh.read()
+
+    def resolve(self, include_dirs, name):
+        for include_dir in include_dirs:
+            path = os.path.join(include_dir, name)
+            if self.exists(path):
+                return path
+
+    def add_include(self, includer, included):
+        includer, included = self.key(includer), self.key(included)
+        self.includes[includer].add(included)
+        self.includers[included].add(includer)
+
+    def dependents(self, paths):
+        """Return keys of `paths` and all files transitively including them."""
+        pending = [self.key(path) for path in paths]
+        seen = set(pending)
+        while pending:
+            for includer in self.includers.get(pending.pop(), ()):
+                if includer not in seen:
+                    seen.add(includer)
+                    pending.append(includer)
+        return seen
+
+    def invalidate(self, paths):
+        """Forget changed `paths` and their dependents.
+
+        Returns the set of invalidated keys, which must be parsed again to
+        pick up the change.
+        """
+        stale = self.dependents(paths)
+        for path in stale:
+            self.modules.pop(path, None)
+            for included in self.includes.pop(path, ()):
+                self.includers[included].discard(path)
+        return stale
+
+
+@contextlib.contextmanager
+def _using_include_resolver(resolver):
+    global include_resolver_
+
+    orig, include_resolver_ = include_resolver_, resolver
+    try:
+        yield
+    finally:
+        include_resolver_ = orig
 
 
 def parse(path, module_name=None, include_dirs=None, include_dir=None,
-          lexer=None, parser=None, enable_cache=True):
+          lexer=None, parser=None, enable_cache=True, include_resolver=None):
     """Parse a single thrift file to module object, e.g.::
 
         >>> from thriftpy.parser.parser import parse
@@ -504,31 +636,51 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
                         for compatiable reason. If it's provided (not `None`),
                         it will be appended to `include_dirs`.
     :param lexer: ply lexer to use, if not provided, `parse` will new one.
-    :param parser: ply parser to use, if not provided, `parse` will new one.
+    :param parser: ply parser to use, if not provided, a shared one is used.
     :param enable_cache: if this is set to be `True`, parsed module will be
                          cached, this is enabled by default. If `module_name`
                          is provided, use it as cache key, else use the `path`.
+    :param include_resolver: `IncludeResolver` used for this file and the
+                             files it includes. When provided, it replaces
+                             the global module cache and records the include
+                             graph.
     """
+    if include_resolver is not None:
+        with _using_include_resolver(include_resolver):
+            return parse(path, module_name, include_dirs=include_dirs,
+                         include_dir=include_dir, lexer=lexer, parser=parser,
+                         enable_cache=enable_cache)
+
     if os.name == 'nt' and sys.version_info[0] < 3:
         os.path.samefile = lambda f1, f2: os.stat(f1) == os.stat(f2)
 
+    if include_resolver_ is not None:
+        samefile = include_resolver_.samefile
+    else:
+        samefile = os.path.samefile
+
     # dead include checking on current stack
     for thrift in thrift_stack:
         if thrift.__thrift_file__ is not None and \
-                os.path.samefile(path, thrift.__thrift_file__):
+                samefile(path, thrift.__thrift_file__):
             raise ThriftParserError('Dead including on %s' % path)
 
     global thrift_cache
 
-    cache_key = module_name or os.path.normpath(path)
+    if include_resolver_ is not None:
+        cache = include_resolver_.modules
+        cache_key = module_name or include_resolver_.key(path)
+    else:
+        cache = thrift_cache
+        cache_key = module_name or os.path.normpath(path)
 
-    if enable_cache and cache_key in thrift_cache:
-        return thrift_cache[cache_key]
+    if enable_cache and cache_key in cache:
+        return cache[cache_key]
 
     if lexer is None:
-        lexer = lex.lex()
+        lexer = _new_lexer()
     if parser is None:
-        parser = yacc.yacc(debug=False, write_tables=0)
+        parser = _get_parser()
 
     global include_dirs_
 
@@ -541,7 +693,9 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
         raise ThriftParserError('Path should end with .thrift')
 
     url_scheme = urlparse(path).scheme
-    if url_scheme == 'file':
+    if include_resolver_ is not None and url_scheme == '':
+        data = include_resolver_.read(path)
+    elif url_scheme == 'file':
         with open(urlparse(path).netloc + urlparse(path).path) as fh:
             data = fh.read()
     elif url_scheme == '':
@@ -566,11 +720,13 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
     setattr(thrift, '__thrift_file__', path)
     thrift_stack.append(thrift)
     lexer.lineno = 1
-    parser.parse(data)
-    thrift_stack.pop()
+    try:
+        parser.parse(data, lexer=lexer)
+    finally:
+        thrift_stack.pop()
 
     if enable_cache:
-        thrift_cache[cache_key] = thrift
+        cache[cache_key] = thrift
     return thrift
 
 
@@ -586,7 +742,7 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True):
     :param module_name: the name for parsed module, shoule be endswith
                         '_thrift'.
     :param lexer: ply lexer to use, if not provided, `parse` will new one.
-    :param parser: ply parser to use, if not provided, `parse` will new one.
+    :param parser: ply parser to use, if not provided, a shared one is used.
     :param enable_cache: if this is set to be `True`, parsed module will be
                          cached by `module_name`, this is enabled by default.
     """
@@ -602,9 +758,9 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True):
                                 'with a method named \'read\'')
 
     if lexer is None:
-        lexer = lex.lex()
+        lexer = _new_lexer()
     if parser is None:
-        parser = yacc.yacc(debug=False, write_tables=0)
+        parser = _get_parser()
 
     data = source.read()
 
@@ -612,8 +768,10 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True):
     setattr(thrift, '__thrift_file__', None)
     thrift_stack.append(thrift)
     lexer.lineno = 1
-    parser.parse(data)
-    thrift_stack.pop()
+    try:
+        parser.parse(data, lexer=lexer)
+    finally:
+        thrift_stack.pop()
 
     if enable_cache:
         thrift_cache[module_name] = thrift
@@ -656,7 +814,7 @@ def _cast(t):  # noqa
         return _cast_double
     if t == TType.STRING:
         return _cast_string
-    if t == TType.BINARY:
+    if t[0] == TType.STRING:
         return _cast_binary
     if t[0] == TType.LIST:
         return _cast_list(t)
@@ -707,7 +865,7 @@ def _cast_string(v):
 
 def _cast_binary(v):
     assert isinstance(v, str)
-    return v
+    return v.encode('utf-8') if not isinstance(v, bytes) else v
 
 
 def _cast_list(t):
@@ -822,9 +980,10 @@ def _fill_in_struct(cls, fields, _gen_init=True):
                                       'already been used') % (field[0],
                                                               field[3]))
         ttype = field[2]
-        thrift_spec[field[0]] = _ttype_spec(ttype, field[3], field[1])
-        default_spec.append((field[3], field[4]))
-        _tspec[field[3]] = field[1], ttype
+        name = intern(field[3])
+        thrift_spec[field[0]] = _ttype_spec(ttype, name, field[1])
+        default_spec.append((name, field[4]))
+        _tspec[name] = field[1], ttype
     setattr(cls, 'thrift_spec', thrift_spec)
     setattr(cls, 'default_spec', default_spec)
     setattr(cls, '_tspec', _tspec)
@@ -848,7 +1007,7 @@ def _make_service(name, funcs, extends):
     thrift_services = []
 
     for func in funcs:
-        func_name = func[2]
+        func_name = intern(func[2])
         # args payload cls
         args_name = '%s_args' % func_name
         args_fields = func[3]
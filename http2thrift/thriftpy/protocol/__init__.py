@@ -2,10 +2,18 @@
 
 from __future__ import absolute_import
 
+from .._compat import lazy_import
 from .binary import TBinaryProtocol, TBinaryProtocolFactory
-from .json import TJSONProtocol, TJSONProtocolFactory
-from .compact import TCompactProtocol, TCompactProtocolFactory
-from .multiplex import TMultiplexedProtocol, TMultiplexedProtocolFactory
+
+# binary is the default everywhere, others are loaded on first use
+__getattr__ = lazy_import(globals(), {
+    "TJSONProtocol": ".json",
+    "TJSONProtocolFactory": ".json",
+    "TCompactProtocol": ".compact",
+    "TCompactProtocolFactory": ".compact",
+    "TMultiplexedProtocol": ".multiplex",
+    "TMultiplexedProtocolFactory": ".multiplex",
+})
 
 # from thriftpy._compat import PYPY, CYTHON
 # if not PYPY:
@@ -2,11 +2,14 @@
 
 from __future__ import absolute_import
 
+import array
 import struct
+import sys
 
-from ..thrift import TType
+from ..thrift import TType, BINARY, split_spec
 
 from .exc import TProtocolException
+from . import binary_codec
 
 # VERSION_MASK = 0xffff0000
 VERSION_MASK = -65536
@@ -15,28 +18,42 @@ VERSION_1 = -2147418112
 TYPE_MASK = 0x000000ff
 
 
+_I8 = struct.Struct("!b")
+_I16 = struct.Struct("!h")
+_I32 = struct.Struct("!i")
+_I64 = struct.Struct("!q")
+_DOUBLE = struct.Struct("!d")
+_FIELD_BEGIN = struct.Struct("!bh")
+_LIST_BEGIN = struct.Struct("!bi")
+_MAP_BEGIN = struct.Struct("!bbi")
+
+_STOP = b'\x00'
+_TRUE = b'\x01'
+_FALSE = b'\x00'
+
+
 def pack_i8(byte):
-    return struct.pack("!b", byte)
+    return _I8.pack(byte)
 
 
 def pack_i16(i16):
-    return struct.pack("!h", i16)
+    return _I16.pack(i16)
 
 
 def pack_i32(i32):
-    return struct.pack("!i", i32)
+    return _I32.pack(i32)
 
 
 def pack_i64(i64):
-    return struct.pack("!q", i64)
+    return _I64.pack(i64)
 
 
 def pack_double(dub):
-    return struct.pack("!d", dub)
+    return _DOUBLE.pack(dub)
 
 
 def pack_string(string):
-    return struct.pack("!i%ds" % len(string), len(string), string)
+    return _I32.pack(len(string)) + string
 
 
 def unpack_i8(buf):
@@ -59,105 +76,262 @@ def unpack_double(buf):
     return struct.unpack("!d", buf)[0]
 
 
-def write_message_begin(outbuf, name, ttype, seqid, strict=True):
+_FIXED_SIZE = {
+    TType.BOOL: 1,
+    TType.BYTE: 1,
+    TType.I16: 2,
+    TType.I32: 4,
+    TType.I64: 8,
+    TType.DOUBLE: 8,
+}
+
+
+# Lists of fixed width elements are packed and unpacked with a single
+# struct call, or byteswapped as array.array / numpy.ndarray.
+_BULK_FORMATS = {
+    TType.BOOL: '?',
+    TType.BYTE: 'b',
+    TType.I16: 'h',
+    TType.I32: 'i',
+    TType.I64: 'q',
+    TType.DOUBLE: 'd',
+}
+
+_NUMPY_DTYPES = {
+    TType.BOOL: '?',
+    TType.BYTE: 'i1',
+    TType.I16: '>i2',
+    TType.I32: '>i4',
+    TType.I64: '>i8',
+    TType.DOUBLE: '>f8',
+}
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _array_typecodes():
+    codes = {}
+    for ttype, candidates in ((TType.BYTE, 'b'), (TType.I16, 'hi'),
+                              (TType.I32, 'ilh'), (TType.I64, 'qlq'),
+                              (TType.DOUBLE, 'd')):
+        for code in candidates:
+            try:
+                if array.array(code).itemsize == _FIXED_SIZE[ttype]:
+                    codes[ttype] = code
+                    break
+            except ValueError:  # no 'q' before python 3.3
+                continue
+    return codes
+
+_ARRAY_TYPECODES = _array_typecodes()
+
+
+def decode_bulk_array(buf, pos, e_type, sz):
+    """Decode `sz` fixed width elements at `pos` into an `array.array`.
+    Bools are returned as a list.
+    """
+    code = _ARRAY_TYPECODES.get(e_type)
+    if code is None:
+        if sz <= 0:
+            return [], pos
+        fmt = '!%d%s' % (sz, _BULK_FORMATS[e_type])
+        return list(struct.unpack_from(fmt, buf, pos)), pos + sz
+
+    vals = array.array(code)
+    if sz <= 0:
+        return vals, pos
+    end = pos + _FIXED_SIZE[e_type] * sz
+    if end > len(buf):
+        # as unpack_from would, callers expect struct.error on short input
+        raise struct.error('list exceeds the buffer')
+    vals.frombytes(bytes(buf[pos:end]))
+    if not _BIG_ENDIAN:
+        vals.byteswap()
+    return vals, end
+
+
+def decode_bulk_list(buf, pos, e_type, sz):
+    """Like `decode_bulk_array`, but into a list."""
+    vals, pos = decode_bulk_array(buf, pos, e_type, sz)
+    if isinstance(vals, array.array):
+        vals = vals.tolist()
+    return vals, pos
+
+
+def decode_bulk_ndarray(buf, pos, e_type, sz):
+    """Like `decode_bulk_array`, but into a `numpy.ndarray` of native byte
+    order. Requires numpy.
+    """
+    import numpy
+
+    dtype = numpy.dtype(_NUMPY_DTYPES[e_type])
+    sz = max(sz, 0)
+    if pos + dtype.itemsize * sz > len(buf):
+        raise struct.error('list exceeds the buffer')
+    vals = numpy.frombuffer(buf, dtype=dtype, count=sz, offset=pos)
+    return vals.astype(dtype.newbyteorder('=')), pos + dtype.itemsize * sz
+
+
+# values of the `primitive_lists` option of TBinaryProtocol
+BULK_DECODERS = {
+    'list': decode_bulk_list,
+    'array': decode_bulk_array,
+    'numpy': decode_bulk_ndarray,
+}
+
+
+def encode_bulk_list(buf, e_type, val):
+    """Append the fixed width elements of a list, `array.array` or
+    `numpy.ndarray` to `buf`, without the list header.
+    """
+    if hasattr(val, 'dtype'):
+        buf += val.astype(_NUMPY_DTYPES[e_type], copy=False).tobytes()
+        return
+
+    code = _ARRAY_TYPECODES.get(e_type)
+    if code is None:
+        if val:
+            fmt = '!%d%s' % (len(val), _BULK_FORMATS[e_type])
+            buf += struct.pack(fmt, *val)
+        return
+
+    val = array.array(code, val)
+    if not _BIG_ENDIAN:
+        val.byteswap()
+    buf += val.tobytes()
+
+
+def encode_message_begin(buf, name, ttype, seqid, strict=True):
+    name = name.encode('utf-8')
     if strict:
-        outbuf.write(pack_i32(VERSION_1 | ttype))
-        outbuf.write(pack_string(name.encode('utf-8')))
+        buf += _I32.pack(VERSION_1 | ttype)
+        buf += _I32.pack(len(name))
+        buf += name
     else:
-        outbuf.write(pack_string(name.encode('utf-8')))
-        outbuf.write(pack_i8(ttype))
+        buf += _I32.pack(len(name))
+        buf += name
+        buf += _I8.pack(ttype)
 
-    outbuf.write(pack_i32(seqid))
+    buf += _I32.pack(seqid)
 
 
-def write_field_begin(outbuf, ttype, fid):
-    outbuf.write(pack_i8(ttype) + pack_i16(fid))
+def encode_list(buf, e_type, e_spec, val):
+    buf += _LIST_BEGIN.pack(e_type, len(val))
+    if e_type in _BULK_FORMATS:
+        return encode_bulk_list(buf, e_type, val)
+    for e_val in val:
+        encode_val(buf, e_type, e_val, e_spec)
 
 
-def write_field_stop(outbuf):
-    outbuf.write(pack_i8(TType.STOP))
+def encode_map(buf, k_type, k_spec, v_type, v_spec, val):
+    buf += _MAP_BEGIN.pack(k_type, v_type, len(val))
+    for k in iter(val):
+        encode_val(buf, k_type, k, k_spec)
+        encode_val(buf, v_type, val[k], v_spec)
 
 
-def write_list_begin(outbuf, etype, size):
-    outbuf.write(pack_i8(etype) + pack_i32(size))
-
+def encode_struct(buf, val):
+    for f in val.thrift_fields:
+        v = getattr(val, f.name)
+        if v is None:
+            continue
 
-def write_map_begin(outbuf, ktype, vtype, size):
-    outbuf.write(pack_i8(ktype) + pack_i8(vtype) + pack_i32(size))
+        buf += _FIELD_BEGIN.pack(f.ttype, f.fid)
+        if f.k_type is not None:
+            encode_map(buf, f.k_type, f.k_spec, f.v_type, f.v_spec, v)
+        elif f.v_type is not None:
+            encode_list(buf, f.v_type, f.v_spec, v)
+        else:
+            encode_val(buf, f.ttype, v, f.spec)
+    buf += _STOP
 
 
-def write_val(outbuf, ttype, val, spec=None):
+def encode_val(buf, ttype, val, spec=None):
+    """Append the encoding of `val` to the bytearray `buf`."""
     if ttype == TType.BOOL:
-        if val:
-            outbuf.write(pack_i8(1))
-        else:
-            outbuf.write(pack_i8(0))
+        buf += _TRUE if val else _FALSE
 
     elif ttype == TType.BYTE:
-        outbuf.write(pack_i8(val))
+        buf += _I8.pack(val)
 
     elif ttype == TType.I16:
-        outbuf.write(pack_i16(val))
+        buf += _I16.pack(val)
 
     elif ttype == TType.I32:
-        outbuf.write(pack_i32(val))
+        buf += _I32.pack(val)
 
     elif ttype == TType.I64:
-        outbuf.write(pack_i64(val))
+        buf += _I64.pack(val)
 
     elif ttype == TType.DOUBLE:
-        outbuf.write(pack_double(val))
+        buf += _DOUBLE.pack(val)
 
     elif ttype == TType.STRING:
         if not isinstance(val, bytes):
             val = val.encode('utf-8')
-        outbuf.write(pack_string(val))
+        buf += _I32.pack(len(val))
+        buf += val
 
     elif ttype == TType.SET or ttype == TType.LIST:
-        if isinstance(spec, tuple):
-            e_type, t_spec = spec[0], spec[1]
-        else:
-            e_type, t_spec = spec, None
-
-        val_len = len(val)
-        write_list_begin(outbuf, e_type, val_len)
-        for e_val in val:
-            write_val(outbuf, e_type, e_val, t_spec)
+        e_type, e_spec = split_spec(spec)
+        encode_list(buf, e_type, e_spec, val)
 
     elif ttype == TType.MAP:
-        if isinstance(spec[0], int):
-            k_type = spec[0]
-            k_spec = None
-        else:
-            k_type, k_spec = spec[0]
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        encode_map(buf, k_type, k_spec, v_type, v_spec, val)
 
-        if isinstance(spec[1], int):
-            v_type = spec[1]
-            v_spec = None
-        else:
-            v_type, v_spec = spec[1]
+    elif ttype == TType.STRUCT:
+        encode_struct(buf, val)
 
-        write_map_begin(outbuf, k_type, v_type, len(val))
-        for k in iter(val):
-            write_val(outbuf, k_type, k, k_spec)
-            write_val(outbuf, v_type, val[k], v_spec)
 
-    elif ttype == TType.STRUCT:
-        for fid in iter(val.thrift_spec):
-            f_spec = val.thrift_spec[fid]
-            if len(f_spec) == 3:
-                f_type, f_name, f_req = f_spec
-                f_container_spec = None
-            else:
-                f_type, f_name, f_container_spec, f_req = f_spec
-
-            v = getattr(val, f_name)
-            if v is None:
-                continue
+# The write_* functions encode into a bytearray first and hand it to
+# `outbuf` with a single write.
+
+def write_message_begin(outbuf, name, ttype, seqid, strict=True):
+    buf = bytearray()
+    encode_message_begin(buf, name, ttype, seqid, strict)
+    outbuf.write(buf)
+
+
+def write_field_begin(outbuf, ttype, fid):
+    outbuf.write(_FIELD_BEGIN.pack(ttype, fid))
+
+
+def write_field_stop(outbuf):
+    outbuf.write(_STOP)
+
+
+def write_list_begin(outbuf, etype, size):
+    outbuf.write(_LIST_BEGIN.pack(etype, size))
+
+
+def write_map_begin(outbuf, ktype, vtype, size):
+    outbuf.write(_MAP_BEGIN.pack(ktype, vtype, size))
+
+
+def write_list(outbuf, e_type, e_spec, val):
+    buf = bytearray()
+    encode_list(buf, e_type, e_spec, val)
+    outbuf.write(buf)
+
+
+def write_map(outbuf, k_type, k_spec, v_type, v_spec, val):
+    buf = bytearray()
+    encode_map(buf, k_type, k_spec, v_type, v_spec, val)
+    outbuf.write(buf)
+
 
-            write_field_begin(outbuf, f_type, fid)
-            write_val(outbuf, f_type, v, f_container_spec)
-        write_field_stop(outbuf)
+def write_struct(outbuf, val):
+    buf = bytearray()
+    encode_struct(buf, val)
+    outbuf.write(buf)
+
+
+def write_val(outbuf, ttype, val, spec=None):
+    buf = bytearray()
+    encode_val(buf, ttype, val, spec)
+    outbuf.write(buf)
 
 
 def read_message_begin(inbuf, strict=True):
@@ -205,6 +379,38 @@ def read_map_begin(inbuf):
     return k_type, v_type, sz
 
 
+def read_list(inbuf, v_type, v_spec, decode_response=True):
+    result = []
+    r_type, sz = read_list_begin(inbuf)
+    # the v_type is useless here since we already get it from spec
+    if r_type != v_type:
+        skip_items(inbuf, (r_type,), sz)
+        return []
+
+    if v_type in _BULK_FORMATS:
+        data = inbuf.read(_FIXED_SIZE[v_type] * sz) if sz > 0 else b''
+        return decode_bulk_list(data, 0, v_type, sz)[0]
+
+    for i in range(sz):
+        result.append(read_val(inbuf, v_type, v_spec, decode_response))
+    return result
+
+
+def read_map(inbuf, k_type, k_spec, v_type, v_spec, decode_response=True):
+    result = {}
+    sk_type, sv_type, sz = read_map_begin(inbuf)
+    if sk_type != k_type or sv_type != v_type:
+        skip_items(inbuf, (sk_type, sv_type), sz)
+        return {}
+
+    for i in range(sz):
+        k_val = read_val(inbuf, k_type, k_spec, decode_response)
+        v_val = read_val(inbuf, v_type, v_spec, decode_response)
+        result[k_val] = v_val
+
+    return result
+
+
 def read_val(inbuf, ttype, spec=None, decode_response=True):
     if ttype == TType.BOOL:
         return bool(unpack_i8(inbuf.read(1)))
@@ -228,9 +434,7 @@ def read_val(inbuf, ttype, spec=None, decode_response=True):
         sz = unpack_i32(inbuf.read(4))
         byte_payload = inbuf.read(sz)
 
-        # Since we cannot tell if we're getting STRING or BINARY
-        # if not asked not to decode, try both
-        if decode_response:
+        if decode_response and spec != BINARY:
             try:
                 return byte_payload.decode('utf-8')
             except UnicodeDecodeError:
@@ -238,134 +442,466 @@ def read_val(inbuf, ttype, spec=None, decode_response=True):
         return byte_payload
 
     elif ttype == TType.SET or ttype == TType.LIST:
-        if isinstance(spec, tuple):
-            v_type, v_spec = spec[0], spec[1]
-        else:
-            v_type, v_spec = spec, None
+        v_type, v_spec = split_spec(spec)
+        return read_list(inbuf, v_type, v_spec, decode_response)
 
-        result = []
-        r_type, sz = read_list_begin(inbuf)
-        # the v_type is useless here since we already get it from spec
-        if r_type != v_type:
-            for _ in range(sz):
-                skip(inbuf, r_type)
-            return []
+    elif ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        return read_map(inbuf, k_type, k_spec, v_type, v_spec,
+                        decode_response)
 
-        for i in range(sz):
-            result.append(read_val(inbuf, v_type, v_spec, decode_response))
-        return result
+    elif ttype == TType.STRUCT:
+        obj = spec()
+        read_struct(inbuf, obj, decode_response)
+        return obj
 
-    elif ttype == TType.MAP:
-        if isinstance(spec[0], int):
-            k_type = spec[0]
-            k_spec = None
-        else:
-            k_type, k_spec = spec[0]
 
-        if isinstance(spec[1], int):
-            v_type = spec[1]
-            v_spec = None
-        else:
-            v_type, v_spec = spec[1]
+def read_projected(inbuf, ttype, spec, fields, decode_response=True):
+    """Read a value, keeping only the parts selected by the projection
+    `fields` (see `read_struct`).
+    """
+    if fields is None:
+        return read_val(inbuf, ttype, spec, decode_response)
 
-        result = {}
+    if ttype == TType.STRUCT:
+        obj = spec()
+        read_struct(inbuf, obj, decode_response, fields)
+        return obj
+
+    if ttype == TType.SET or ttype == TType.LIST:
+        v_type, v_spec = split_spec(spec)
+        r_type, sz = read_list_begin(inbuf)
+        if r_type != v_type:
+            skip_items(inbuf, (r_type,), sz)
+            return []
+        return [read_projected(inbuf, v_type, v_spec, fields, decode_response)
+                for _ in range(sz)]
+
+    if ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
         sk_type, sv_type, sz = read_map_begin(inbuf)
         if sk_type != k_type or sv_type != v_type:
-            for _ in range(sz):
-                skip(inbuf, sk_type)
-                skip(inbuf, sv_type)
+            skip_items(inbuf, (sk_type, sv_type), sz)
             return {}
-
-        for i in range(sz):
+        result = {}
+        for _ in range(sz):
             k_val = read_val(inbuf, k_type, k_spec, decode_response)
-            v_val = read_val(inbuf, v_type, v_spec, decode_response)
-            result[k_val] = v_val
-
+            result[k_val] = read_projected(inbuf, v_type, v_spec, fields,
+                                           decode_response)
         return result
 
-    elif ttype == TType.STRUCT:
-        obj = spec()
-        read_struct(inbuf, obj, decode_response)
-        return obj
+    return read_val(inbuf, ttype, spec, decode_response)
 
 
-def read_struct(inbuf, obj, decode_response=True):
+def read_struct(inbuf, obj, decode_response=True, fields=None):
+    """Read a struct into `obj`.
+
+    `fields` optionally is a projection `{fid: sub_projection}` of the
+    struct, fields not in it are skipped. A sub projection of None selects
+    the whole value, a struct is projected with another dict and lists,
+    sets and map values with the projection of their elements.
+    """
+    field_map = obj.thrift_field_map
     while True:
         f_type, fid = read_field_begin(inbuf)
         if f_type == TType.STOP:
             break
 
-        if fid not in obj.thrift_spec:
+        f = field_map.get(fid)
+        # it really should equal here. but since we already wasted
+        # space storing the duplicate info, let's check it.
+        if f is None or f_type != f.ttype:
             skip(inbuf, f_type)
             continue
 
-        if len(obj.thrift_spec[fid]) == 3:
-            sf_type, f_name, f_req = obj.thrift_spec[fid]
-            f_container_spec = None
+        if fields is not None:
+            if fid not in fields:
+                skip(inbuf, f_type)
+                continue
+            if fields[fid] is not None:
+                setattr(obj, f.name, read_projected(
+                    inbuf, f_type, f.spec, fields[fid], decode_response))
+                continue
+
+        if f.k_type is not None:
+            val = read_map(inbuf, f.k_type, f.k_spec, f.v_type, f.v_spec,
+                           decode_response)
+        elif f.v_type is not None:
+            val = read_list(inbuf, f.v_type, f.v_spec, decode_response)
         else:
-            sf_type, f_name, f_container_spec, f_req = obj.thrift_spec[fid]
+            val = read_val(inbuf, f_type, f.spec, decode_response)
+        setattr(obj, f.name, val)
+
+
+# Skipping works with an explicit stack instead of recursion, so deeply
+# nested values can't hit the recursion limit. A stack entry is None while
+# inside a struct, or `[types, n]` for the `n` values left in a list/set
+# (`types` is `(v_type,)`) or a map (`(k_type, v_type)`, keys and values
+# alternating). Runs of fixed width values are skipped in one step.
+
+# Largest single read when skipping over bytes of a stream.
+_SKIP_CHUNK = 1 << 16
+
+
+def _skip_run(stack, types, sz):
+    """Return the byte size of `sz` values of `types`, or push them to the
+    skip stack and return 0 if they are not all fixed width.
+    """
+    if sz <= 0:
+        return 0
+    size = 0
+    for ttype in types:
+        t_size = _FIXED_SIZE.get(ttype)
+        if t_size is None:
+            stack.append([types, sz * len(types)])
+            return 0
+        size += t_size
+    return size * sz
+
+
+def _next_skip(stack):
+    """Take the next value to skip off the container on top of the stack."""
+    top = stack[-1]
+    types, n = top
+    if n == 1:
+        stack.pop()
+    else:
+        top[1] = n - 1
+    return types[n % len(types)]
 
-        # it really should equal here. but since we already wasted
-        # space storing the duplicate info, let's check it.
-        if f_type != sf_type:
-            skip(inbuf, f_type)
-            continue
 
-        setattr(obj, f_name,
-                read_val(inbuf, f_type, f_container_spec, decode_response))
+def skip_bytes(inbuf, sz):
+    while sz > 0:
+        chunk = min(sz, _SKIP_CHUNK)
+        if len(inbuf.read(chunk)) < chunk:
+            break   # end of input
+        sz -= chunk
 
 
 def skip(inbuf, ftype):
-    if ftype == TType.BOOL or ftype == TType.BYTE:
-        inbuf.read(1)
+    _skip(inbuf, [], ftype)
 
-    elif ftype == TType.I16:
-        inbuf.read(2)
 
-    elif ftype == TType.I32:
-        inbuf.read(4)
+def skip_items(inbuf, types, sz):
+    """Skip `sz` values of `types`, the body of a list/set (`(e_type,)`) or
+    a map (`(k_type, v_type)`).
+    """
+    stack = []
+    skip_bytes(inbuf, _skip_run(stack, types, sz))
+    if stack:
+        _skip(inbuf, stack, _next_skip(stack))
 
-    elif ftype == TType.I64:
-        inbuf.read(8)
 
-    elif ftype == TType.DOUBLE:
-        inbuf.read(8)
+def _skip(inbuf, stack, ftype):
+    while True:
+        size = _FIXED_SIZE.get(ftype)
+        if size is not None:
+            inbuf.read(size)
+
+        elif ftype == TType.STRING:
+            skip_bytes(inbuf, unpack_i32(inbuf.read(4)))
 
-    elif ftype == TType.STRING:
-        inbuf.read(unpack_i32(inbuf.read(4)))
+        elif ftype == TType.SET or ftype == TType.LIST:
+            v_type, sz = read_list_begin(inbuf)
+            skip_bytes(inbuf, _skip_run(stack, (v_type,), sz))
 
-    elif ftype == TType.SET or ftype == TType.LIST:
-        v_type, sz = read_list_begin(inbuf)
-        for i in range(sz):
-            skip(inbuf, v_type)
+        elif ftype == TType.MAP:
+            k_type, v_type, sz = read_map_begin(inbuf)
+            skip_bytes(inbuf, _skip_run(stack, (k_type, v_type), sz))
 
-    elif ftype == TType.MAP:
-        k_type, v_type, sz = read_map_begin(inbuf)
-        for i in range(sz):
-            skip(inbuf, k_type)
-            skip(inbuf, v_type)
+        elif ftype == TType.STRUCT:
+            stack.append(None)
 
-    elif ftype == TType.STRUCT:
-        while True:
-            f_type, fid = read_field_begin(inbuf)
-            if f_type == TType.STOP:
+        while stack:
+            if stack[-1] is not None:
+                ftype = _next_skip(stack)
                 break
-            skip(inbuf, f_type)
+            ftype = unpack_i8(inbuf.read(1))
+            if ftype == TType.STOP:
+                stack.pop()
+                continue
+            inbuf.read(2)   # field id
+            break
+        else:
+            return
+
+
+# The decode_* functions read from a contiguous buffer (e.g. a whole frame)
+# at an integer position and return the position after the value, which
+# saves a transport read and a bytes object per primitive.
+
+def raise_negative_size(sz):
+    raise TProtocolException(type=TProtocolException.NEGATIVE_SIZE,
+                             message='Negative size: %d' % sz)
+
+
+def decode_list(buf, pos, v_type, v_spec, decode_response=True):
+    r_type, sz = _LIST_BEGIN.unpack_from(buf, pos)
+    pos += 5
+    if r_type != v_type:
+        pos = skip_buf_items(buf, pos, (r_type,), sz)
+        return [], pos
+
+    if v_type in _BULK_FORMATS:
+        return decode_bulk_list(buf, pos, v_type, sz)
+
+    result = []
+    for i in range(sz):
+        val, pos = decode_val(buf, pos, v_type, v_spec, decode_response)
+        result.append(val)
+    return result, pos
+
+
+def decode_map(buf, pos, k_type, k_spec, v_type, v_spec,
+               decode_response=True):
+    sk_type, sv_type, sz = _MAP_BEGIN.unpack_from(buf, pos)
+    pos += 6
+    if sk_type != k_type or sv_type != v_type:
+        pos = skip_buf_items(buf, pos, (sk_type, sv_type), sz)
+        return {}, pos
+
+    result = {}
+    for i in range(sz):
+        k_val, pos = decode_val(buf, pos, k_type, k_spec, decode_response)
+        v_val, pos = decode_val(buf, pos, v_type, v_spec, decode_response)
+        result[k_val] = v_val
+    return result, pos
+
+
+def decode_val(buf, pos, ttype, spec=None, decode_response=True):
+    if ttype == TType.BOOL:
+        return bool(_I8.unpack_from(buf, pos)[0]), pos + 1
+
+    elif ttype == TType.BYTE:
+        return _I8.unpack_from(buf, pos)[0], pos + 1
+
+    elif ttype == TType.I16:
+        return _I16.unpack_from(buf, pos)[0], pos + 2
+
+    elif ttype == TType.I32:
+        return _I32.unpack_from(buf, pos)[0], pos + 4
+
+    elif ttype == TType.I64:
+        return _I64.unpack_from(buf, pos)[0], pos + 8
+
+    elif ttype == TType.DOUBLE:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+
+    elif ttype == TType.STRING:
+        sz = _I32.unpack_from(buf, pos)[0]
+        if sz < 0:
+            raise_negative_size(sz)
+        end = pos + 4 + sz
+        byte_payload = bytes(buf[pos + 4:end])
+        if decode_response and spec != BINARY:
+            try:
+                return byte_payload.decode('utf-8'), end
+            except UnicodeDecodeError:
+                pass
+        return byte_payload, end
+
+    elif ttype == TType.SET or ttype == TType.LIST:
+        v_type, v_spec = split_spec(spec)
+        return decode_list(buf, pos, v_type, v_spec, decode_response)
+
+    elif ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        return decode_map(buf, pos, k_type, k_spec, v_type, v_spec,
+                          decode_response)
+
+    elif ttype == TType.STRUCT:
+        obj = spec()
+        pos = decode_struct(buf, pos, obj, decode_response)
+        return obj, pos
+
+    return None, pos
+
+
+def decode_projected(buf, pos, ttype, spec, fields, decode_response=True):
+    """Buffer counterpart of `read_projected`."""
+    if fields is None:
+        return decode_val(buf, pos, ttype, spec, decode_response)
+
+    if ttype == TType.STRUCT:
+        obj = spec()
+        pos = decode_struct(buf, pos, obj, decode_response, fields)
+        return obj, pos
+
+    if ttype == TType.SET or ttype == TType.LIST:
+        v_type, v_spec = split_spec(spec)
+        r_type, sz = _LIST_BEGIN.unpack_from(buf, pos)
+        pos += 5
+        if r_type != v_type:
+            pos = skip_buf_items(buf, pos, (r_type,), sz)
+            return [], pos
+        result = []
+        for _ in range(sz):
+            val, pos = decode_projected(buf, pos, v_type, v_spec, fields,
+                                        decode_response)
+            result.append(val)
+        return result, pos
+
+    if ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        sk_type, sv_type, sz = _MAP_BEGIN.unpack_from(buf, pos)
+        pos += 6
+        if sk_type != k_type or sv_type != v_type:
+            pos = skip_buf_items(buf, pos, (sk_type, sv_type), sz)
+            return {}, pos
+        result = {}
+        for _ in range(sz):
+            k_val, pos = decode_val(buf, pos, k_type, k_spec, decode_response)
+            result[k_val], pos = decode_projected(
+                buf, pos, v_type, v_spec, fields, decode_response)
+        return result, pos
+
+    return decode_val(buf, pos, ttype, spec, decode_response)
+
+
+def decode_struct(buf, pos, obj, decode_response=True, fields=None):
+    """Buffer counterpart of `read_struct`, returns the position after the
+    struct.
+    """
+    field_map = obj.thrift_field_map
+    while True:
+        f_type = _I8.unpack_from(buf, pos)[0]
+        if f_type == TType.STOP:
+            return pos + 1
+        fid = _I16.unpack_from(buf, pos + 1)[0]
+        pos += 3
+
+        f = field_map.get(fid)
+        if f is None or f_type != f.ttype:
+            pos = skip_buf(buf, pos, f_type)
+            continue
+
+        if fields is not None:
+            if fid not in fields:
+                pos = skip_buf(buf, pos, f_type)
+                continue
+            if fields[fid] is not None:
+                val, pos = decode_projected(buf, pos, f_type, f.spec,
+                                            fields[fid], decode_response)
+                setattr(obj, f.name, val)
+                continue
+
+        if f.k_type is not None:
+            val, pos = decode_map(buf, pos, f.k_type, f.k_spec,
+                                  f.v_type, f.v_spec, decode_response)
+        elif f.v_type is not None:
+            val, pos = decode_list(buf, pos, f.v_type, f.v_spec,
+                                   decode_response)
+        else:
+            val, pos = decode_val(buf, pos, f_type, f.spec, decode_response)
+        setattr(obj, f.name, val)
+
+
+def skip_buf(buf, pos, ftype):
+    """Return the position after the value of type `ftype` at `pos`."""
+    return _skip_buf(buf, pos, [], ftype)
+
+
+def skip_buf_items(buf, pos, types, sz):
+    """Buffer counterpart of `skip_items`, returns the position after the
+    values.
+    """
+    stack = []
+    pos += _skip_run(stack, types, sz)
+    if stack:
+        pos = _skip_buf(buf, pos, stack, _next_skip(stack))
+    return pos
+
+
+def _skip_buf(buf, pos, stack, ftype):
+    while True:
+        size = _FIXED_SIZE.get(ftype)
+        if size is not None:
+            pos += size
+
+        elif ftype == TType.STRING:
+            sz = _I32.unpack_from(buf, pos)[0]
+            if sz < 0:
+                raise_negative_size(sz)
+            pos += 4 + sz
+
+        elif ftype == TType.SET or ftype == TType.LIST:
+            v_type, sz = _LIST_BEGIN.unpack_from(buf, pos)
+            pos += 5 + _skip_run(stack, (v_type,), sz)
+
+        elif ftype == TType.MAP:
+            k_type, v_type, sz = _MAP_BEGIN.unpack_from(buf, pos)
+            pos += 6 + _skip_run(stack, (k_type, v_type), sz)
+
+        elif ftype == TType.STRUCT:
+            stack.append(None)
+
+        while stack:
+            if stack[-1] is not None:
+                ftype = _next_skip(stack)
+                break
+            ftype = _I8.unpack_from(buf, pos)[0]
+            if ftype == TType.STOP:
+                pos += 1
+                stack.pop()
+                continue
+            pos += 3
+            break
+        else:
+            return pos
 
 
 class TBinaryProtocol(object):
-    """Binary implementation of the Thrift protocol driver."""
+    """Binary implementation of the Thrift protocol driver.
+
+    Structs are read and written with codecs generated per struct class,
+    see `binary_codec`. Pass `codegen=False` to interpret `thrift_spec`
+    instead.
+
+    A message is encoded into one bytearray between `write_message_begin`
+    and `write_message_end`, which hands it to the transport in a single
+    write.
+
+    If the transport exposes its buffered input through `get_read_buffer`
+    and `set_read_pos` (see `TFramedTransport` and `TMemoryBuffer`), structs
+    are decoded in place from that buffer instead of through `read`.
+
+    Lists of bools, integers and doubles are decoded into lists by default.
+    With the generated codecs, `primitive_lists` may be set to `'array'`
+    or `'numpy'` to get `array.array` or `numpy.ndarray` values instead.
+    Both are accepted when writing as well, with any option.
+    """
 
     def __init__(self, trans,
                  strict_read=True, strict_write=True,
-                 decode_response=True):
+                 decode_response=True, codegen=True, primitive_lists='list'):
+        if primitive_lists not in BULK_DECODERS:
+            raise ValueError('Unknown primitive_lists: %r' % primitive_lists)
+        if primitive_lists != 'list' and not codegen:
+            raise ValueError('primitive_lists requires codegen')
+
         self.trans = trans
         self.strict_read = strict_read
         self.strict_write = strict_write
         self.decode_response = decode_response
+        self.codegen = codegen
+        self.primitive_lists = primitive_lists
+        self._wbuf = None
 
     def skip(self, ttype):
-        skip(self.trans, ttype)
+        rbuf = self._read_buffer()
+        if rbuf is None:
+            return skip(self.trans, ttype)
+
+        buf, pos = rbuf
+        try:
+            end = skip_buf(buf, pos, ttype)
+        except struct.error:
+            end = None
+        self._set_read_pos(buf, end)
 
     def read_message_begin(self):
         api, ttype, seqid = read_message_begin(
@@ -376,27 +912,77 @@ class TBinaryProtocol(object):
         pass
 
     def write_message_begin(self, name, ttype, seqid):
-        write_message_begin(self.trans, name, ttype, seqid,
-                            strict=self.strict_write)
+        self._wbuf = bytearray()
+        encode_message_begin(self._wbuf, name, ttype, seqid,
+                             strict=self.strict_write)
 
     def write_message_end(self):
-        pass
-
-    def read_struct(self, obj):
+        if self._wbuf is not None:
+            buf, self._wbuf = self._wbuf, None
+            self.trans.write(buf)
+
+    def read_struct(self, obj, fields=None):
+        """Read a struct into `obj`, optionally only the fields selected by
+        the projection `fields` (see `binary.read_struct`).
+        """
+        rbuf = self._read_buffer()
+        if rbuf is not None:
+            buf, pos = rbuf
+            try:
+                if fields is not None:
+                    end = decode_struct(buf, pos, obj, self.decode_response,
+                                        fields)
+                elif self.codegen:
+                    end = binary_codec.decode_struct(
+                        buf, pos, obj, self.decode_response,
+                        self.primitive_lists)
+                else:
+                    end = decode_struct(buf, pos, obj, self.decode_response)
+            except struct.error:
+                end = None
+            return self._set_read_pos(buf, end)
+
+        if fields is not None:
+            return read_struct(self.trans, obj, self.decode_response, fields)
+        if self.codegen:
+            return binary_codec.read_struct(
+                self.trans, obj, self.decode_response, self.primitive_lists)
         return read_struct(self.trans, obj, self.decode_response)
 
     def write_struct(self, obj):
-        write_val(self.trans, TType.STRUCT, obj)
+        buf = self._wbuf if self._wbuf is not None else bytearray()
+        if self.codegen:
+            binary_codec.encode_struct(buf, obj)
+        else:
+            encode_struct(buf, obj)
+        if buf is not self._wbuf:
+            self.trans.write(buf)
+
+    def _read_buffer(self):
+        get_read_buffer = getattr(self.trans, 'get_read_buffer', None)
+        if get_read_buffer is not None:
+            return get_read_buffer()
+        return None
+
+    def _set_read_pos(self, buf, end):
+        if end is None or end > len(buf):
+            raise TProtocolException(
+                type=TProtocolException.INVALID_DATA,
+                message='Value exceeds the buffered input')
+        self.trans.set_read_pos(end)
 
 
 class TBinaryProtocolFactory(object):
     def __init__(self, strict_read=True, strict_write=True,
-                 decode_response=True):
+                 decode_response=True, codegen=True, primitive_lists='list'):
         self.strict_read = strict_read
         self.strict_write = strict_write
         self.decode_response = decode_response
+        self.codegen = codegen
+        self.primitive_lists = primitive_lists
 
     def get_protocol(self, trans):
         return TBinaryProtocol(trans,
                                self.strict_read, self.strict_write,
-                               self.decode_response)
+                               self.decode_response, self.codegen,
+                               self.primitive_lists)
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+"""
+    thriftpy.protocol.binary_codec
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Binary protocol read/write functions generated per struct class.
+
+    Instead of interpreting `thrift_spec` for every value, the codec of a
+    struct is straight-line code with field headers precomputed, precompiled
+    `struct.Struct` packers and direct attribute access. Encoding appends to
+    a bytearray, the header of a fixed width field is packed together with
+    its value. Besides reading from a transport, structs can be decoded from
+    a contiguous buffer at a position with `unpack_from`.
+
+    Codecs are built on first use and cached in `cls.thrift_codecs`, which
+    is reset whenever the field table of the class is regenerated (see
+    `thrift.gen_init`).
+"""
+
+from __future__ import absolute_import
+
+import collections
+import functools
+import keyword
+import linecache
+import re
+import struct
+
+from ..thrift import TType, BINARY, split_spec
+
+
+TBinaryCodec = collections.namedtuple('TBinaryCodec', ['read', 'decode', 'encode'])
+
+_FIELD_BEGIN = struct.Struct("!bh")
+
+# fixed width primitives: ttype -> (name, size)
+_PRIMITIVES = {
+    TType.BYTE: ('i8', 1),
+    TType.I16: ('i16', 2),
+    TType.I32: ('i32', 4),
+    TType.I64: ('i64', 8),
+    TType.DOUBLE: ('double', 8),
+}
+
+# list elements packed and unpacked in bulk: ttype -> size
+_BULK = dict((ttype, size) for ttype, (_, size) in _PRIMITIVES.items())
+_BULK[TType.BOOL] = 1
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# inner nodes of the field id dispatch tree split larger groups in halves
+_DISPATCH_CHAIN = 8
+
+
+def _namespace(primitive_lists):
+    from .binary import (read_val, decode_val, encode_val, skip, skip_buf,
+                         skip_items, skip_buf_items, raise_negative_size,
+                         encode_bulk_list, BULK_DECODERS)
+
+    ns = {
+        'read_val': read_val,
+        'decode_val': decode_val,
+        'encode_val': encode_val,
+        'skip': skip,
+        'skip_buf': skip_buf,
+        'skip_items': skip_items,
+        'skip_buf_items': skip_buf_items,
+        'raise_negative_size': raise_negative_size,
+        'read_struct': read_struct,
+        'decode_struct': decode_struct,
+        'encode_struct': encode_struct,
+        'encode_bulk_list': encode_bulk_list,
+        'decode_bulk_list': BULK_DECODERS[primitive_lists],
+        'STOP': b'\x00',
+    }
+    if primitive_lists != 'list':
+        # nested structs are decoded with the same option
+        ns['read_struct'] = functools.partial(
+            read_struct, primitive_lists=primitive_lists)
+        ns['decode_struct'] = functools.partial(
+            decode_struct, primitive_lists=primitive_lists)
+    for fmt, name in (('b', 'i8'), ('h', 'i16'), ('i', 'i32'),
+                      ('q', 'i64'), ('d', 'double'),
+                      ('bi', 'list_begin'), ('bbi', 'map_begin')):
+        s = struct.Struct('!' + fmt)
+        ns['pack_' + name] = s.pack
+        ns['unpack_' + name] = s.unpack
+        ns['unpack_from_' + name] = s.unpack_from
+        # field header followed by the value, `pack_field_i32(ttype, fid, v)`
+        ns['pack_field_' + name] = struct.Struct('!bh' + fmt).pack
+    return ns
+
+
+class _CodecBuilder(object):
+
+    def __init__(self, cls, primitive_lists='list'):
+        self.cls = cls
+        self.ns = _namespace(primitive_lists)
+        self.lines = []
+        self.counter = 0
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def var(self, prefix):
+        self.counter += 1
+        return '%s%d' % (prefix, self.counter)
+
+    def const(self, value, prefix='c'):
+        name = self.var('_' + prefix)
+        self.ns[name] = value
+        return name
+
+    @staticmethod
+    def attr(obj, name):
+        if _IDENTIFIER.match(name) and not keyword.iskeyword(name):
+            return '%s.%s' % (obj, name)
+        return None
+
+    # encode
+    def gen_encode(self):
+        self.emit(0, 'def encode(buf, obj):')
+        for f in self.cls.thrift_fields:
+            expr = self.attr('obj', f.name) or 'getattr(obj, %r)' % f.name
+            self.emit(1, 'v = %s' % expr)
+            self.emit(1, 'if v is not None:')
+            self.encode_val(f.ttype, f.spec, 'v', 2, fid=f.fid)
+        self.emit(1, 'buf += STOP')
+
+    def encode_val(self, ttype, spec, val, indent, fid=None):
+        """Emit code appending `val` to `buf`, preceded by its field header
+        if `fid` is given.
+        """
+        emit = self.emit
+        if fid is None:
+            pack, header = 'pack_', ''
+        else:
+            pack, header = 'pack_field_', '%d, %d, ' % (ttype, fid)
+
+        if ttype == TType.BOOL:
+            emit(indent, 'buf += %si8(%s1 if %s else 0)' % (pack, header, val))
+
+        elif ttype in _PRIMITIVES:
+            emit(indent, 'buf += %s%s(%s%s)'
+                 % (pack, _PRIMITIVES[ttype][0], header, val))
+
+        elif ttype == TType.STRING:
+            emit(indent, 'if not isinstance(%s, bytes):' % val)
+            emit(indent + 1, '%s = %s.encode("utf-8")' % (val, val))
+            emit(indent, 'buf += %si32(%slen(%s))' % (pack, header, val))
+            emit(indent, 'buf += %s' % val)
+
+        elif ttype == TType.SET or ttype == TType.LIST:
+            e_type, e_spec = split_spec(spec)
+            e = self.var('e')
+            emit(indent, 'buf += %slist_begin(%s%d, len(%s))'
+                 % (pack, header, e_type, val))
+            if e_type in _BULK:
+                emit(indent, 'encode_bulk_list(buf, %d, %s)' % (e_type, val))
+            else:
+                emit(indent, 'for %s in %s:' % (e, val))
+                self.encode_val(e_type, e_spec, e, indent + 1)
+
+        elif ttype == TType.MAP:
+            k_type, k_spec = split_spec(spec[0])
+            v_type, v_spec = split_spec(spec[1])
+            k, v = self.var('k'), self.var('v')
+            emit(indent, 'buf += %smap_begin(%s%d, %d, len(%s))'
+                 % (pack, header, k_type, v_type, val))
+            emit(indent, 'for %s, %s in %s.items():' % (k, v, val))
+            self.encode_val(k_type, k_spec, k, indent + 1)
+            self.encode_val(v_type, v_spec, v, indent + 1)
+
+        else:
+            if fid is not None:
+                emit(indent, 'buf += %s' % self.const(
+                    _FIELD_BEGIN.pack(ttype, fid), 'f'))
+            if ttype == TType.STRUCT:
+                emit(indent, 'encode_struct(buf, %s)' % val)
+            else:
+                emit(indent, 'encode_val(buf, %d, %s, %s)'
+                     % (ttype, val, self.const(spec, 's')))
+
+    # read
+    def gen_read(self):
+        emit = self.emit
+        emit(0, 'def read(inbuf, obj, decode_response=True):')
+        emit(1, 'read = inbuf.read')
+        emit(1, 'while True:')
+        emit(2, 'f_type = unpack_i8(read(1))[0]')
+        emit(2, 'if f_type == 0:')
+        emit(3, 'break')
+        emit(2, 'fid = unpack_i16(read(2))[0]')
+        self.dispatch(self.cls.thrift_fields, 2, self.read_val)
+        emit(2, 'skip(inbuf, f_type)')
+
+    def dispatch(self, fields, indent, gen_val):
+        """Emit the field id dispatch, `gen_val` emits reading a value."""
+        if not fields:
+            return
+
+        if len(fields) > _DISPATCH_CHAIN:
+            mid = len(fields) // 2
+            self.emit(indent, 'if fid < %d:' % fields[mid].fid)
+            self.dispatch(fields[:mid], indent + 1, gen_val)
+            self.emit(indent, 'else:')
+            self.dispatch(fields[mid:], indent + 1, gen_val)
+            return
+
+        for i, f in enumerate(fields):
+            self.emit(indent, '%s fid == %d:' % ('elif' if i else 'if', f.fid))
+            self.emit(indent + 1, 'if f_type == %d:' % f.ttype)
+            gen_val(f.ttype, f.spec, 'v', indent + 2)
+            target = self.attr('obj', f.name)
+            if target:
+                self.emit(indent + 2, '%s = v' % target)
+            else:
+                self.emit(indent + 2, 'setattr(obj, %r, v)' % f.name)
+            self.emit(indent + 2, 'continue')
+
+    def decode_utf8(self, target, indent):
+        # strings are decoded if asked to, binary values are kept as bytes
+        emit = self.emit
+        emit(indent, 'if decode_response:')
+        emit(indent + 1, 'try:')
+        emit(indent + 2, '%s = %s.decode("utf-8")' % (target, target))
+        emit(indent + 1, 'except UnicodeDecodeError:')
+        emit(indent + 2, 'pass')
+
+    def read_val(self, ttype, spec, target, indent):
+        emit = self.emit
+
+        if ttype == TType.BOOL:
+            emit(indent, '%s = unpack_i8(read(1))[0] != 0' % target)
+
+        elif ttype in _PRIMITIVES:
+            name, size = _PRIMITIVES[ttype]
+            emit(indent, '%s = unpack_%s(read(%d))[0]' % (target, name, size))
+
+        elif ttype == TType.STRING:
+            emit(indent, '%s = read(unpack_i32(read(4))[0])' % target)
+            if spec != BINARY:
+                self.decode_utf8(target, indent)
+
+        elif ttype == TType.SET or ttype == TType.LIST:
+            e_type, e_spec = split_spec(spec)
+            r_type, sz, e = self.var('r_type'), self.var('sz'), self.var('e')
+            emit(indent, '%s, %s = unpack_list_begin(read(5))' % (r_type, sz))
+            emit(indent, '%s = []' % target)
+            emit(indent, 'if %s != %d:' % (r_type, e_type))
+            emit(indent + 1, 'skip_items(inbuf, (%s,), %s)' % (r_type, sz))
+            emit(indent, 'else:')
+            if e_type in _BULK:
+                emit(indent + 1, '%s = decode_bulk_list(read(%d * %s) if %s > 0'
+                     ' else b"", 0, %d, %s)[0]'
+                     % (target, _BULK[e_type], sz, sz, e_type, sz))
+            else:
+                emit(indent + 1, 'for _ in range(%s):' % sz)
+                self.read_val(e_type, e_spec, e, indent + 2)
+                emit(indent + 2, '%s.append(%s)' % (target, e))
+
+        elif ttype == TType.MAP:
+            k_type, k_spec = split_spec(spec[0])
+            v_type, v_spec = split_spec(spec[1])
+            rk_type, rv_type = self.var('rk_type'), self.var('rv_type')
+            sz, k, v = self.var('sz'), self.var('k'), self.var('v')
+            emit(indent, '%s, %s, %s = unpack_map_begin(read(6))'
+                 % (rk_type, rv_type, sz))
+            emit(indent, '%s = {}' % target)
+            emit(indent, 'if %s != %d or %s != %d:'
+                 % (rk_type, k_type, rv_type, v_type))
+            emit(indent + 1, 'skip_items(inbuf, (%s, %s), %s)'
+                 % (rk_type, rv_type, sz))
+            emit(indent, 'else:')
+            emit(indent + 1, 'for _ in range(%s):' % sz)
+            self.read_val(k_type, k_spec, k, indent + 2)
+            self.read_val(v_type, v_spec, v, indent + 2)
+            emit(indent + 2, '%s[%s] = %s' % (target, k, v))
+
+        elif ttype == TType.STRUCT:
+            emit(indent, '%s = %s()' % (target, self.const(spec, 'struct')))
+            emit(indent, 'read_struct(inbuf, %s, decode_response)' % target)
+
+        else:
+            emit(indent, '%s = read_val(inbuf, %d, %s, decode_response)'
+                 % (target, ttype, self.const(spec, 's')))
+
+    # decode
+    def gen_decode(self):
+        emit = self.emit
+        emit(0, 'def decode(buf, pos, obj, decode_response=True):')
+        emit(1, 'while True:')
+        emit(2, 'f_type = unpack_from_i8(buf, pos)[0]')
+        emit(2, 'if f_type == 0:')
+        emit(3, 'return pos + 1')
+        emit(2, 'fid = unpack_from_i16(buf, pos + 1)[0]')
+        emit(2, 'pos += 3')
+        self.dispatch(self.cls.thrift_fields, 2, self.decode_val)
+        emit(2, 'pos = skip_buf(buf, pos, f_type)')
+
+    def decode_val(self, ttype, spec, target, indent):
+        emit = self.emit
+
+        if ttype == TType.BOOL:
+            emit(indent, '%s = unpack_from_i8(buf, pos)[0] != 0' % target)
+            emit(indent, 'pos += 1')
+
+        elif ttype in _PRIMITIVES:
+            name, size = _PRIMITIVES[ttype]
+            emit(indent, '%s = unpack_from_%s(buf, pos)[0]' % (target, name))
+            emit(indent, 'pos += %d' % size)
+
+        elif ttype == TType.STRING:
+            sz = self.var('sz')
+            emit(indent, '%s = unpack_from_i32(buf, pos)[0]' % sz)
+            emit(indent, 'if %s < 0:' % sz)
+            emit(indent + 1, 'raise_negative_size(%s)' % sz)
+            emit(indent, 'pos += 4')
+            emit(indent, '%s = bytes(buf[pos:pos + %s])' % (target, sz))
+            emit(indent, 'pos += %s' % sz)
+            if spec != BINARY:
+                self.decode_utf8(target, indent)
+
+        elif ttype == TType.SET or ttype == TType.LIST:
+            e_type, e_spec = split_spec(spec)
+            r_type, sz, e = self.var('r_type'), self.var('sz'), self.var('e')
+            emit(indent, '%s, %s = unpack_from_list_begin(buf, pos)'
+                 % (r_type, sz))
+            emit(indent, 'pos += 5')
+            emit(indent, 'if %s != %d:' % (r_type, e_type))
+            emit(indent + 1, '%s = []' % target)
+            emit(indent + 1, 'pos = skip_buf_items(buf, pos, (%s,), %s)'
+                 % (r_type, sz))
+            emit(indent, 'else:')
+            if e_type in _BULK:
+                emit(indent + 1, '%s, pos = decode_bulk_list(buf, pos, %d, %s)'
+                     % (target, e_type, sz))
+            else:
+                emit(indent + 1, '%s = []' % target)
+                emit(indent + 1, 'for _ in range(%s):' % sz)
+                self.decode_val(e_type, e_spec, e, indent + 2)
+                emit(indent + 2, '%s.append(%s)' % (target, e))
+
+        elif ttype == TType.MAP:
+            k_type, k_spec = split_spec(spec[0])
+            v_type, v_spec = split_spec(spec[1])
+            rk_type, rv_type = self.var('rk_type'), self.var('rv_type')
+            sz, k, v = self.var('sz'), self.var('k'), self.var('v')
+            emit(indent, '%s, %s, %s = unpack_from_map_begin(buf, pos)'
+                 % (rk_type, rv_type, sz))
+            emit(indent, 'pos += 6')
+            emit(indent, '%s = {}' % target)
+            emit(indent, 'if %s != %d or %s != %d:'
+                 % (rk_type, k_type, rv_type, v_type))
+            emit(indent + 1, 'pos = skip_buf_items(buf, pos, (%s, %s), %s)'
+                 % (rk_type, rv_type, sz))
+            emit(indent, 'else:')
+            emit(indent + 1, 'for _ in range(%s):' % sz)
+            self.decode_val(k_type, k_spec, k, indent + 2)
+            self.decode_val(v_type, v_spec, v, indent + 2)
+            emit(indent + 2, '%s[%s] = %s' % (target, k, v))
+
+        elif ttype == TType.STRUCT:
+            emit(indent, '%s = %s()' % (target, self.const(spec, 'struct')))
+            emit(indent, 'pos = decode_struct(buf, pos, %s, decode_response)'
+                 % target)
+
+        else:
+            emit(indent, '%s, pos = decode_val(buf, pos, %d, %s, decode_response)'
+                 % (target, ttype, self.const(spec, 's')))
+
+    def build(self):
+        self.gen_encode()
+        self.gen_read()
+        self.gen_decode()
+        source = '\n'.join(self.lines) + '\n'
+
+        name = '<generated binary codec {}>'.format(self.cls.__name__)
+        code = compile(source, name, 'exec')
+        # see thrift.init_func_generator
+        linecache.cache[name] = (len(source), None, source.splitlines(True), name)
+
+        exec(code, self.ns)
+        return TBinaryCodec(read=self.ns['read'], decode=self.ns['decode'],
+                            encode=self.ns['encode'])
+
+
+def gen_codec(cls, primitive_lists='list'):
+    """Generate the `TBinaryCodec` of a struct class from its
+    `thrift_fields`.
+
+    `primitive_lists` selects what lists of fixed width elements are decoded
+    into, see `binary.BULK_DECODERS`.
+    """
+    return _CodecBuilder(cls, primitive_lists).build()
+
+
+def get_codec(cls, primitive_lists='list'):
+    """Get the cached `TBinaryCodec` of a struct class, generating it on
+    first use.
+    """
+    key = 'binary' if primitive_lists == 'list' else 'binary:' + primitive_lists
+    codecs = cls.thrift_codecs
+    try:
+        return codecs[key]
+    except KeyError:
+        codec = codecs[key] = gen_codec(cls, primitive_lists)
+        return codec
+
+
+def read_struct(inbuf, obj, decode_response=True, primitive_lists='list'):
+    get_codec(obj.__class__, primitive_lists).read(
+        inbuf, obj, decode_response)
+
+
+def decode_struct(buf, pos, obj, decode_response=True, primitive_lists='list'):
+    return get_codec(obj.__class__, primitive_lists).decode(
+        buf, pos, obj, decode_response)
+
+
+def encode_struct(buf, obj):
+    get_codec(obj.__class__).encode(buf, obj)
+
+
+def write_struct(outbuf, obj):
+    buf = bytearray()
+    get_codec(obj.__class__).encode(buf, obj)
+    outbuf.write(buf)
@@ -2,12 +2,11 @@
 
 from __future__ import absolute_import
 
-import array
-from struct import pack, unpack
+import struct
 
 from .exc import TProtocolException
 from ..thrift import TException
-from ..thrift import TType
+from ..thrift import TType, BINARY, split_spec
 
 from http2thrift.thriftpy._compat import PY3
 
@@ -21,6 +20,27 @@ CONTAINER_READ = 6
 VALUE_READ = 7
 BOOL_READ = 8
 
+PROTOCOL_ID = 0x82
+VERSION = 1
+VERSION_MASK = 0x1f
+TYPE_BITS = 0x07
+TYPE_SHIFT_AMOUNT = 5
+
+_BYTE = struct.Struct('!b')
+_DOUBLE = struct.Struct('<d')
+
+_INT_LIMITS = {
+    8: (-(1 << 7), (1 << 7) - 1),
+    16: (-(1 << 15), (1 << 15) - 1),
+    32: (-(1 << 31), (1 << 31) - 1),
+    64: (-(1 << 63), (1 << 63) - 1),
+}
+_TTYPE_BITS = {
+    TType.I16: 16,
+    TType.I32: 32,
+    TType.I64: 64,
+}
+
 
 def check_integer_limits(i, bits):
     if bits == 8 and (i < -128 or i > 127):
@@ -41,29 +61,28 @@ def check_integer_limits(i, bits):
 
 
 def make_zig_zag(n, bits):
-    check_integer_limits(n, bits)
-    return (n << 1) ^ (n >> (bits - 1))
+    lo, hi = _INT_LIMITS[bits]
+    if n < lo or n > hi:
+        check_integer_limits(n, bits)
+    # n >> 63 is the sign of any integer in range, whatever the width
+    return (n << 1) ^ (n >> 63)
 
 
 def from_zig_zag(n):
     return (n >> 1) ^ -(n & 1)
 
 
-def write_varint(trans, n):
-    out = []
-    while True:
-        if n & ~0x7f == 0:
-            out.append(n)
-            break
-        else:
-            out.append((n & 0xff) | 0x80)
-            n = n >> 7
-    data = array.array('B', out).tostring()
+def encode_varint(buf, n):
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
 
-    if PY3:
-        trans.write(data)
-    else:
-        trans.write(bytes(data))
+
+def write_varint(trans, n):
+    buf = bytearray()
+    encode_varint(buf, n)
+    trans.write(bytes(buf))
 
 
 def read_varint(trans):
@@ -79,6 +98,25 @@ def read_varint(trans):
         shift += 7
 
 
+def decode_varint(buf, pos):
+    """Decode a varint at `pos` of a bytearray or py3 bytes, return the
+    value and the position after it.
+    """
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+
+    result = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+
+
 class CompactType(object):
     STOP = 0x00
     TRUE = 0x01
@@ -113,14 +151,549 @@ TTYPES = dict((v, k) for k, v in CTYPES.items())
 TTYPES[CompactType.FALSE] = TType.BOOL
 
 
+def get_ttype(ctype):
+    try:
+        return TTYPES[ctype & 0x0f]
+    except KeyError:
+        raise TProtocolException(TProtocolException.INVALID_DATA,
+                                 'Bad compact type: %d' % (ctype & 0x0f))
+
+
+def _check_size(sz):
+    if sz < 0:
+        raise TException("Length < 0")
+    return sz
+
+
+def _decode_string(byte_payload, spec, decode_response):
+    if decode_response and spec != BINARY:
+        try:
+            return byte_payload.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    return byte_payload
+
+
+# The encode_* functions append to a bytearray, so a struct or a whole
+# message goes to the transport in a single write. Integers are checked
+# against their limits with one comparison, lists of numbers are encoded
+# in one loop.
+
+def encode_message_begin(buf, name, ttype, seqid):
+    buf.append(PROTOCOL_ID)
+    buf.append(VERSION | (ttype << TYPE_SHIFT_AMOUNT))
+    encode_varint(buf, seqid)
+    encode_val(buf, TType.STRING, name)
+
+
+def encode_field_header(buf, ctype, fid, last_fid):
+    delta = fid - last_fid
+    if 0 < delta <= 15:
+        buf.append(delta << 4 | ctype)
+    else:
+        buf.append(ctype)
+        encode_varint(buf, make_zig_zag(fid, 16))
+
+
+def encode_collection_begin(buf, e_type, sz):
+    if sz <= 14:
+        buf.append(sz << 4 | CTYPES[e_type])
+    else:
+        buf.append(0xf0 | CTYPES[e_type])
+        encode_varint(buf, sz)
+
+
+def encode_int_list(buf, bits, val):
+    lo, hi = _INT_LIMITS[bits]
+    append = buf.append
+    for n in val:
+        if n < lo or n > hi:
+            check_integer_limits(n, bits)
+        n = (n << 1) ^ (n >> 63)
+        while n > 0x7f:
+            append((n & 0x7f) | 0x80)
+            n >>= 7
+        append(n)
+
+
+def encode_list(buf, e_type, e_spec, val):
+    encode_collection_begin(buf, e_type, len(val))
+
+    bits = _TTYPE_BITS.get(e_type)
+    if bits is not None:
+        encode_int_list(buf, bits, val)
+    elif e_type == TType.DOUBLE:
+        buf += struct.pack('<%dd' % len(val), *val)
+    elif e_type == TType.BYTE:
+        buf += struct.pack('%db' % len(val), *val)
+    elif e_type == TType.BOOL:
+        buf.extend(CompactType.TRUE if v else CompactType.FALSE for v in val)
+    else:
+        for e_val in val:
+            encode_val(buf, e_type, e_val, e_spec)
+
+
+def encode_map(buf, k_type, k_spec, v_type, v_spec, val):
+    if not val:
+        buf.append(0)
+        return
+
+    encode_varint(buf, len(val))
+    buf.append(CTYPES[k_type] << 4 | CTYPES[v_type])
+    for k, v in val.items():
+        encode_val(buf, k_type, k, k_spec)
+        encode_val(buf, v_type, v, v_spec)
+
+
+def encode_struct(buf, obj):
+    last_fid = 0
+    for f in obj.thrift_fields:
+        val = getattr(obj, f.name)
+        if val is None:
+            continue
+
+        if f.ttype == TType.BOOL:
+            # bool fields are carried in the field header
+            ctype = CompactType.TRUE if val else CompactType.FALSE
+            encode_field_header(buf, ctype, f.fid, last_fid)
+        else:
+            encode_field_header(buf, CTYPES[f.ttype], f.fid, last_fid)
+            encode_val(buf, f.ttype, val, f.spec)
+        last_fid = f.fid
+    buf.append(CompactType.STOP)
+
+
+def encode_val(buf, ttype, val, spec=None):
+    bits = _TTYPE_BITS.get(ttype)
+    if bits is not None:
+        lo, hi = _INT_LIMITS[bits]
+        if val < lo or val > hi:
+            check_integer_limits(val, bits)
+        encode_varint(buf, (val << 1) ^ (val >> 63))
+
+    elif ttype == TType.STRING:
+        if not isinstance(val, bytes):
+            val = val.encode('utf-8')
+        encode_varint(buf, len(val))
+        buf += val
+
+    elif ttype == TType.BOOL:
+        buf.append(CompactType.TRUE if val else CompactType.FALSE)
+
+    elif ttype == TType.BYTE:
+        buf += _BYTE.pack(val)
+
+    elif ttype == TType.DOUBLE:
+        buf += _DOUBLE.pack(val)
+
+    elif ttype == TType.LIST or ttype == TType.SET:
+        e_type, e_spec = split_spec(spec)
+        encode_list(buf, e_type, e_spec, val)
+
+    elif ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        encode_map(buf, k_type, k_spec, v_type, v_spec, val)
+
+    elif ttype == TType.STRUCT:
+        encode_struct(buf, val)
+
+
+# The read_* functions read values from a transport.
+
+def read_message_begin(inbuf):
+    proto_id = ord(inbuf.read(1))
+    if proto_id != PROTOCOL_ID:
+        raise TProtocolException(TProtocolException.BAD_VERSION,
+                                 'Bad protocol id in the message: %d'
+                                 % proto_id)
+
+    ver_type = ord(inbuf.read(1))
+    ttype = (ver_type >> TYPE_SHIFT_AMOUNT) & TYPE_BITS
+    version = ver_type & VERSION_MASK
+    if version != VERSION:
+        raise TProtocolException(TProtocolException.BAD_VERSION,
+                                 'Bad version: %d (expect %d)'
+                                 % (version, VERSION))
+    seqid = read_varint(inbuf)
+    name = read_val(inbuf, TType.STRING)
+    return name, ttype, seqid
+
+
+def read_collection_begin(inbuf):
+    size_type = ord(inbuf.read(1))
+    sz = size_type >> 4
+    if sz == 15:
+        sz = _check_size(read_varint(inbuf))
+    return get_ttype(size_type), sz
+
+
+def read_map_begin(inbuf):
+    sz = _check_size(read_varint(inbuf))
+    types = ord(inbuf.read(1)) if sz > 0 else 0
+    return get_ttype(types >> 4), get_ttype(types), sz
+
+
+def read_val(inbuf, ttype, spec=None, decode_response=True):
+    if ttype in _TTYPE_BITS:
+        return from_zig_zag(read_varint(inbuf))
+
+    elif ttype == TType.STRING:
+        sz = _check_size(read_varint(inbuf))
+        return _decode_string(inbuf.read(sz), spec, decode_response)
+
+    elif ttype == TType.BOOL:
+        return ord(inbuf.read(1)) == CompactType.TRUE
+
+    elif ttype == TType.BYTE:
+        return _BYTE.unpack(inbuf.read(1))[0]
+
+    elif ttype == TType.DOUBLE:
+        return _DOUBLE.unpack(inbuf.read(8))[0]
+
+    elif ttype == TType.LIST or ttype == TType.SET:
+        v_type, v_spec = split_spec(spec)
+        r_type, sz = read_collection_begin(inbuf)
+        if r_type != v_type:
+            for _ in range(sz):
+                skip(inbuf, r_type)
+            return []
+        return [read_val(inbuf, v_type, v_spec, decode_response)
+                for _ in range(sz)]
+
+    elif ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        sk_type, sv_type, sz = read_map_begin(inbuf)
+        if sz and (sk_type != k_type or sv_type != v_type):
+            for _ in range(sz):
+                skip(inbuf, sk_type)
+                skip(inbuf, sv_type)
+            return {}
+
+        result = {}
+        for _ in range(sz):
+            k_val = read_val(inbuf, k_type, k_spec, decode_response)
+            result[k_val] = read_val(inbuf, v_type, v_spec, decode_response)
+        return result
+
+    elif ttype == TType.STRUCT:
+        obj = spec()
+        read_struct(inbuf, obj, decode_response)
+        return obj
+
+
+def read_struct(inbuf, obj, decode_response=True):
+    field_map = obj.thrift_field_map
+    last_fid = 0
+    while True:
+        header = ord(inbuf.read(1))
+        ctype = header & 0x0f
+        if ctype == CompactType.STOP:
+            break
+
+        delta = header >> 4
+        if delta:
+            fid = last_fid + delta
+        else:
+            fid = from_zig_zag(read_varint(inbuf))
+        last_fid = fid
+        f_type = get_ttype(ctype)
+
+        f = field_map.get(fid)
+        if f is None or f_type != f.ttype:
+            if f_type != TType.BOOL:
+                skip(inbuf, f_type)
+            continue
+
+        if f_type == TType.BOOL:
+            setattr(obj, f.name, ctype == CompactType.TRUE)
+        else:
+            setattr(obj, f.name, read_val(inbuf, f_type, f.spec,
+                                          decode_response))
+
+
+def skip(inbuf, ttype):
+    if ttype in _TTYPE_BITS:
+        read_varint(inbuf)
+
+    elif ttype == TType.BOOL or ttype == TType.BYTE:
+        inbuf.read(1)
+
+    elif ttype == TType.DOUBLE:
+        inbuf.read(8)
+
+    elif ttype == TType.STRING:
+        inbuf.read(_check_size(read_varint(inbuf)))
+
+    elif ttype == TType.LIST or ttype == TType.SET:
+        e_type, sz = read_collection_begin(inbuf)
+        for _ in range(sz):
+            skip(inbuf, e_type)
+
+    elif ttype == TType.MAP:
+        k_type, v_type, sz = read_map_begin(inbuf)
+        for _ in range(sz):
+            skip(inbuf, k_type)
+            skip(inbuf, v_type)
+
+    elif ttype == TType.STRUCT:
+        while True:
+            header = ord(inbuf.read(1))
+            ctype = header & 0x0f
+            if ctype == CompactType.STOP:
+                break
+            if header >> 4 == 0:
+                read_varint(inbuf)
+            f_type = get_ttype(ctype)
+            if f_type != TType.BOOL:
+                skip(inbuf, f_type)
+
+
+# The decode_* functions read from a contiguous buffer (e.g. a whole frame)
+# at an integer position and return the position after the value, so
+# varints are decoded by indexing instead of one transport read per byte.
+# Running past the end of the buffer raises IndexError or struct.error.
+
+def decode_message_begin(buf, pos):
+    proto_id = buf[pos]
+    if proto_id != PROTOCOL_ID:
+        raise TProtocolException(TProtocolException.BAD_VERSION,
+                                 'Bad protocol id in the message: %d'
+                                 % proto_id)
+
+    ver_type = buf[pos + 1]
+    ttype = (ver_type >> TYPE_SHIFT_AMOUNT) & TYPE_BITS
+    version = ver_type & VERSION_MASK
+    if version != VERSION:
+        raise TProtocolException(TProtocolException.BAD_VERSION,
+                                 'Bad version: %d (expect %d)'
+                                 % (version, VERSION))
+    seqid, pos = decode_varint(buf, pos + 2)
+    name, pos = decode_val(buf, pos, TType.STRING)
+    return (name, ttype, seqid), pos
+
+
+def decode_int_list(buf, pos, sz):
+    result = []
+    append = result.append
+    for _ in range(sz):
+        byte = buf[pos]
+        pos += 1
+        if byte < 0x80:
+            n = byte
+        else:
+            n = byte & 0x7f
+            shift = 7
+            while True:
+                byte = buf[pos]
+                pos += 1
+                n |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        append((n >> 1) ^ -(n & 1))
+    return result, pos
+
+
+def decode_list(buf, pos, v_type, v_spec, decode_response=True):
+    size_type = buf[pos]
+    pos += 1
+    sz = size_type >> 4
+    if sz == 15:
+        sz, pos = decode_varint(buf, pos)
+    r_type = get_ttype(size_type)
+
+    if r_type != v_type:
+        for _ in range(sz):
+            pos = skip_buf(buf, pos, r_type)
+        return [], pos
+
+    if v_type in _TTYPE_BITS:
+        return decode_int_list(buf, pos, sz)
+    if v_type == TType.DOUBLE:
+        return (list(struct.unpack_from('<%dd' % sz, buf, pos)),
+                pos + 8 * sz)
+    if v_type == TType.BYTE:
+        return list(struct.unpack_from('%db' % sz, buf, pos)), pos + sz
+    if v_type == TType.BOOL:
+        end = pos + sz
+        return [b == CompactType.TRUE for b in buf[pos:end]], end
+
+    result = []
+    for _ in range(sz):
+        val, pos = decode_val(buf, pos, v_type, v_spec, decode_response)
+        result.append(val)
+    return result, pos
+
+
+def decode_map(buf, pos, k_type, k_spec, v_type, v_spec,
+               decode_response=True):
+    sz, pos = decode_varint(buf, pos)
+    if sz == 0:
+        return {}, pos
+    types = buf[pos]
+    pos += 1
+    sk_type, sv_type = get_ttype(types >> 4), get_ttype(types)
+
+    if sk_type != k_type or sv_type != v_type:
+        for _ in range(sz):
+            pos = skip_buf(buf, pos, sk_type)
+            pos = skip_buf(buf, pos, sv_type)
+        return {}, pos
+
+    result = {}
+    for _ in range(sz):
+        k_val, pos = decode_val(buf, pos, k_type, k_spec, decode_response)
+        result[k_val], pos = decode_val(buf, pos, v_type, v_spec,
+                                        decode_response)
+    return result, pos
+
+
+def decode_val(buf, pos, ttype, spec=None, decode_response=True):
+    if ttype in _TTYPE_BITS:
+        n, pos = decode_varint(buf, pos)
+        return (n >> 1) ^ -(n & 1), pos
+
+    elif ttype == TType.STRING:
+        sz, pos = decode_varint(buf, pos)
+        end = pos + sz
+        return _decode_string(bytes(buf[pos:end]), spec,
+                              decode_response), end
+
+    elif ttype == TType.BOOL:
+        return buf[pos] == CompactType.TRUE, pos + 1
+
+    elif ttype == TType.BYTE:
+        return _BYTE.unpack_from(buf, pos)[0], pos + 1
+
+    elif ttype == TType.DOUBLE:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+
+    elif ttype == TType.LIST or ttype == TType.SET:
+        v_type, v_spec = split_spec(spec)
+        return decode_list(buf, pos, v_type, v_spec, decode_response)
+
+    elif ttype == TType.MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        return decode_map(buf, pos, k_type, k_spec, v_type, v_spec,
+                          decode_response)
+
+    elif ttype == TType.STRUCT:
+        obj = spec()
+        pos = decode_struct(buf, pos, obj, decode_response)
+        return obj, pos
+
+    return None, pos
+
+
+def decode_struct(buf, pos, obj, decode_response=True):
+    field_map = obj.thrift_field_map
+    last_fid = 0
+    while True:
+        header = buf[pos]
+        pos += 1
+        ctype = header & 0x0f
+        if ctype == CompactType.STOP:
+            return pos
+
+        delta = header >> 4
+        if delta:
+            fid = last_fid + delta
+        else:
+            n, pos = decode_varint(buf, pos)
+            fid = (n >> 1) ^ -(n & 1)
+        last_fid = fid
+        f_type = get_ttype(ctype)
+
+        f = field_map.get(fid)
+        if f is None or f_type != f.ttype:
+            if f_type != TType.BOOL:
+                pos = skip_buf(buf, pos, f_type)
+            continue
+
+        if f_type == TType.BOOL:
+            setattr(obj, f.name, ctype == CompactType.TRUE)
+        else:
+            val, pos = decode_val(buf, pos, f_type, f.spec, decode_response)
+            setattr(obj, f.name, val)
+
+
+def skip_buf(buf, pos, ttype):
+    """Return the position after the value of type `ttype` at `pos`."""
+    if ttype in _TTYPE_BITS:
+        while buf[pos] >= 0x80:
+            pos += 1
+        return pos + 1
+
+    elif ttype == TType.BOOL or ttype == TType.BYTE:
+        return pos + 1
+
+    elif ttype == TType.DOUBLE:
+        return pos + 8
+
+    elif ttype == TType.STRING:
+        sz, pos = decode_varint(buf, pos)
+        return pos + sz
+
+    elif ttype == TType.LIST or ttype == TType.SET:
+        size_type = buf[pos]
+        pos += 1
+        sz = size_type >> 4
+        if sz == 15:
+            sz, pos = decode_varint(buf, pos)
+        e_type = get_ttype(size_type)
+        if e_type == TType.DOUBLE:
+            return pos + 8 * sz
+        if e_type == TType.BOOL or e_type == TType.BYTE:
+            return pos + sz
+        for _ in range(sz):
+            pos = skip_buf(buf, pos, e_type)
+
+    elif ttype == TType.MAP:
+        sz, pos = decode_varint(buf, pos)
+        if sz:
+            types = buf[pos]
+            pos += 1
+            k_type, v_type = get_ttype(types >> 4), get_ttype(types)
+            for _ in range(sz):
+                pos = skip_buf(buf, pos, k_type)
+                pos = skip_buf(buf, pos, v_type)
+
+    elif ttype == TType.STRUCT:
+        while True:
+            header = buf[pos]
+            pos += 1
+            ctype = header & 0x0f
+            if ctype == CompactType.STOP:
+                return pos
+            if header >> 4 == 0:
+                while buf[pos] >= 0x80:
+                    pos += 1
+                pos += 1
+            f_type = get_ttype(ctype)
+            if f_type != TType.BOOL:
+                pos = skip_buf(buf, pos, f_type)
+
+    return pos
+
+
 class TCompactProtocol(object):
-    """Compact implementation of the Thrift protocol driver."""
-    PROTOCOL_ID = 0x82
-    VERSION = 1
-    VERSION_MASK = 0x1f
+    """Compact implementation of the Thrift protocol driver.
+
+    Like `TBinaryProtocol`, a message is encoded into one bytearray between
+    `write_message_begin` and `write_message_end`, and structs are decoded
+    in place when the transport exposes its buffered input through
+    `get_read_buffer` and `set_read_pos`. The field level methods are
+    kept for callers driving the protocol by hand.
+    """
+    PROTOCOL_ID = PROTOCOL_ID
+    VERSION = VERSION
+    VERSION_MASK = VERSION_MASK
     TYPE_MASK = 0xe0
-    TYPE_BITS = 0x07
-    TYPE_SHIFT_AMOUNT = 5
+    TYPE_BITS = TYPE_BITS
+    TYPE_SHIFT_AMOUNT = TYPE_SHIFT_AMOUNT
 
     def __init__(self, trans, decode_response=True):
         self.trans = trans
@@ -128,34 +701,51 @@ class TCompactProtocol(object):
         self._bool_fid = None
         self._bool_value = None
         self._structs = []
+        self._wbuf = None
         self.decode_response = decode_response
 
     def _get_ttype(self, byte):
-        return TTYPES[byte & 0x0f]
+        return get_ttype(byte)
 
     def _read_size(self):
-        result = read_varint(self.trans)
-        if result < 0:
-            raise TException("Length < 0")
-        return result
+        return _check_size(read_varint(self.trans))
+
+    def _read_buffer(self):
+        get_read_buffer = getattr(self.trans, 'get_read_buffer', None)
+        if get_read_buffer is None:
+            return None
+        rbuf = get_read_buffer()
+        if rbuf is not None and not PY3:
+            # py2 str indexes to characters
+            buf, pos = rbuf
+            return bytearray(buf), pos
+        return rbuf
+
+    def _set_read_pos(self, buf, end):
+        if end is None or end > len(buf):
+            raise TProtocolException(
+                type=TProtocolException.INVALID_DATA,
+                message='Value exceeds the buffered input')
+        self.trans.set_read_pos(end)
+
+    def _write(self, data):
+        if self._wbuf is not None:
+            self._wbuf += data
+        else:
+            self.trans.write(data)
 
     def read_message_begin(self):
-        proto_id = self.read_ubyte()
-        if proto_id != self.PROTOCOL_ID:
-            raise TProtocolException(TProtocolException.BAD_VERSION,
-                                     'Bad protocol id in the message: %d'
-                                     % proto_id)
-
-        ver_type = self.read_ubyte()
-        type = (ver_type >> self.TYPE_SHIFT_AMOUNT) & self.TYPE_BITS
-        version = ver_type & self.VERSION_MASK
-        if version != self.VERSION:
-            raise TProtocolException(TProtocolException.BAD_VERSION,
-                                     'Bad version: %d (expect %d)'
-                                     % (version, self.VERSION))
-        seqid = read_varint(self.trans)
-        name = self.read_string()
-        return name, type, seqid
+        rbuf = self._read_buffer()
+        if rbuf is None:
+            return read_message_begin(self.trans)
+
+        buf, pos = rbuf
+        try:
+            result, end = decode_message_begin(buf, pos)
+        except (IndexError, struct.error):
+            end = None
+        self._set_read_pos(buf, end)
+        return result
 
     def read_message_end(self):
         assert len(self._structs) == 0
@@ -191,51 +781,28 @@ class TCompactProtocol(object):
         self._last_fid = self._structs.pop()
 
     def read_map_begin(self):
-        size = self._read_size()
-        types = 0
-        if size > 0:
-            types = self.read_ubyte()
-        vtype = self._get_ttype(types)
-        ktype = self._get_ttype(types >> 4)
-        return (ktype, vtype, size)
+        return read_map_begin(self.trans)
 
     def read_collection_begin(self):
-        size_type = self.read_ubyte()
-        size = size_type >> 4
-        type = self._get_ttype(size_type)
-        if size == 15:
-            size = self._read_size()
-        return type, size
+        return read_collection_begin(self.trans)
 
     def read_collection_end(self):
         pass
 
     def read_byte(self):
-        result, = unpack('!b', self.trans.read(1))
-        return result
+        return read_val(self.trans, TType.BYTE)
 
     def read_ubyte(self):
-        result, = unpack('!B', self.trans.read(1))
-        return result
+        return ord(self.trans.read(1))
 
     def read_int(self):
         return from_zig_zag(read_varint(self.trans))
 
     def read_double(self):
-        buff = self.trans.read(8)
-        val, = unpack('<d', buff)
-        return val
-
-    def read_string(self):
-        len = self._read_size()
-        byte_payload = self.trans.read(len)
+        return read_val(self.trans, TType.DOUBLE)
 
-        if self.decode_response:
-            try:
-                byte_payload = byte_payload.decode('utf-8')
-            except UnicodeDecodeError:
-                pass
-        return byte_payload
+    def read_string(self, spec=None):
+        return read_val(self.trans, TType.STRING, spec, self.decode_response)
 
     def read_bool(self):
         if self._bool_value is not None:
@@ -245,116 +812,41 @@ class TCompactProtocol(object):
         return self.read_byte() == CompactType.TRUE
 
     def read_struct(self, obj):
-        self.read_struct_begin()
-        while True:
-            fname, ftype, fid = self.read_field_begin()
-            if ftype == TType.STOP:
-                break
+        rbuf = self._read_buffer()
+        if rbuf is None:
+            return read_struct(self.trans, obj, self.decode_response)
 
-            if fid not in obj.thrift_spec:
-                self.skip(ftype)
-                continue
-
-            try:
-                field = obj.thrift_spec[fid]
-            except IndexError:
-                self.skip(ftype)
-                raise
-            else:
-                if field is not None and ftype == field[0]:
-                    fname = field[1]
-                    fspec = field[2]
-                    val = self.read_val(ftype, fspec)
-                    setattr(obj, fname, val)
-                else:
-                    self.skip(ftype)
-            self.read_field_end()
-        self.read_struct_end()
+        buf, pos = rbuf
+        try:
+            end = decode_struct(buf, pos, obj, self.decode_response)
+        except (IndexError, struct.error):
+            end = None
+        self._set_read_pos(buf, end)
 
     def read_val(self, ttype, spec=None):
         if ttype == TType.BOOL:
             return self.read_bool()
-
-        elif ttype == TType.BYTE:
-            return self.read_byte()
-
-        elif ttype in (TType.I16, TType.I32, TType.I64):
-            return self.read_int()
-
-        elif ttype == TType.DOUBLE:
-            return self.read_double()
-
-        elif ttype == TType.STRING:
-            return self.read_string()
-
-        elif ttype in (TType.LIST, TType.SET):
-            if isinstance(spec, tuple):
-                v_type, v_spec = spec[0], spec[1]
-            else:
-                v_type, v_spec = spec, None
-            result = []
-            r_type, sz = self.read_collection_begin()
-
-            for i in range(sz):
-                result.append(self.read_val(v_type, v_spec))
-
-            self.read_collection_end()
-            return result
-
-        elif ttype == TType.MAP:
-            if isinstance(spec[0], int):
-                k_type = spec[0]
-                k_spec = None
-            else:
-                k_type, k_spec = spec[0]
-
-            if isinstance(spec[1], int):
-                v_type = spec[1]
-                v_spec = None
-            else:
-                v_type, v_spec = spec[1]
-
-            result = {}
-            sk_type, sv_type, sz = self.read_map_begin()
-            if sk_type != k_type or sv_type != v_type:
-                for _ in range(sz):
-                    self.skip(sk_type)
-                    self.skip(sv_type)
-                self.read_collection_end()
-                return {}
-
-            for i in range(sz):
-                k_val = self.read_val(k_type, k_spec)
-                v_val = self.read_val(v_type, v_spec)
-                result[k_val] = v_val
-            self.read_collection_end()
-            return result
-
-        elif ttype == TType.STRUCT:
-            obj = spec()
-            self.read_struct(obj)
-            return obj
+        return read_val(self.trans, ttype, spec, self.decode_response)
 
     def _write_size(self, i32):
-        write_varint(self.trans, i32)
+        buf = bytearray()
+        encode_varint(buf, i32)
+        self._write(buf)
 
     def _write_field_header(self, type, fid):
-        delta = fid - self._last_fid
-        if 0 < delta <= 15:
-            self.write_ubyte(delta << 4 | type)
-        else:
-            self.write_byte(type)
-            self.write_i16(fid)
+        buf = bytearray()
+        encode_field_header(buf, type, fid, self._last_fid)
+        self._write(buf)
         self._last_fid = fid
 
     def write_message_begin(self, name, type, seqid):
-        self.write_ubyte(self.PROTOCOL_ID)
-        self.write_ubyte(self.VERSION | (type << self.TYPE_SHIFT_AMOUNT))
-        write_varint(self.trans, seqid)
-        self.write_string(name)
+        self._wbuf = bytearray()
+        encode_message_begin(self._wbuf, name, type, seqid)
 
     def write_message_end(self):
-        pass
+        if self._wbuf is not None:
+            buf, self._wbuf = self._wbuf, None
+            self.trans.write(buf)
 
     def write_field_stop(self):
         self.write_byte(0)
@@ -376,11 +868,9 @@ class TCompactProtocol(object):
         self._last_fid = self._structs.pop()
 
     def write_collection_begin(self, etype, size):
-        if size <= 14:
-            self.write_ubyte(size << 4 | CTYPES[etype])
-        else:
-            self.write_ubyte(0xf0 | CTYPES[etype])
-            self._write_size(size)
+        buf = bytearray()
+        encode_collection_begin(buf, etype, size)
+        self._write(buf)
 
     def write_map_begin(self, ktype, vtype, size):
         if size == 0:
@@ -393,169 +883,64 @@ class TCompactProtocol(object):
         pass
 
     def write_ubyte(self, byte):
-        self.trans.write(pack('!B', byte))
+        self._write(bytearray((byte,)))
 
     def write_byte(self, byte):
-        self.trans.write(pack('!b', byte))
+        self._write(_BYTE.pack(byte))
 
     def write_bool(self, bool):
-        if self._bool_fid and self._bool_fid > self._last_fid \
-                and self._bool_fid - self._last_fid <= 15:
-            if bool:
-                ctype = CompactType.TRUE
-            else:
-                ctype = CompactType.FALSE
+        ctype = CompactType.TRUE if bool else CompactType.FALSE
+        if self._bool_fid is not None:
             self._write_field_header(ctype, self._bool_fid)
+            self._bool_fid = None
         else:
-            if bool:
-                self.write_byte(CompactType.TRUE)
-            else:
-                self.write_byte(CompactType.FALSE)
+            self.write_ubyte(ctype)
 
     def write_i16(self, i16):
-        write_varint(self.trans, make_zig_zag(i16, 16))
+        self.write_val(TType.I16, i16)
 
     def write_i32(self, i32):
-        write_varint(self.trans, make_zig_zag(i32, 32))
+        self.write_val(TType.I32, i32)
 
     def write_i64(self, i64):
-        write_varint(self.trans, make_zig_zag(i64, 64))
+        self.write_val(TType.I64, i64)
 
     def write_double(self, dub):
-        self.trans.write(pack('<d', dub))
+        self._write(_DOUBLE.pack(dub))
 
     def write_string(self, s):
-        if not isinstance(s, bytes):
-            s = s.encode('utf-8')
-        self._write_size(len(s))
-        self.trans.write(s)
+        self.write_val(TType.STRING, s)
 
     def write_struct(self, obj):
-        self.write_struct_begin()
-
-        for field in obj.thrift_spec:
-            if field is None:
-                continue
-            fspec = obj.thrift_spec[field]
-            if len(fspec) == 3:
-                ftype, fname, freq = fspec
-                f_container_spec = None
-            else:
-                ftype, fname, f_container_spec, f_req = fspec
-            val = getattr(obj, fname)
-            if val is None:
-                continue
-
-            self.write_field_begin(fname, ftype, field)
-            self.write_val(ftype, val, f_container_spec)
-            self.write_field_end()
-        self.write_field_stop()
-        self.write_struct_end()
+        buf = self._wbuf if self._wbuf is not None else bytearray()
+        encode_struct(buf, obj)
+        if buf is not self._wbuf:
+            self.trans.write(buf)
 
     def write_val(self, ttype, val, spec=None):
-
         if ttype == TType.BOOL:
             self.write_bool(val)
+            return
 
-        elif ttype == TType.BYTE:
-            self.write_byte(val)
-
-        elif ttype == TType.I16:
-            self.write_i16(val)
-
-        elif ttype == TType.I32:
-            self.write_i32(val)
-
-        elif ttype == TType.I64:
-            self.write_i64(val)
-
-        elif ttype == TType.DOUBLE:
-            self.write_double(val)
-
-        elif ttype == TType.STRING:
-            self.write_string(val)
-
-        elif ttype == TType.LIST or ttype == TType.SET:
-            if isinstance(spec, tuple):
-                e_type, t_spec = spec[0], spec[1]
-            else:
-                e_type, t_spec = spec, None
-
-            val_len = len(val)
-            self.write_collection_begin(e_type, val_len)
-            for e_val in val:
-                self.write_val(e_type, e_val, t_spec)
-            self.write_collection_end()
-
-        elif ttype == TType.MAP:
-            if isinstance(spec[0], int):
-                k_type = spec[0]
-                k_spec = None
-            else:
-                k_type, k_spec = spec[0]
-
-            if isinstance(spec[1], int):
-                v_type = spec[1]
-                v_spec = None
-            else:
-                v_type, v_spec = spec[1]
-
-            self.write_map_begin(k_type, v_type, len(val))
-            for k in iter(val):
-                self.write_val(k_type, k, k_spec)
-                self.write_val(v_type, val[k], v_spec)
-            self.write_collection_end()
-
-        elif ttype == TType.STRUCT:
-            self.write_struct(val)
+        buf = bytearray()
+        encode_val(buf, ttype, val, spec)
+        self._write(buf)
 
     def skip(self, ttype):
-        if ttype == TType.STOP:
+        if ttype == TType.BOOL and self._bool_value is not None:
+            self._bool_value = None
             return
 
-        elif ttype == TType.BOOL:
-            self.read_bool()
+        rbuf = self._read_buffer()
+        if rbuf is None:
+            return skip(self.trans, ttype)
 
-        elif ttype == TType.BYTE:
-            self.read_byte()
-
-        elif ttype in (TType.I16, TType.I32, TType.I64):
-            from_zig_zag(read_varint(self.trans))
-
-        elif ttype == TType.DOUBLE:
-            self.read_double()
-
-        elif ttype == TType.STRING:
-            self.read_string()
-
-        elif ttype == TType.STRUCT:
-            name = self.read_struct_begin()
-            while True:
-                (name, ttype, id) = self.read_field_begin()
-                if ttype == TType.STOP:
-                    break
-                self.skip(ttype)
-                self.read_field_end()
-            self.read_struct_end()
-
-        elif ttype == TType.MAP:
-            ktype, vtype, size = self.read_map_begin()
-            for i in range(size):
-                self.skip(ktype)
-                self.skip(vtype)
-            self.read_collection_end()
-
-        elif ttype == TType.SET:
-            etype, size = self.read_collection_begin()
-            for i in range(size):
-                self.skip(etype)
-            self.read_collection_end()
-
-        elif ttype == TType.LIST:
-            etype, size = self.read_collection_begin()
-            for i in range(size):
-                self.skip(etype)
-            self.read_collection_end()
+        buf, pos = rbuf
+        try:
+            end = skip_buf(buf, pos, ttype)
+        except (IndexError, struct.error):
+            end = None
+        self._set_read_pos(buf, end)
 
 
 class TCompactProtocolFactory(object):
@@ -2,10 +2,11 @@
 
 from __future__ import absolute_import
 
+import base64
 import json
 import struct
 
-from http2thrift.thriftpy.thrift import TType
+from http2thrift.thriftpy.thrift import BINARY, TType, split_spec
 
 from .exc import TProtocolException
 
@@ -16,6 +17,10 @@ VERSION = 1
 
 
 def json_value(ttype, val, spec=None):
+    if ttype == TType.STRING and spec == BINARY:
+        # bytes are not json serializable
+        return base64.b64encode(val).decode('ascii')
+
     if ttype in INTEGER or ttype in FLOAT or ttype == TType.STRING:
         return val
 
@@ -39,6 +44,9 @@ def obj_value(ttype, val, spec=None):
     if ttype in FLOAT:
         return float(val)
 
+    if ttype == TType.STRING and spec == BINARY:
+        return base64.b64decode(val)
+
     if ttype in (TType.STRING, TType.BOOL):
         return val
 
@@ -54,15 +62,8 @@ def obj_value(ttype, val, spec=None):
 
 def map_to_obj(val, spec):
     res = {}
-    if isinstance(spec[0], int):
-        key_type, key_spec = spec[0], None
-    else:
-        key_type, key_spec = spec[0]
-
-    if isinstance(spec[1], int):
-        value_type, value_spec = spec[1], None
-    else:
-        value_type, value_spec = spec[1]
+    key_type, key_spec = split_spec(spec[0])
+    value_type, value_spec = split_spec(spec[1])
 
     for v in val:
         res[obj_value(key_type, v["key"], key_spec)] = obj_value(
@@ -73,17 +74,8 @@ def map_to_obj(val, spec):
 
 def map_to_json(val, spec):
     res = []
-    if isinstance(spec[0], int):
-        key_type = spec[0]
-        key_spec = None
-    else:
-        key_type, key_spec = spec[0]
-
-    if isinstance(spec[1], int):
-        value_type = spec[1]
-        value_spec = None
-    else:
-        value_type, value_spec = spec[1]
+    key_type, key_spec = split_spec(spec[0])
+    value_type, value_spec = split_spec(spec[1])
 
     for k, v in val.items():
         res.append({"key": json_value(key_type, k, key_spec),
@@ -93,54 +85,33 @@ def map_to_json(val, spec):
 
 
 def list_to_obj(val, spec):
-    if isinstance(spec, tuple):
-        elem_type, type_spec = spec
-    else:
-        elem_type, type_spec = spec, None
+    elem_type, type_spec = split_spec(spec)
 
     return [obj_value(elem_type, i, type_spec) for i in val]
 
 
 def list_to_json(val, spec):
-    if isinstance(spec, tuple):
-        elem_type, type_spec = spec
-    else:
-        elem_type, type_spec = spec, None
+    elem_type, type_spec = split_spec(spec)
 
     return [json_value(elem_type, i, type_spec) for i in val]
 
 
 def struct_to_json(val):
     outobj = {}
-    for fid, field_spec in val.thrift_spec.items():
-        field_type, field_name = field_spec[:2]
-
-        if len(field_spec) <= 3:
-            field_type_spec = None
-        else:
-            field_type_spec = field_spec[2]
-
-        v = getattr(val, field_name)
+    for f in val.thrift_fields:
+        v = getattr(val, f.name)
         if v is None:
             continue
 
-        outobj[field_name] = json_value(field_type, v, field_type_spec)
+        outobj[f.name] = json_value(f.ttype, v, f.spec)
 
     return outobj
 
 
 def struct_to_obj(val, obj):
-    for fid, field_spec in obj.thrift_spec.items():
-        field_type, field_name = field_spec[:2]
-
-        if len(field_spec) <= 3:
-            field_type_spec = None
-        else:
-            field_type_spec = field_spec[2]
-
-        if field_name in val:
-            setattr(obj, field_name,
-                    obj_value(field_type, val[field_name], field_type_spec))
+    for f in obj.thrift_fields:
+        if f.name in val:
+            setattr(obj, f.name, obj_value(f.ttype, val[f.name], f.spec))
 
     return obj
 
@@ -150,6 +121,7 @@ class TJSONProtocol(object):
 
     The message in the transport are encoded as this: 4 bytes represents
     the length of the json object and immediately followed by the json object.
+    Binary values are base64 strings.
 
         '\x00\x00\x00+' '{"payload": {}, "metadata": {"version": 1}}'
 
@@ -199,6 +171,10 @@ class TJSONProtocol(object):
         self._data = None
         return res
 
+    def skip(self, ttype):
+        # the whole message was read by read_message_begin
+        self._data = None
+
     def write_struct(self, obj):
         data = json.dumps({
             "metadata": self._meta,
@@ -11,9 +11,7 @@ from http2thrift.thriftpy.thrift import TProcessor, TClient
 from http2thrift.thriftpy.transport import (
     TBufferedTransportFactory,
     TServerSocket,
-    TSSLServerSocket,
     TSocket,
-    TSSLSocket,
 )
 
 
@@ -23,11 +21,12 @@ def make_client(service, host="localhost", port=9090, unix_socket=None,
                 timeout=None,
                 cafile=None, ssl_context=None, certfile=None, keyfile=None):
     if unix_socket:
-        socket = TSocket(unix_socket=unix_socket)
+        socket = TSocket(unix_socket=unix_socket, socket_timeout=timeout)
         if certfile:
             warnings.warn("SSL only works with host:port, not unix_socket.")
     elif host and port:
         if cafile or ssl_context:
+            from http2thrift.thriftpy.transport import TSSLSocket
             socket = TSSLSocket(host, port, socket_timeout=timeout,
                                 cafile=cafile,
                                 certfile=certfile, keyfile=keyfile,
@@ -56,6 +55,7 @@ def make_server(service, handler,
             warnings.warn("SSL only works with host:port, not unix_socket.")
     elif host and port:
         if certfile:
+            from http2thrift.thriftpy.transport import TSSLServerSocket
             server_socket = TSSLServerSocket(
                 host=host, port=port, client_timeout=client_timeout,
                 certfile=certfile)
@@ -90,6 +90,7 @@ def client_context(service, host="localhost", port=9090, unix_socket=None,
             warnings.warn("SSL only works with host:port, not unix_socket.")
     elif host and port:
         if cafile or ssl_context:
+            from http2thrift.thriftpy.transport import TSSLSocket
             socket = TSSLSocket(host, port,
                                 connect_timeout=connect_timeout,
                                 socket_timeout=socket_timeout,
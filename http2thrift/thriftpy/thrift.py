@@ -9,9 +9,11 @@
 
 from __future__ import absolute_import
 
+import collections
 import functools
 import linecache
 import types
+import weakref
 
 from ._compat import with_metaclass
 
@@ -40,6 +42,63 @@ def parse_spec(ttype, spec=None):
         return "MAP<%s, %s>" % (_type(spec[0]), _type(spec[1]))
 
 
+TField = collections.namedtuple('TField', [
+    'fid', 'ttype', 'name', 'spec', 'required',
+    'k_type', 'k_spec', 'v_type', 'v_spec',
+])
+
+
+# Spec of STRING values declared `binary` in the IDL, e.g. the field spec
+# `(TType.STRING, 'data', BINARY, False)` or the element spec
+# `(TType.STRING, BINARY)`. Binary values are never decoded as UTF-8.
+BINARY = 'binary'
+
+
+def split_spec(spec):
+    """Split a container element spec into `(ttype, spec)`."""
+    if isinstance(spec, tuple):
+        return spec
+    return spec, None
+
+
+def gen_fields(thrift_spec):
+    """Generate the field descriptor table of a `thrift_spec`.
+
+    The table is a tuple of `TField` ordered by field id. Element specs of
+    list/set fields are pre-split into `v_type`/`v_spec`, and key/value
+    specs of map fields into `k_type`/`k_spec`/`v_type`/`v_spec`, so
+    encoders and decoders don't have to re-derive them for every value.
+    """
+    fields = []
+    for fid in sorted(thrift_spec):
+        f_spec = thrift_spec[fid]
+        ttype, name = f_spec[0], f_spec[1]
+        if len(f_spec) == 4:
+            spec, required = f_spec[2], f_spec[3]
+        elif len(f_spec) == 3:
+            spec, required = None, f_spec[2]
+        else:
+            spec, required = None, False
+
+        k_type = k_spec = v_type = v_spec = None
+        if ttype in (TType.LIST, TType.SET):
+            v_type, v_spec = split_spec(spec)
+        elif ttype == TType.MAP:
+            k_type, k_spec = split_spec(spec[0])
+            v_type, v_spec = split_spec(spec[1])
+
+        fields.append(TField(fid, ttype, name, spec, required,
+                             k_type, k_spec, v_type, v_spec))
+    return tuple(fields)
+
+
+def _set_thrift_fields(cls):
+    cls.thrift_fields = gen_fields(cls.thrift_spec)
+    cls.thrift_field_map = dict((f.fid, f) for f in cls.thrift_fields)
+    # codecs generated from the field table by protocols, e.g. binary_codec
+    cls.thrift_codecs = {}
+
+
 def init_func_generator(cls, spec):
     """Generate `__init__` function based on TPayload.default_spec
 
@@ -87,7 +146,7 @@ class TType(object):
     I64 = 10
     STRING = 11
     UTF7 = 11
-    BINARY = 11  # This here just for parsing. For all purposes, it's a string
+    BINARY = 11  # a string on the wire, binary specs carry the `BINARY` marker
     STRUCT = 12
     MAP = 13
     SET = 14
@@ -130,12 +189,21 @@ class TPayloadMeta(type):
         if "default_spec" in attrs:
             spec = attrs.pop("default_spec")
             attrs["__init__"] = init_func_generator(cls, spec)
-        return super(TPayloadMeta, cls).__new__(cls, name, bases, attrs)
+        new_cls = super(TPayloadMeta, cls).__new__(cls, name, bases, attrs)
+        if "thrift_spec" in attrs:
+            _set_thrift_fields(new_cls)
+        return new_cls
 
 
 def gen_init(cls, thrift_spec=None, default_spec=None):
+    """Generate `__init__` and the field descriptor table of `cls`.
+
+    Must be called again whenever `cls.thrift_spec` is changed in place.
+    """
     if thrift_spec is not None:
         cls.thrift_spec = thrift_spec
+    if getattr(cls, "thrift_spec", None) is not None:
+        _set_thrift_fields(cls)
 
     if default_spec is not None:
         cls.__init__ = init_func_generator(cls, default_spec)
@@ -167,6 +235,59 @@ class TPayload(with_metaclass(TPayloadMeta, object)):
         return not self.__eq__(other)
 
 
+def client_method_generator(service, api):
+    """Generate the `TClient` method calling `api` of `service`.
+
+    For example, for ``i32 add(1: i32 a, 2: i32 b)`` it generates::
+
+        def add(self, a=None, b=None):
+            self._send_args('add', add_args(a=a, b=b))
+            return self._recv('add')
+
+    with the defaults of `add_args`. Positional arguments are in field id
+    order, as with `TClient._req`.
+    """
+    args_cls = getattr(service, api + "_args")
+    result_cls = getattr(service, api + "_result")
+
+    init = args_cls.__init__
+    init = getattr(init, '__func__', init)
+    code = init.__code__
+    init_defaults = dict(zip(code.co_varnames[1:code.co_argcount][::-1],
+                             (init.__defaults__ or ())[::-1]))
+    varnames = [f.name for f in args_cls.thrift_fields]
+    defaults = tuple(init_defaults.get(name) for name in varnames)
+
+    params = ''.join(', {0}={1!r}'.format(name, default)
+                     for name, default in zip(varnames, defaults))
+    kwargs = ', '.join('{0}={0}'.format(name) for name in varnames)
+    src = "def {0}(self{1}):\n".format(api, params)
+    src += "    self._send_args({0!r}, _args({1}))\n".format(api, kwargs)
+    if not result_cls.oneway:
+        src += "    return self._recv({0!r})\n".format(api)
+
+    name = '<generated {}.{}>'.format(service.__name__, api)
+    code = compile(src, name, 'exec')
+    func = next(c for c in code.co_consts if isinstance(c, types.CodeType))
+    linecache.cache[name] = (len(src), None, src.splitlines(True), name)
+
+    return types.FunctionType(func, {'_args': args_cls}, str(api),
+                              defaults or None)
+
+
+# service -> {api: generated method}
+_client_methods = weakref.WeakKeyDictionary()
+
+
+def _get_client_methods(service):
+    methods = _client_methods.get(service)
+    if methods is None:
+        methods = dict((api, client_method_generator(service, api))
+                       for api in service.thrift_services)
+        _client_methods[service] = methods
+    return methods
+
+
 class TClient(object):
 
     def __init__(self, service, iprot, oprot=None):
@@ -178,7 +299,15 @@ class TClient(object):
 
     def __getattr__(self, _api):
         if _api in self._service.thrift_services:
-            return functools.partial(self._req, _api)
+            cls = type(self)
+            if cls._req != TClient._req or cls._send != TClient._send:
+                # subclasses hooking into calls get the generic path
+                return functools.partial(self._req, _api)
+            # bound once per client, later lookups don't get here
+            method = types.MethodType(
+                _get_client_methods(self._service)[_api], self)
+            self.__dict__[_api] = method
+            return method
 
         raise AttributeError("{} instance has no attribute '{}'".format(
             self.__class__.__name__, _api))
@@ -187,8 +316,8 @@ class TClient(object):
         return self._service.thrift_services
 
     def _req(self, _api, *args, **kwargs):
-        _kw = args2kwargs(getattr(self._service, _api + "_args").thrift_spec,
-                          *args)
+        args_fields = getattr(self._service, _api + "_args").thrift_fields
+        _kw = dict(zip((f.name for f in args_fields), args))
         kwargs.update(_kw)
         result_cls = getattr(self._service, _api + "_result")
 
@@ -198,15 +327,18 @@ class TClient(object):
             return self._recv(_api)
 
     def _send(self, _api, **kwargs):
-        self._oprot.write_message_begin(_api, TMessageType.CALL, self._seqid)
         args = getattr(self._service, _api + "_args")()
         for k, v in kwargs.items():
             setattr(args, k, v)
+        self._send_args(_api, args)
+
+    def _send_args(self, _api, args):
+        self._oprot.write_message_begin(_api, TMessageType.CALL, self._seqid)
         args.write(self._oprot)
         self._oprot.write_message_end()
         self._oprot.trans.flush()
 
-    def _recv(self, _api):
+    def _recv(self, _api, fields=None):
         fname, mtype, rseqid = self._iprot.read_message_begin()
         if mtype == TMessageType.EXCEPTION:
             x = TApplicationException()
@@ -214,14 +346,18 @@ class TClient(object):
             self._iprot.read_message_end()
             raise x
         result = getattr(self._service, _api + "_result")()
-        result.read(self._iprot)
+        if fields is None:
+            result.read(self._iprot)
+        else:
+            # projected read, only supported by the binary protocol
+            self._iprot.read_struct(result, fields)
         self._iprot.read_message_end()
 
         if hasattr(result, "success") and result.success is not None:
             return result.success
 
         # void api without throws
-        if len(result.thrift_spec) == 0:
+        if not result.thrift_fields:
             return
 
         # check throws
@@ -259,7 +395,7 @@ class TProcessor(object):
         result = getattr(self._service, api + "_result")()
 
         # convert kwargs to args
-        api_args = [args.thrift_spec[k][1] for k in sorted(args.thrift_spec)]
+        api_args = [f.name for f in args.thrift_fields]
 
         def call():
             f = getattr(self._handler, api)
@@ -280,13 +416,12 @@ class TProcessor(object):
         oprot.trans.flush()
 
     def handle_exception(self, e, result):
-        for k in sorted(result.thrift_spec):
-            if result.thrift_spec[k][1] == "success":
+        for f in result.thrift_fields:
+            if f.name == "success":
                 continue
 
-            _, exc_name, exc_cls, _ = result.thrift_spec[k]
-            if isinstance(e, exc_cls):
-                setattr(result, exc_name, e)
+            if isinstance(e, f.spec):
+                setattr(result, f.name, e)
                 break
         else:
             raise
@@ -343,7 +478,7 @@ class TMultiplexedProcessor(TProcessor):
         result = getattr(proc._service, api + "_result")()
 
         # convert kwargs to args
-        api_args = [args.thrift_spec[k][1] for k in sorted(args.thrift_spec)]
+        api_args = [f.name for f in args.thrift_fields]
 
         def call():
             f = getattr(proc._handler, api)
@@ -2,22 +2,55 @@
 
 from __future__ import absolute_import
 
+from .._compat import lazy_import
 from ..thrift import TType, TException
 
 
 def readall(read_fn, sz):
-    buff = b''
+    chunks = []
     have = 0
     while have < sz:
         chunk = read_fn(sz - have)
         have += len(chunk)
-        buff += chunk
+        chunks.append(chunk)
 
         if len(chunk) == 0:
             raise TTransportException(TTransportException.END_OF_FILE,
                                       "End of file reading from transport")
 
-    return buff
+    return b''.join(chunks)
+
+
+def readall_into(readinto_fn, view):
+    """Fill the memoryview `view` by calling `readinto_fn` on what is left
+    of it.
+    """
+    have = 0
+    sz = len(view)
+    while have < sz:
+        n = readinto_fn(view[have:])
+        if not n:
+            raise TTransportException(TTransportException.END_OF_FILE,
+                                      "End of file reading from transport")
+        have += n
+    return view
+
+
+def writev(trans, buffers):
+    """Write the list of `buffers` to `trans` as one write.
+
+    Transports with a `writev` method take the list as is, e.g. TSocket
+    sends it with one `sendmsg` call. Others get the buffers joined.
+    """
+    fn = getattr(trans, 'writev', None)
+    if fn is not None:
+        return fn(buffers)
+    if len(buffers) == 1:
+        return trans.write(buffers[0])
+    out = bytearray()
+    for buf in buffers:
+        out += buf
+    return trans.write(out)
 
 
 class TTransportBase(object):
@@ -52,12 +85,20 @@ class TTransportException(TException):
 
 # Avoid recursive import
 from .socket import TSocket, TServerSocket  # noqa
-from .sslsocket import TSSLSocket, TSSLServerSocket  # noqa
-from ._ssl import create_thriftpy_context  # noqa
 from .buffered import TBufferedTransport, TBufferedTransportFactory  # noqa
 from .framed import TFramedTransport, TFramedTransportFactory  # noqa
+from .compressed import (  # noqa
+    TCompressedFramedTransport, TCompressedFramedTransportFactory,
+    TCompressedFramedServerTransportFactory)
 from .memory import TMemoryBuffer  # noqa
 
+# ssl is expensive to import and rarely used
+__getattr__ = lazy_import(globals(), {
+    "TSSLSocket": ".sslsocket",
+    "TSSLServerSocket": ".sslsocket",
+    "create_thriftpy_context": "._ssl",
+})
+
 # if CYTHON:
 #     from .buffered import TCyBufferedTransport, TCyBufferedTransportFactory
 #     from .framed import TCyFramedTransport, TCyFramedTransportFactory
@@ -83,6 +124,8 @@ __all__ = [
     "TTransportBase", "TTransportException",
     "TMemoryBuffer", "TFramedTransport", "TFramedTransportFactory",
     "TBufferedTransport", "TBufferedTransportFactory",
+    "TCompressedFramedTransport", "TCompressedFramedTransportFactory",
+    "TCompressedFramedServerTransportFactory",
     # "TCyMemoryBuffer",
     # "TCyBufferedTransport", "TCyBufferedTransportFactory",
     # "TCyFramedTransport", "TCyFramedTransportFactory"
@@ -2,26 +2,40 @@
 
 from __future__ import absolute_import
 
-from io import BytesIO
-
 # from thriftpy._compat import CYTHON
-from .. import TTransportBase
+from ..._compat import PY3
+from .. import TTransportBase, TTransportException
 
 
 class TBufferedTransport(TTransportBase):
     """Class that wraps another transport and buffers its I/O.
 
-    The implementation uses a (configurable) fixed-size read buffer
-    but buffers all writes until a flush is performed.
+    Reads go through a compacting buffer: unread bytes are moved to the
+    front before it is refilled, and each refill asks the wrapped transport
+    for as much as fits. The buffer starts at `buf_size` bytes and follows
+    the average size of recent messages (what was read between two
+    flushes), so a typical message arrives with one read. Writes are
+    buffered until a flush is performed. Both buffers are reused across
+    messages, those grown beyond `MAX_KEPT_BUFFER` are released afterwards.
     """
     DEFAULT_BUFFER = 4096
+    MAX_READ_AHEAD = 1 << 20
+    MAX_KEPT_BUFFER = 4 << 20
 
     def __init__(self, trans, buf_size=DEFAULT_BUFFER):
         self._trans = trans
-        self._wbuf = BytesIO()
-        self._rbuf = BytesIO(b"")
         self._buf_size = buf_size
 
+        self._rbuf = bytearray(buf_size)
+        self._rview = memoryview(self._rbuf)
+        self._rpos = 0
+        self._rend = 0
+        self._read_ahead = buf_size
+        self._consumed = 0      # bytes read since the last flush
+
+        self._wbuf = bytearray(buf_size)
+        self._wlen = 0
+
     def is_open(self):
         return self._trans.is_open()
 
@@ -31,22 +45,74 @@ class TBufferedTransport(TTransportBase):
     def close(self):
         return self._trans.close()
 
-    def _read(self, sz):
-        ret = self._rbuf.read(sz)
-        if len(ret) != 0:
-            return ret
-
-        self._rbuf = BytesIO(self._trans.read(max(sz, self._buf_size)))
-        return self._rbuf.read(sz)
+    def read(self, sz):
+        if self._rend - self._rpos < sz:
+            self._fill(sz)
+        pos = self._rpos
+        self._rpos = pos + sz
+        self._consumed += sz
+        return self._rview[pos:pos + sz].tobytes()
+
+    def _fill(self, sz):
+        """Make `sz` bytes available from the read position."""
+        unread = self._rend - self._rpos
+        size = max(sz, self._read_ahead)
+        if size > len(self._rbuf) or len(self._rbuf) > self.MAX_KEPT_BUFFER >= size:
+            rbuf = bytearray(size)
+            rbuf[:unread] = self._rview[self._rpos:self._rend]
+            self._rbuf = rbuf
+            self._rview = memoryview(rbuf)
+        elif self._rpos:
+            self._rbuf[:unread] = self._rbuf[self._rpos:self._rend]
+        self._rpos = 0
+        self._rend = unread
+
+        readinto = getattr(self._trans, 'readinto', None) if PY3 else None
+        while self._rend < sz:
+            if readinto is not None:
+                n = readinto(self._rview[self._rend:])
+            else:
+                chunk = self._trans.read(len(self._rbuf) - self._rend)
+                n = len(chunk)
+                self._rbuf[self._rend:self._rend + n] = chunk
+            if not n:
+                raise TTransportException(TTransportException.END_OF_FILE,
+                                          "End of file reading from transport")
+            self._rend += n
 
     def write(self, buf):
-        self._wbuf.write(buf)
+        end = self._wlen + len(buf)
+        if end > len(self._wbuf):
+            wbuf = bytearray(max(end, 2 * len(self._wbuf)))
+            wbuf[:self._wlen] = self._wbuf[:self._wlen]
+            self._wbuf = wbuf
+        self._wbuf[self._wlen:end] = buf
+        self._wlen = end
+
+    def writev(self, buffers):
+        for buf in buffers:
+            self.write(buf)
 
     def flush(self):
-        out = self._wbuf.getvalue()
+        if self._consumed:
+            # running average of message sizes, sizing the read-ahead
+            self._read_ahead = min(
+                max((self._read_ahead * 3 + self._consumed) // 4, self._buf_size),
+                self.MAX_READ_AHEAD)
+            self._consumed = 0
+
+        wlen = self._wlen
         # reset wbuf before write/flush to preserve state on underlying failure
-        self._wbuf = BytesIO()
-        self._trans.write(out)
+        self._wlen = 0
+        if PY3:
+            out = memoryview(self._wbuf)[:wlen]
+        else:
+            out = bytes(self._wbuf[:wlen])
+        try:
+            self._trans.write(out)
+        finally:
+            if len(self._wbuf) > self.MAX_KEPT_BUFFER:
+                self._wbuf = bytearray(self._buf_size)
         self._trans.flush()
 
     def getvalue(self):
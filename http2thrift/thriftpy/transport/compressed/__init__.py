@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""Framed transport compressing large frames.
+
+A plain frame is a TFramedTransport frame. A codec frame has the high bit
+of its length set and starts with a header byte, the low 7 bits naming the
+codec and the high bit telling whether the payload is compressed::
+
+    | 1 | length (31 bits) | c | codec id (7 bits) | payload |
+
+A client sends codec frames only, compressing those of at least `threshold`
+bytes. A server replies in kind: plain frames to TFramedTransport clients,
+codec frames compressed with the client's codec to compressing clients, so
+it can serve both.
+"""
+
+from __future__ import absolute_import
+
+import struct
+import threading
+import weakref
+import zlib
+
+from .. import TTransportException, readall, writev
+from ..framed import DEFAULT_MAX_FRAME_SIZE, TFramedTransport
+
+CODEC_FLAG = 0x80000000
+COMPRESSED = 0x80
+CODEC_MASK = 0x7f
+
+DEFAULT_THRESHOLD = 4096
+
+
+class ZlibCodec(object):
+    """Codec interface: a 7 bit `id`, `compress` and `decompress`.
+
+    `decompress` must refuse to produce more than `max_size` bytes.
+    """
+    id = 1
+    name = 'zlib'
+
+    def __init__(self, level=zlib.Z_DEFAULT_COMPRESSION):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, max_size):
+        d = zlib.decompressobj()
+        out = d.decompress(data, max_size)
+        if d.unconsumed_tail:
+            raise TTransportException(
+                TTransportException.UNKNOWN,
+                'decompressed frame larger than %d bytes' % max_size)
+        return out
+
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """Make `codec` known to readers, by its id."""
+    if not 0 < codec.id <= CODEC_MASK:
+        raise ValueError('codec id must be within 1..%d' % CODEC_MASK)
+    CODECS[codec.id] = codec
+
+
+register_codec(ZlibCodec())
+
+
+class TCompressedFramedTransport(TFramedTransport):
+    """TFramedTransport compressing frames of at least `threshold` bytes.
+
+    With `server=True` nothing is compressed until the peer sent a codec
+    frame, then its codec is used and `codec` is ignored.
+    """
+    def __init__(self, trans, codec=None, threshold=DEFAULT_THRESHOLD,
+                 max_frame_size=DEFAULT_MAX_FRAME_SIZE, server=False):
+        super(TCompressedFramedTransport, self).__init__(trans, max_frame_size)
+        self.codec = codec or CODECS[ZlibCodec.id]
+        self.threshold = threshold
+        self.server = server
+        # codec to reply with, None for plain frames
+        self._peer_codec = None if server else self.codec
+
+    def read_frame(self):
+        sz, = struct.unpack('!I', readall(self._trans.read, 4))
+        if not sz & CODEC_FLAG:
+            self._check_size(sz)
+            self._rbuf = self._read_payload(sz)
+            self._rpos = 0
+            return
+
+        sz &= ~CODEC_FLAG
+        if sz < 1:
+            raise TTransportException(TTransportException.UNKNOWN, 'empty codec frame')
+        self._check_size(sz)
+        buff = self._read_payload(sz)
+        header = bytearray(buff[:1])[0]
+        codec = CODECS.get(header & CODEC_MASK)
+        if header & COMPRESSED:
+            if codec is None:
+                raise TTransportException(
+                    TTransportException.UNKNOWN,
+                    'unknown codec id %d' % (header & CODEC_MASK))
+            self._rbuf = codec.decompress(buff[1:], self.max_frame_size)
+        else:
+            self._rbuf = buff[1:]
+        self._rpos = 0
+
+        if self.server:
+            self._peer_codec = codec
+
+    def flush(self):
+        out = self._wbuf
+        self._wbuf = bytearray()
+
+        codec = self._peer_codec
+        if codec is None:
+            writev(self._trans, [struct.pack('!i', len(out)), out])
+        else:
+            header = codec.id
+            if len(out) >= self.threshold:
+                packed = codec.compress(out)
+                if len(packed) < len(out):
+                    out = packed
+                    header |= COMPRESSED
+            writev(self._trans, [struct.pack('!IB', (len(out) + 1) | CODEC_FLAG, header), out])
+        self._trans.flush()
+
+
+class TCompressedFramedTransportFactory(object):
+    """Client side factory, see TCompressedFramedTransport for arguments."""
+    def __init__(self, codec=None, threshold=DEFAULT_THRESHOLD,
+                 max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.codec = codec
+        self.threshold = threshold
+        self.max_frame_size = max_frame_size
+
+    def get_transport(self, trans):
+        return TCompressedFramedTransport(
+            trans, self.codec, self.threshold, self.max_frame_size)
+
+
+class TCompressedFramedServerTransportFactory(TCompressedFramedTransportFactory):
+    """Server side factory, for `make_server` and TServer's `itrans_factory`.
+
+    TServer asks for an input and an output transport of each connection,
+    both get the same transport so replies follow what the client sent.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TCompressedFramedServerTransportFactory, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._transports = weakref.WeakKeyDictionary()
+
+    def get_transport(self, trans):
+        with self._lock:
+            transport = self._transports.get(trans)
+            if transport is None:
+                transport = TCompressedFramedTransport(
+                    trans, self.codec, self.threshold, self.max_frame_size, server=True)
+                self._transports[trans] = transport
+            return transport
@@ -3,19 +3,34 @@
 from __future__ import absolute_import
 
 import struct
-from io import BytesIO
 
 # from thriftpy._compat import CYTHON
-from .. import TTransportBase, readall
-from ..buffered import TBufferedTransport
+from ..._compat import PY3
+from .. import TTransportBase, TTransportException, readall, readall_into, writev
+
+DEFAULT_MAX_FRAME_SIZE = 256 * 1024 * 1024
 
 
 class TFramedTransport(TTransportBase):
-    """Class that wraps another transport and frames its I/O when writing."""
-    def __init__(self, trans):
+    """Class that wraps another transport and frames its I/O when writing.
+
+    The current frame is kept as one buffer with a read position, and is
+    exposed through `get_read_buffer` so protocols can decode it in place.
+    If the wrapped transport has `readinto` (TSocket does), frames are
+    received into a bytearray reused across frames and the buffer is a
+    memoryview of it, valid until the next frame is read.
+
+    Frames claiming more than `max_frame_size` bytes are refused before
+    anything is allocated, e.g. when an unframed peer's first bytes are
+    read as a frame size.
+    """
+    def __init__(self, trans, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
         self._trans = trans
-        self._rbuf = BytesIO()
-        self._wbuf = BytesIO()
+        self.max_frame_size = max_frame_size
+        self._rbuf = b''
+        self._rpos = 0
+        self._frame = bytearray()
+        self._wbuf = bytearray()
 
     def is_open(self):
         return self._trans.is_open()
@@ -32,33 +47,70 @@ class TFramedTransport(TTransportBase):
         if sz == 0:
             return b''
 
-        ret = self._rbuf.read(sz)
-        if len(ret) != 0:
-            return ret
-
-        self.read_frame()
-        return self._rbuf.read(sz)
+        pos = self._rpos
+        end = pos + sz
+        if end <= len(self._rbuf):
+            self._rpos = end
+            return bytes(self._rbuf[pos:end])
+
+        # continue with the following frame(s)
+        chunks = [bytes(self._rbuf[pos:])]
+        need = sz - len(chunks[0])
+        while need > 0:
+            self.read_frame()
+            chunk = bytes(self._rbuf[:need])
+            self._rpos = len(chunk)
+            chunks.append(chunk)
+            need -= len(chunk)
+        return b''.join(chunks)
 
     def read_frame(self):
         buff = readall(self._trans.read, 4)
         sz, = struct.unpack('!i', buff)
-        frame = readall(self._trans.read, sz)
-        self._rbuf = BytesIO(frame)
+        self._check_size(sz)
+        self._rbuf = self._read_payload(sz)
+        self._rpos = 0
+
+    def _read_payload(self, sz):
+        readinto = getattr(self._trans, 'readinto', None)
+        # py2 memoryviews index and convert to str, which protocols don't expect
+        if readinto is None or not PY3 or sz <= 0:
+            return readall(self._trans.read, sz)
+
+        if len(self._frame) < sz:
+            # a new one, the old one may still be exported
+            self._frame = bytearray(sz)
+        return readall_into(readinto, memoryview(self._frame)[:sz])
+
+    def _check_size(self, sz):
+        if sz < 0 or sz > self.max_frame_size:
+            raise TTransportException(
+                TTransportException.UNKNOWN,
+                'invalid frame size %d, the limit is %d' % (sz, self.max_frame_size))
+
+    def get_read_buffer(self):
+        """Return the current frame and the read position in it, or None if
+        the frame has been read completely.
+        """
+        if self._rpos < len(self._rbuf):
+            return self._rbuf, self._rpos
+        return None
+
+    def set_read_pos(self, pos):
+        self._rpos = pos
 
     def write(self, buf):
-        self._wbuf.write(buf)
+        self._wbuf += buf
 
     def flush(self):
         # reset wbuf before write/flush to preserve state on underlying failure
-        out = self._wbuf.getvalue()
-        self._wbuf = BytesIO()
-
-        # N.B.: Doing this string concatenation is WAY cheaper than making
-        # two separate calls to the underlying socket object. Socket writes in
-        # Python turn out to be REALLY expensive, but it seems to do a pretty
-        # good job of managing string buffer operations without excessive
-        # copies
-        self._trans.write(struct.pack("!i", len(out)) + out)
+        out = self._wbuf
+        self._wbuf = bytearray()
+
+        # N.B.: one write of header and frame is WAY cheaper than two
+        # separate calls to the underlying socket object, writev sends both
+        # at once without copying the frame to prepend the header
+        writev(self._trans, [struct.pack("!i", len(out)), out])
         self._trans.flush()
 
     def getvalue(self):
@@ -67,7 +119,8 @@ class TFramedTransport(TTransportBase):
 
 class TFramedTransportFactory(object):
     def get_transport(self, trans):
-        return TBufferedTransport(TFramedTransport(trans))
+        # frames are buffered already, no need for a TBufferedTransport
+        return TFramedTransport(trans)
 
 
 # if CYTHON:
@@ -2,54 +2,74 @@
 
 from __future__ import absolute_import
 
-from io import BytesIO
-
 # from thriftpy._compat import CYTHON
 from .. import TTransportBase
 
 
 class TMemoryBuffer(TTransportBase):
-    """Wraps a BytesIO object as a TTransport."""
+    """A transport over an in-memory buffer, with a read cursor.
+
+    Reads advance the cursor, writes append to the end of the buffer. A
+    value given to the constructor or `setvalue` (bytes, bytearray or
+    memoryview, e.g. a received frame) is used as is, it is only copied
+    into a bytearray owned by the transport on the first write.
+    """
 
     def __init__(self, value=None):
-        """value -- a value as the initial value in the BytesIO object.
+        """value -- a value as the initial value of the buffer.
 
         If value is set, the transport can be read first.
         """
-        self._buffer = BytesIO(value) if value is not None else BytesIO()
-        self._pos = 0
+        self._closed = False
+        if value is not None:
+            self.setvalue(value)
+        else:
+            self._buffer = bytearray()
+            self._owned = True
+            self._pos = 0
 
     def is_open(self):
-        return not self._buffer.closed
+        return not self._closed
 
     def open(self):
         pass
 
     def close(self):
-        self._buffer.close()
+        self._closed = True
 
     def read(self, sz):
-        return self._read(sz)
+        pos = self._pos
+        res = self._buffer[pos:pos + sz]
+        self._pos = pos + len(res)
+        return res if type(res) is bytes else bytes(res)
 
-    def _read(self, sz):
-        orig_pos = self._buffer.tell()
-        self._buffer.seek(self._pos)
-        res = self._buffer.read(sz)
-        self._buffer.seek(orig_pos)
-        self._pos += len(res)
-        return res
+    def get_read_buffer(self):
+        """Return the buffered value and the read position in it."""
+        return self._buffer, self._pos
+
+    def set_read_pos(self, pos):
+        self._pos = pos
 
     def write(self, buf):
-        self._buffer.write(buf)
+        if not self._owned:
+            self._buffer = bytearray(self._buffer)
+            self._owned = True
+        self._buffer += buf
+
+    def writev(self, buffers):
+        for buf in buffers:
+            self.write(buf)
 
     def flush(self):
         pass
 
     def getvalue(self):
-        return self._buffer.getvalue()
+        buf = self._buffer
+        return buf if type(buf) is bytes else bytes(buf)
 
     def setvalue(self, value):
-        self._buffer = BytesIO(value)
+        self._buffer = value
+        self._owned = False
         self._pos = 0
 
 
@@ -8,12 +8,22 @@ import socket
 import struct
 import sys
 
+from .._compat import monotonic
 from . import TTransportException
 
+try:
+    # POSIX requires at least 16, -1 means no limit
+    _IOV_MAX = max(os.sysconf('SC_IOV_MAX'), 16)
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 16
+
 
 class TSocket(object):
     """Socket implementation for client side."""
 
+    # scatter-gather writes, not on Windows and py2
+    _sendmsg = hasattr(socket.socket, 'sendmsg')
+
     def __init__(self, host=None, port=None, unix_socket=None,
                  sock=None, socket_family=socket.AF_INET,
                  socket_timeout=3000, connect_timeout=None):
@@ -53,6 +63,7 @@ class TSocket(object):
         self.socket_timeout = socket_timeout / 1000 if socket_timeout else None
         self.connect_timeout = connect_timeout / 1000 if connect_timeout \
             else self.socket_timeout
+        self.deadline = None
 
     def _init_sock(self):
         if self.unix_socket:
@@ -81,6 +92,25 @@ class TSocket(object):
         if self.sock is not None:
             self.sock.settimeout(self.socket_timeout)
 
+    def set_deadline(self, deadline):
+        """Fail connecting, reads and writes with TIMED_OUT once the
+        `_compat.monotonic` time `deadline` has passed, timeouts are
+        shortened to the time left. None removes the deadline.
+        """
+        self.deadline = deadline
+        if deadline is None and self.sock is not None:
+            self.sock.settimeout(self.socket_timeout)
+
+    def _time_left(self, timeout):
+        left = self.deadline - monotonic()
+        if left <= 0:
+            raise TTransportException(type=TTransportException.TIMED_OUT,
+                                      message='Deadline exceeded')
+        return min(left, timeout) if timeout else left
+
+    def _apply_deadline(self):
+        self.sock.settimeout(self._time_left(self.socket_timeout))
+
     def is_open(self):
         return bool(self.sock)
 
@@ -90,22 +120,51 @@ class TSocket(object):
         addr = self.unix_socket or (self.host, self.port)
 
         try:
-            if self.connect_timeout:
-                self.sock.settimeout(self.connect_timeout)
+            connect_timeout = self.connect_timeout
+            if self.deadline is not None:
+                connect_timeout = self._time_left(connect_timeout)
+            if connect_timeout:
+                self.sock.settimeout(connect_timeout)
 
             self.sock.connect(addr)
 
             if self.socket_timeout:
                 self.sock.settimeout(self.socket_timeout)
 
+        except socket.timeout:
+            raise TTransportException(
+                type=TTransportException.TIMED_OUT,
+                message="Timed out connecting to %s" % str(addr))
         except (socket.error, OSError):
             raise TTransportException(
                 type=TTransportException.NOT_OPEN,
                 message="Could not connect to %s" % str(addr))
 
     def read(self, sz):
+        buff = self._recv(self.sock.recv, sz, b'')
+        if len(buff) == 0:
+            raise TTransportException(type=TTransportException.END_OF_FILE,
+                                      message='TSocket read 0 bytes')
+        return buff
+
+    def readinto(self, buf):
+        """Receive into the writable buffer `buf` (e.g. a memoryview),
+        returns the number of bytes received.
+        """
+        n = self._recv(self.sock.recv_into, buf, 0)
+        if n == 0:
+            raise TTransportException(type=TTransportException.END_OF_FILE,
+                                      message='TSocket read 0 bytes')
+        return n
+
+    def _recv(self, recv, arg, eof):
+        if self.deadline is not None:
+            self._apply_deadline()
         try:
-            buff = self.sock.recv(sz)
+            return recv(arg)
+        except socket.timeout:
+            raise TTransportException(type=TTransportException.TIMED_OUT,
+                                      message='TSocket read timed out')
         except socket.error as e:
             if (e.args[0] == errno.ECONNRESET and
                     (sys.platform == 'darwin' or
@@ -115,18 +174,47 @@ class TSocket(object):
                 # See corresponding comment and code in TSocket::read()
                 # in lib/cpp/src/transport/TSocket.cpp.
                 self.close()
-                # Trigger the check to raise the END_OF_FILE exception below.
-                buff = ''
+                # Trigger the check to raise the END_OF_FILE exception.
+                return eof
             else:
                 raise
 
-        if len(buff) == 0:
-            raise TTransportException(type=TTransportException.END_OF_FILE,
-                                      message='TSocket read 0 bytes')
-        return buff
-
     def write(self, buff):
-        self.sock.sendall(buff)
+        self._send(self.sock.sendall, buff)
+
+    def writev(self, buffers):
+        """Send the list of `buffers` as if joined, without joining them."""
+        if self._sendmsg:
+            try:
+                return self._sendmsg_all(buffers)
+            except NotImplementedError:
+                # ssl sockets have sendmsg but can't use it
+                self._sendmsg = False
+        out = bytearray()
+        for buf in buffers:
+            out += buf
+        self._send(self.sock.sendall, out)
+
+    def _send(self, send, arg):
+        if self.deadline is not None:
+            self._apply_deadline()
+        try:
+            return send(arg)
+        except socket.timeout:
+            raise TTransportException(type=TTransportException.TIMED_OUT,
+                                      message='TSocket write timed out')
+
+    def _sendmsg_all(self, buffers):
+        views = [memoryview(buf) for buf in buffers if len(buf)]
+        i = 0
+        while i < len(views):
+            sent = self._send(self.sock.sendmsg, views[i:i + _IOV_MAX])
+            # skip what was sent, a partial send ends within a buffer
+            while i < len(views) and sent >= len(views[i]):
+                sent -= len(views[i])
+                i += 1
+            if sent:
+                views[i] = views[i][sent:]
 
     def flush(self):
         pass
@@ -184,7 +272,9 @@ class TServerSocket(object):
             try:
                 _sock.connect(self.unix_socket)
             except (socket.error, OSError) as err:
-                if err.args[0] == errno.ECONNREFUSED:
+                # abstract names (leading NUL) have no file
+                if err.args[0] == errno.ECONNREFUSED and \
+                        not self.unix_socket.startswith('\0'):
                     os.unlink(self.unix_socket)
         else:
             _sock = socket.socket(self.socket_family, socket.SOCK_STREAM)
@@ -194,7 +284,8 @@ class TServerSocket(object):
             try:
                 _sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             except socket.error as err:
-                if err[0] in (errno.ENOPROTOOPT, errno.EINVAL):
+                # unix sockets don't support it
+                if err.args[0] in (errno.ENOPROTOOPT, errno.EINVAL, errno.EOPNOTSUPP):
                     pass
                 else:
                     raise
@@ -0,0 +1,160 @@
+"""
+Round trips through the compact protocol, decoded in place from framed and
+memory transports and through a buffered stream.
+"""
+
+from __future__ import (unicode_literals, print_function, division, absolute_import)
+
+import io
+
+import pytest
+
+from http2thrift.thriftpy.parser import parse_fp
+from http2thrift.thriftpy.protocol import TCompactProtocol
+from http2thrift.thriftpy.protocol.compact import encode_varint, make_zig_zag
+from http2thrift.thriftpy.protocol.exc import TProtocolException
+from http2thrift.thriftpy.transport import TMemoryBuffer, TTransportException
+
+from test_binary_codec import TRANSPORTS, VALUES, m, make_big, stream
+
+
+IDL = '''
+struct Flags {
+  1: bool a,
+  2: bool b,
+  3: list<bool> l,
+  4: set<bool> s,
+  5: map<bool, bool> mb,
+  6: map<string, bool> msb,
+  100: bool far,
+  101: optional bool unset,
+}
+
+struct Ints {
+  1: byte by,
+  2: i16 s,
+  3: i32 i,
+  4: i64 l,
+  5: list<i64> ll,
+  6: map<i16, i32> m,
+}
+
+struct Nothing {}
+'''
+
+c = parse_fp(io.StringIO(IDL), 'compact_thrift')
+
+BOOLS = [
+    lambda: c.Flags(a=True, b=False, l=[True, False, False, True], s=[True],
+                    mb={True: False, False: True}, msb={'x': True, 'y': False},
+                    far=True),
+    lambda: c.Flags(a=False, b=True, l=[], s=[], mb={}, msb={}, far=False),
+    lambda: c.Flags(far=True),
+    lambda: c.Flags(),
+]
+
+INTS = [
+    lambda: c.Ints(by=-128, s=-2 ** 15, i=-2 ** 31, l=-2 ** 63,
+                   ll=[-2 ** 63, -1, 0, 1, 2 ** 63 - 1], m={-2 ** 15: 2 ** 31 - 1}),
+    lambda: c.Ints(by=127, s=2 ** 15 - 1, i=2 ** 31 - 1, l=2 ** 63 - 1,
+                   ll=[], m={2 ** 15 - 1: -2 ** 31}),
+    lambda: c.Ints(by=0, s=0, i=0, l=0, ll=[0], m={0: 0}),
+]
+
+
+def encode(obj):
+    trans = TMemoryBuffer()
+    TCompactProtocol(trans).write_struct(obj)
+    return bytes(trans.getvalue())
+
+
+def decode(data, cls, make_trans):
+    obj = cls()
+    TCompactProtocol(make_trans(data)).read_struct(obj)
+    return obj
+
+
+@pytest.mark.parametrize('make_value', VALUES + BOOLS + INTS)
+@pytest.mark.parametrize('make_trans', TRANSPORTS)
+def test_round_trip(make_value, make_trans):
+    value = make_value()
+    assert decode(encode(value), value.__class__, make_trans) == value
+
+
+def test_round_trip_values():
+    for make_trans in TRANSPORTS:
+        obj = decode(encode(make_big()), m.Big, make_trans)
+        assert isinstance(obj.bin, bytes) and obj.bin == b'\x00\xff\x80'
+        assert obj.str == 'h\xe9llo 世界'
+        assert obj.lb == [True, False, True]
+
+        flags = decode(encode(BOOLS[0]()), c.Flags, make_trans)
+        assert flags.a is True and flags.b is False and flags.far is True
+        assert flags.unset is None
+
+
+def test_zig_zag():
+    for n, bits, out in [(0, 32, b'\x00'), (-1, 32, b'\x01'), (1, 32, b'\x02'),
+                         (2 ** 31 - 1, 32, b'\xfe\xff\xff\xff\x0f'),
+                         (-2 ** 31, 32, b'\xff\xff\xff\xff\x0f'),
+                         (2 ** 63 - 1, 64, b'\xfe' + b'\xff' * 8 + b'\x01'),
+                         (-2 ** 63, 64, b'\xff' * 9 + b'\x01')]:
+        buf = bytearray()
+        encode_varint(buf, make_zig_zag(n, bits))
+        assert bytes(buf) == out
+
+
+@pytest.mark.parametrize('make_trans', TRANSPORTS)
+def test_skip_unknown_fields(make_trans):
+    # the fields unknown to Narrow and Nothing are skipped, the second
+    # struct must be read from the right place
+    for cls, value in [(m.Narrow, m.Narrow(str='h\xe9llo 世界', id='id-1')),
+                       (m.Empty, m.Empty())]:
+        data = encode(make_big()) + encode(m.Point(x=5, y=6))
+        proto = TCompactProtocol(make_trans(data))
+        obj = cls()
+        proto.read_struct(obj)
+        assert obj == value
+        point = m.Point()
+        proto.read_struct(point)
+        assert point == m.Point(x=5, y=6)
+
+
+@pytest.mark.parametrize('make_trans', TRANSPORTS)
+@pytest.mark.parametrize('make_value', BOOLS[:1] + INTS[:2])
+def test_skip_bools_and_ints(make_trans, make_value):
+    data = encode(make_value()) + encode(c.Ints(i=-7))
+    proto = TCompactProtocol(make_trans(data))
+    proto.read_struct(c.Nothing())
+    ints = c.Ints()
+    proto.read_struct(ints)
+    assert ints == c.Ints(i=-7)
+
+
+@pytest.mark.parametrize('make_trans', TRANSPORTS)
+@pytest.mark.parametrize('cut', [1, 5, 40])
+def test_truncated(make_trans, cut):
+    data = encode(make_big())
+    exc = TTransportException if make_trans is stream else TProtocolException
+    with pytest.raises(exc):
+        decode(data[:-cut], m.Big, make_trans)
+
+
+def test_field_level_methods():
+    # the field level methods encode like write_struct
+    for make_value in BOOLS + INTS:
+        value = make_value()
+        trans = TMemoryBuffer()
+        proto = TCompactProtocol(trans)
+        proto.write_struct_begin()
+        for field in value.thrift_fields:
+            val = getattr(value, field.name)
+            if val is None:
+                continue
+            proto.write_field_begin(field.name, field.ttype, field.fid)
+            proto.write_val(field.ttype, val, field.spec)
+            proto.write_field_end()
+        proto.write_field_stop()
+        proto.write_struct_end()
+        assert bytes(trans.getvalue()) == encode(value)
+